@@ -0,0 +1,23 @@
+"""Offline load tests and benchmarks for the API.
+
+Boots `server:app` in-process, with no uvicorn and no network. Synthetic
+data is seeded through the API's own write paths, then concurrent async
+clients are driven at each route and p50/p95/p99 latency, requests per
+second and Mongo commands per request are reported. Run from the backend
+directory:
+
+    python -m bench                                   # mongod at MONGO_URL
+    python -m bench --in-memory                       # mongomock-motor stand-in
+    python -m bench --scenarios browse_tutors,login_storm --concurrency 50
+    python -m bench --tutors 1000 --messages 20000 --output results.json
+
+The JSON written by --output is meant to be diffed across commits.
+
+Data goes into a dedicated database, --db-name (default
+tricity_tutors_bench), which is dropped first. Payment, SMS and email
+providers are disabled for the run.
+
+--in-memory needs `pip install mongomock-motor`. Its timings are only good
+for comparing Python-side costs between commits, and Mongo command counts
+are not available in that mode.
+"""
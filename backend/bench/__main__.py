@@ -0,0 +1,159 @@
+import argparse
+import asyncio
+import json
+import os
+import platform
+import subprocess
+import sys
+from dataclasses import asdict
+from datetime import datetime, timezone
+from pathlib import Path
+
+from dotenv import load_dotenv
+
+BACKEND_DIR = Path(__file__).parent.parent
+
+# Never reach a real payment, SMS or email provider from a benchmark
+DISABLED_PROVIDERS = (
+    "RAZORPAY_KEY_ID",
+    "RAZORPAY_KEY_SECRET",
+    "TWILIO_ACCOUNT_SID",
+    "TWILIO_AUTH_TOKEN",
+    "RESEND_API_KEY",
+)
+
+# Patches installed for --in-memory; referenced so they stay in effect
+_in_memory_patches = []
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m bench", description="Offline API benchmarks")
+    parser.add_argument("--in-memory", action="store_true", help="Use mongomock-motor instead of a mongod")
+    parser.add_argument("--mongo-url", help="Defaults to MONGO_URL from the environment or .env")
+    parser.add_argument("--db-name", default="tricity_tutors_bench", help="Dropped and reseeded on every run")
+    parser.add_argument("--scenarios", help="Comma-separated scenario names (default: all)")
+    parser.add_argument("--list", action="store_true", help="List scenarios and exit")
+    parser.add_argument("--requests", type=int, help="Requests per scenario (default 1000, less for costly ones)")
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--tutors", type=int, default=200)
+    parser.add_argument("--students", type=int, default=200)
+    parser.add_argument("--requirements", type=int, default=400)
+    parser.add_argument("--reviews", type=int, default=600)
+    parser.add_argument("--messages", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=42, help="Random seed for synthetic data")
+    parser.add_argument("--output", help="Write the JSON report to this file")
+    return parser.parse_args(argv)
+
+
+def configure_environment(args) -> None:
+    load_dotenv(BACKEND_DIR / '.env')
+    if args.mongo_url:
+        os.environ["MONGO_URL"] = args.mongo_url
+    os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+    os.environ["DB_NAME"] = args.db_name
+    os.environ.setdefault("JWT_SECRET", "bench-only-secret")
+    for name in DISABLED_PROVIDERS:
+        os.environ[name] = ""
+
+    if args.in_memory:
+        try:
+            import motor.motor_asyncio
+            from mongomock_motor import AsyncMongoMockClient, enabled_gridfs_integration
+        except ImportError:
+            sys.exit("--in-memory needs mongomock-motor: pip install mongomock-motor")
+        gridfs_integration = enabled_gridfs_integration()
+        gridfs_integration.__enter__()
+        _in_memory_patches.append(gridfs_integration)
+        # server.py picks this up when it creates its client on import
+        motor.motor_asyncio.AsyncIOMotorClient = AsyncMongoMockClient
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=BACKEND_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def print_table(report) -> None:
+    print(f"{'scenario':<20}{'rps':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'ops/req':>10}{'errors':>8}")
+    for name, result in report["scenarios"].items():
+        if "p50_ms_by_depth" in result:
+            print(f"{name:<20} {result['messages_paged']} messages in {result['pages']} pages, "
+                  f"p50 ms by depth={result['p50_ms_by_depth']} deepest/newest={result['deepest_vs_newest']}")
+            continue
+        if "other_p99_speedup" in result:
+            for mode in ("inline", "executor"):
+                numbers = result[mode]
+                print(f"{name + ':' + mode:<20} other p50={numbers['other_p50_ms']}ms p99={numbers['other_p99_ms']}ms "
+                      f"({numbers['other_requests']} requests) login p99={numbers['login_p99_ms']}ms")
+            print(f"{'':<20}other p99 inline/executor={result['other_p99_speedup']}")
+            continue
+        if "rps" not in result:
+            for endpoint, numbers in result.items():
+                print(f"{name + ':' + endpoint:<20} bytes={numbers['bytes']} "
+                      f"render stdlib={numbers['stdlib_render_us']}us orjson={numbers['orjson_render_us']}us")
+            continue
+        ops = result["mongo_ops_per_request"]
+        print(f"{name:<20}{result['rps']:>10}{result['p50_ms']:>10}{result['p95_ms']:>10}{result['p99_ms']:>10}"
+              f"{ops if ops is not None else '-':>10}{result['errors']:>8}")
+        if "overdrawn" in result:
+            print(f"{'':<20}succeeded={result['succeeded']}/{result['expected_successes']} "
+                  f"final_balance={result['final_balance']} overdrawn={result['overdrawn']}")
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    configure_environment(args)
+
+    from bench.scenarios import SCENARIOS, SCENARIOS_BY_NAME
+    if args.list:
+        for scenario in SCENARIOS:
+            print(f"{scenario.name:<20}{scenario.description}")
+        return 0
+
+    if args.scenarios:
+        unknown = [name for name in args.scenarios.split(",") if name not in SCENARIOS_BY_NAME]
+        if unknown:
+            sys.exit(f"Unknown scenarios: {', '.join(unknown)}")
+        scenarios = [SCENARIOS_BY_NAME[name] for name in args.scenarios.split(",")]
+    else:
+        scenarios = SCENARIOS
+
+    from bench.runner import run_benchmark
+    from bench.seed import Scale
+    scale = Scale(
+        tutors=args.tutors,
+        students=args.students,
+        requirements=args.requirements,
+        reviews=args.reviews,
+        messages=args.messages,
+    )
+    result = asyncio.run(run_benchmark(
+        scenarios, scale, args.requests, args.concurrency, args.seed, count_commands=not args.in_memory
+    ))
+
+    report = {
+        "meta": {
+            "git_revision": git_revision(),
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "mongo": "mongomock" if args.in_memory else "mongod",
+            "concurrency": args.concurrency,
+            "requests": args.requests,
+            "scale": asdict(scale),
+            "seed": args.seed,
+        },
+        **result,
+    }
+    print_table(report)
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, indent=2) + "\n")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,149 @@
+"""Drives scenarios against an in-process `server:app`.
+
+Importing this module imports `server`, so the environment (and the
+in-memory Mongo stand-in, if any) must be configured first; `bench.__main__`
+does that. The command listener is registered before `server` creates its
+Motor client, because pymongo only attaches global listeners to clients
+created afterwards.
+"""
+import asyncio
+import math
+import random
+import time
+from collections import Counter
+from typing import Any, Dict, List, Optional
+
+import httpx
+from pymongo import monitoring
+
+
+class CommandCounter(monitoring.CommandListener):
+    """Counts every command the API sends to Mongo"""
+
+    def __init__(self):
+        self.total = 0
+        self.by_command = Counter()
+
+    def started(self, event):
+        self.total += 1
+        self.by_command[event.command_name] += 1
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+
+COMMANDS = CommandCounter()
+monitoring.register(COMMANDS)
+
+import server  # noqa: E402  (must follow the listener registration)
+from bench.scenarios import Scenario  # noqa: E402
+from bench.seed import Fixture, Scale, seed  # noqa: E402
+
+
+def percentile(ordered: List[float], pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list"""
+    if not ordered:
+        return 0.0
+    rank = max(1, math.ceil(pct / 100 * len(ordered)))
+    return ordered[min(rank, len(ordered)) - 1]
+
+
+def summarize(latencies: List[float], elapsed: float, statuses: Counter, commands: Optional[int]) -> Dict[str, Any]:
+    ordered = sorted(latencies)
+    count = len(ordered)
+    return {
+        "requests": count,
+        "seconds": round(elapsed, 3),
+        "rps": round(count / elapsed, 1) if elapsed else None,
+        "p50_ms": round(percentile(ordered, 50) * 1000, 2),
+        "p95_ms": round(percentile(ordered, 95) * 1000, 2),
+        "p99_ms": round(percentile(ordered, 99) * 1000, 2),
+        "mean_ms": round(sum(ordered) / count * 1000, 2) if count else 0.0,
+        "max_ms": round(ordered[-1] * 1000, 2) if count else 0.0,
+        "status_codes": {str(status): n for status, n in sorted(statuses.items())},
+        "errors": sum(n for status, n in statuses.items() if status == "error" or int(status) >= 500),
+        "mongo_ops_per_request": round(commands / count, 2) if commands is not None and count else None,
+    }
+
+
+async def run_scenario(
+    client: httpx.AsyncClient,
+    scenario: Scenario,
+    fixture: Fixture,
+    requests: int,
+    concurrency: int,
+    count_commands: bool,
+) -> Dict[str, Any]:
+    if scenario.setup is not None:
+        await scenario.setup(server.db, fixture, requests)
+
+    if scenario.custom is not None:
+        return await scenario.custom(client, fixture)
+
+    latencies: List[float] = []
+    statuses: Counter = Counter()
+    next_index = 0
+
+    async def worker():
+        nonlocal next_index
+        while next_index < requests:
+            index = next_index
+            next_index += 1
+            method, url, kwargs = scenario.request(fixture, index)
+            started = time.perf_counter()
+            try:
+                response = await client.request(method, url, **kwargs)
+                statuses[str(response.status_code)] += 1
+            except Exception:
+                statuses["error"] += 1
+            latencies.append(time.perf_counter() - started)
+
+    commands_before = COMMANDS.total
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(min(concurrency, requests))))
+    elapsed = time.perf_counter() - started
+    commands = COMMANDS.total - commands_before if count_commands else None
+
+    result = summarize(latencies, elapsed, statuses, commands)
+    if scenario.verify is not None:
+        result.update(await scenario.verify(server.db, fixture, result))
+    return result
+
+
+async def run_benchmark(
+    scenarios: List[Scenario],
+    scale: Scale,
+    requests: int,
+    concurrency: int,
+    seed_value: int,
+    count_commands: bool,
+) -> Dict[str, Any]:
+    await server.client.drop_database(server.db.name)
+    await server.app.router.startup()
+    try:
+        async with httpx.AsyncClient(
+            transport=httpx.ASGITransport(app=server.app),
+            base_url="http://bench",
+            timeout=None
+        ) as client:
+            started = time.perf_counter()
+            fixture = await seed(client, server.db, server.user_cache, scale, random.Random(seed_value))
+            seed_seconds = time.perf_counter() - started
+
+            results = {}
+            for scenario in scenarios:
+                results[scenario.name] = await run_scenario(
+                    client,
+                    scenario,
+                    fixture,
+                    scenario.default_requests if scenario.default_requests and requests is None else (requests or 1000),
+                    concurrency,
+                    count_commands,
+                )
+    finally:
+        await server.app.router.shutdown()
+
+    return {"seed_seconds": round(seed_seconds, 2), "scenarios": results}
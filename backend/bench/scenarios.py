@@ -0,0 +1,348 @@
+"""What the benchmark drives at the API.
+
+Most scenarios are a single request shape repeated `requests` times by
+`concurrency` clients. A scenario can prepare state before the run and add
+its own checks afterwards (`setup` / `verify`). It can also replace the load
+loop entirely (`custom`), as the serialization comparison does.
+"""
+import asyncio
+import json
+import statistics
+import time
+import uuid
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+import httpx
+from fastapi.encoders import jsonable_encoder
+
+import compression
+import passwords
+import serialization
+from bench.seed import PASSWORD, SUBJECTS, LOCATIONS, Fixture
+
+Request = Tuple[str, str, Dict[str, Any]]
+
+SPEND_COINS = 10
+LONG_THREAD_MESSAGES = 12000
+THREAD_PAGE_SIZE = 50
+MIXED_LOGINS = 100
+MIXED_LOGIN_CLIENTS = 20
+MIXED_BROWSE_CLIENTS = 10
+# Each browse client sends on a fixed schedule, so a stalled event loop
+# shows up as latency instead of as fewer requests
+MIXED_BROWSE_INTERVAL = 0.25
+
+
+@dataclass
+class Scenario:
+    name: str
+    description: str
+    request: Optional[Callable[[Fixture, int], Request]] = None
+    default_requests: Optional[int] = None
+    setup: Optional[Callable[[Any, Fixture, int], Awaitable[None]]] = None
+    verify: Optional[Callable[[Any, Fixture, Dict[str, Any]], Awaitable[Dict[str, Any]]]] = None
+    custom: Optional[Callable[[httpx.AsyncClient, Fixture], Awaitable[Dict[str, Any]]]] = None
+
+
+def _student(fixture: Fixture, i: int):
+    return fixture.students[i % len(fixture.students)]
+
+
+def _tutor(fixture: Fixture, i: int):
+    return fixture.tutors[i % len(fixture.tutors)]
+
+
+def _requirement(fixture: Fixture, i: int):
+    return fixture.requirements[i % len(fixture.requirements)]
+
+
+def _conversation(fixture: Fixture, i: int):
+    return fixture.conversations[i % len(fixture.conversations)]
+
+
+async def _fund_wallet_student(db, fixture: Fixture, requests: int) -> None:
+    # Enough for exactly half the spends, so the other half must be refused
+    await db.users.update_one(
+        {"id": fixture.wallet_student.id},
+        {"$set": {"coins": SPEND_COINS * (requests // 2)}, "$unset": {"ledger_keys": ""}}
+    )
+
+
+async def _verify_spends(db, fixture: Fixture, result: Dict[str, Any]) -> Dict[str, Any]:
+    user = await db.users.find_one({"id": fixture.wallet_student.id}, {"_id": 0, "coins": 1})
+    succeeded = result["status_codes"].get("200", 0)
+    expected = result["requests"] // 2
+    return {
+        "succeeded": succeeded,
+        "expected_successes": expected,
+        "final_balance": user["coins"],
+        # Any overdraw shows up as a negative balance or extra successes
+        "overdrawn": user["coins"] < 0 or succeeded > expected,
+        "balance_consistent": user["coins"] == SPEND_COINS * (expected - succeeded),
+    }
+
+
+async def _seed_long_thread(db, fixture: Fixture, requests: int) -> None:
+    # Inserted directly: 12k POSTs would dominate the run, and paging only
+    # reads messages. Already read, so unread counters stay consistent.
+    student, tutor = fixture.conversations[0]
+    start = datetime(2025, 1, 1, tzinfo=timezone.utc)
+    await db.messages.insert_many([
+        {
+            "id": str(uuid.uuid4()),
+            "sender_id": (student, tutor)[n % 2].id,
+            "sender_name": "Bench",
+            "recipient_id": (tutor, student)[n % 2].id,
+            "message": f"Bench history {n}",
+            "read": True,
+            "created_at": (start + timedelta(seconds=n)).isoformat(),
+        }
+        for n in range(LONG_THREAD_MESSAGES)
+    ])
+
+
+async def _long_thread(client: httpx.AsyncClient, fixture: Fixture) -> Dict[str, Any]:
+    """Page from the newest message to the first; latency should not grow with depth"""
+    student, tutor = fixture.conversations[0]
+    latencies: List[float] = []
+    seen = 0
+    before = None
+    while True:
+        params = {"limit": THREAD_PAGE_SIZE, **({"before": before} if before else {})}
+        started = time.perf_counter()
+        response = await client.get(f"/api/messages/thread/{tutor.id}", params=params, headers=student.headers)
+        latencies.append(time.perf_counter() - started)
+        page = response.json()
+        seen += len(page["messages"])
+        before = page["before"]
+        if not before:
+            break
+
+    tenth = max(1, len(latencies) // 10)
+    deciles = [latencies[i:i + tenth] for i in range(0, tenth * 10, tenth)]
+    p50s = [round(statistics.median(decile) * 1000, 2) for decile in deciles if decile]
+    return {
+        "messages_paged": seen,
+        "pages": len(latencies),
+        "page_size": THREAD_PAGE_SIZE,
+        # p50 page latency per tenth of the walk, newest pages first
+        "p50_ms_by_depth": p50s,
+        "deepest_vs_newest": round(p50s[-1] / p50s[0], 2) if p50s and p50s[0] else None,
+    }
+
+
+async def _hash_inline(func, *args):
+    """The old login path: bcrypt runs on the event loop"""
+    return func(*args)
+
+
+async def _login_mixed_run(client: httpx.AsyncClient, fixture: Fixture) -> Dict[str, Any]:
+    logins: List[float] = []
+    others: List[float] = []
+    statuses: Dict[str, int] = {}
+    next_login = 0
+    storm_over = False
+
+    async def timed(latencies: List[float], started: float, method: str, url: str, **kwargs) -> None:
+        try:
+            status = str((await client.request(method, url, **kwargs)).status_code)
+        except Exception:
+            status = "error"
+        latencies.append(time.perf_counter() - started)
+        statuses[status] = statuses.get(status, 0) + 1
+
+    async def login_client():
+        nonlocal next_login
+        while next_login < MIXED_LOGINS:
+            student = _student(fixture, next_login)
+            next_login += 1
+            await timed(logins, time.perf_counter(), "POST", "/api/auth/login", json={"email": student.email, "password": PASSWORD})
+
+    async def browse_client(n: int):
+        i = n
+        due = time.perf_counter() + MIXED_BROWSE_INTERVAL * n / MIXED_BROWSE_CLIENTS
+        while not storm_over:
+            # Always yield: the in-memory stand-in never suspends on its own
+            await asyncio.sleep(max(0.0, due - time.perf_counter()))
+            if i % 2:
+                await timed(others, due, "GET", "/api/me", headers=_student(fixture, i).headers)
+            else:
+                await timed(others, due, "GET", "/api/tutors", params={"limit": 20})
+            i += MIXED_BROWSE_CLIENTS
+            due += MIXED_BROWSE_INTERVAL
+
+    async def storm():
+        nonlocal storm_over
+        await asyncio.gather(*(login_client() for _ in range(MIXED_LOGIN_CLIENTS)))
+        storm_over = True
+
+    await asyncio.gather(storm(), *(browse_client(n) for n in range(MIXED_BROWSE_CLIENTS)))
+
+    from bench.runner import percentile
+    logins.sort()
+    others.sort()
+    return {
+        "logins": len(logins),
+        "login_p99_ms": round(percentile(logins, 99) * 1000, 2),
+        "other_requests": len(others),
+        "other_p50_ms": round(percentile(others, 50) * 1000, 2),
+        "other_p99_ms": round(percentile(others, 99) * 1000, 2),
+        "status_codes": dict(sorted(statuses.items())),
+    }
+
+
+async def _login_mixed(client: httpx.AsyncClient, fixture: Fixture) -> Dict[str, Any]:
+    """Latency of GET /api/tutors and /api/me during a login storm, bcrypt inline vs in its pool"""
+    pooled = passwords._run
+    passwords._run = _hash_inline
+    try:
+        inline = await _login_mixed_run(client, fixture)
+    finally:
+        passwords._run = pooled
+    executor = await _login_mixed_run(client, fixture)
+    return {
+        "inline": inline,
+        "executor": executor,
+        "other_p99_speedup": (
+            round(inline["other_p99_ms"] / executor["other_p99_ms"], 2) if executor["other_p99_ms"] else None
+        ),
+    }
+
+
+SERIALIZATION_ENDPOINTS = {
+    "tutors": "/api/tutors?limit=50",
+    "conversations": "/api/messages/conversations",
+    "wallet": "/api/wallet",
+}
+
+
+async def _serialization(client: httpx.AsyncClient, fixture: Fixture, iterations: int = 200) -> Dict[str, Any]:
+    """Render time (stdlib json vs orjson) and bytes on the wire per encoding"""
+    account = max(fixture.students, key=lambda student: sum(1 for s, _ in fixture.conversations if s is student))
+    encodings = ["identity", "gzip"] + (["br"] if compression.brotli is not None else [])
+    report = {}
+    for name, path in SERIALIZATION_ENDPOINTS.items():
+        wire = {}
+        payload = None
+        for encoding in encodings:
+            response = await client.get(path, headers={**account.headers, "Accept-Encoding": encoding})
+            wire[encoding] = response.num_bytes_downloaded
+            payload = response.json()
+
+        started = time.perf_counter()
+        for _ in range(iterations):
+            json.dumps(jsonable_encoder(payload), ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        stdlib_us = (time.perf_counter() - started) / iterations * 1e6
+
+        started = time.perf_counter()
+        for _ in range(iterations):
+            serialization.dumps(payload)
+        orjson_us = (time.perf_counter() - started) / iterations * 1e6
+
+        report[name] = {
+            "bytes": wire,
+            "stdlib_render_us": round(stdlib_us, 1),
+            "orjson_render_us": round(orjson_us, 1),
+            "render_speedup": round(stdlib_us / orjson_us, 2) if orjson_us else None,
+        }
+    return report
+
+
+SCENARIOS = [
+    Scenario(
+        "browse_tutors", "First page of the tutor listing",
+        lambda f, i: ("GET", "/api/tutors", {"params": {"limit": 20}}),
+    ),
+    Scenario(
+        "search_tutors", "Tutor listing filtered by subject and location",
+        lambda f, i: ("GET", "/api/tutors", {"params": {
+            "subject": SUBJECTS[i % len(SUBJECTS)][:4],
+            "location": LOCATIONS[i % len(LOCATIONS)].split(",")[-1].strip(),
+            "limit": 20,
+        }}),
+    ),
+    Scenario(
+        "tutor_facets", "Facet counts for the browse filters (cached per filter set)",
+        lambda f, i: ("GET", "/api/tutors/facets", {"params": {"subject": SUBJECTS[i % len(SUBJECTS)]}}),
+    ),
+    Scenario(
+        "tutor_detail", "Single tutor profile",
+        lambda f, i: ("GET", f"/api/tutors/{_tutor(f, i).id}", {}),
+    ),
+    Scenario(
+        "profile_view", "Profile view tracking",
+        lambda f, i: ("POST", f"/api/tutors/{_tutor(f, i).id}/view", {}),
+    ),
+    Scenario(
+        "requirements", "Active requirements feed",
+        lambda f, i: ("GET", "/api/requirements", {"params": {"limit": 20}}),
+    ),
+    Scenario(
+        "requirement_matches", "Top tutors for a student's requirement",
+        lambda f, i: ("GET", f"/api/requirements/{_requirement(f, i)[1]}/matches", {"headers": _requirement(f, i)[0].headers}),
+    ),
+    Scenario(
+        "tutor_matches", "Top requirements for a tutor's profile",
+        lambda f, i: ("GET", "/api/tutor/matching-requirements", {"headers": _tutor(f, i).headers}),
+    ),
+    Scenario(
+        "conversations", "Conversation list",
+        lambda f, i: ("GET", "/api/messages/conversations", {"headers": _conversation(f, i)[0].headers}),
+    ),
+    Scenario(
+        "message_thread", "Open a conversation thread",
+        lambda f, i: ("GET", f"/api/messages/thread/{_conversation(f, i)[1].id}", {"headers": _conversation(f, i)[0].headers}),
+    ),
+    Scenario(
+        "unread_count", "Unread badge",
+        lambda f, i: ("GET", "/api/messages/unread", {"headers": _student(f, i).headers}),
+    ),
+    Scenario(
+        "send_message", "Student messages a tutor they already paid for",
+        lambda f, i: ("POST", "/api/messages", {
+            "headers": _conversation(f, i)[0].headers,
+            "json": {"recipient_id": _conversation(f, i)[1].id, "message": f"Bench follow-up {i}"},
+        }),
+    ),
+    Scenario(
+        "check_access", "Paid access check on a tutor profile",
+        lambda f, i: ("GET", f"/api/check-tutor-access/{_conversation(f, i)[1].id}", {"headers": _conversation(f, i)[0].headers}),
+    ),
+    Scenario(
+        "wallet", "Wallet balance and transactions",
+        lambda f, i: ("GET", "/api/wallet", {"headers": _student(f, i).headers}),
+    ),
+    Scenario(
+        "login_storm", "Concurrent logins; bounded by the bcrypt pool",
+        lambda f, i: ("POST", "/api/auth/login", {"json": {"email": _student(f, i).email, "password": PASSWORD}}),
+        default_requests=200,
+    ),
+    Scenario(
+        "login_mixed", "Browse and /api/me latency during a login storm, bcrypt inline vs pooled",
+        custom=_login_mixed,
+    ),
+    Scenario(
+        "spend_concurrency", "Parallel spends from one wallet funded for half of them",
+        lambda f, i: ("POST", "/api/wallet/spend", {
+            "headers": f.wallet_student.headers,
+            "params": {"coins": SPEND_COINS, "purpose": "bench"},
+        }),
+        default_requests=2000,
+        setup=_fund_wallet_student,
+        verify=_verify_spends,
+    ),
+    Scenario(
+        "serialization", "Render cost and bytes on the wire for the largest payloads",
+        custom=_serialization,
+    ),
+    # Last: it grows one conversation to 12k messages
+    Scenario(
+        "long_thread", f"Page back through a {LONG_THREAD_MESSAGES}-message thread",
+        setup=_seed_long_thread,
+        custom=_long_thread,
+    ),
+]
+
+SCENARIOS_BY_NAME = {scenario.name: scenario for scenario in SCENARIOS}
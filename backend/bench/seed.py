@@ -0,0 +1,185 @@
+"""Synthetic Tricity data, written through the API so derived state
+(search keys, rating aggregates, conversations, entitlements) is exactly
+what production traffic would have produced.
+"""
+import asyncio
+import random
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Iterable, List, Optional, Tuple
+
+import httpx
+
+import passwords
+
+PASSWORD = "bench-password"
+
+SUBJECTS = [
+    "Mathematics", "Physics", "Chemistry", "Biology", "English",
+    "Hindi", "Punjabi", "Computer Science", "Accountancy", "Economics",
+]
+CLASSES = ["Class 1-5", "Class 6-8", "Class 9-10", "Class 11-12", "Graduation"]
+LOCATIONS = [
+    "Sector 17, Chandigarh", "Sector 22, Chandigarh", "Sector 35, Chandigarh",
+    "Phase 3B2, Mohali", "Phase 7, Mohali", "Sector 70, Mohali",
+    "Sector 9, Panchkula", "Sector 20, Panchkula", "Zirakpur", "Kharar",
+]
+LANGUAGES = ["English", "Hindi", "Punjabi"]
+MODES = ["Online", "Home", "I can travel"]
+
+
+@dataclass
+class Scale:
+    tutors: int = 200
+    students: int = 200
+    requirements: int = 400
+    reviews: int = 600
+    messages: int = 2000
+
+
+@dataclass
+class Account:
+    id: str
+    email: str
+    token: str
+
+    @property
+    def headers(self):
+        return {"Authorization": f"Bearer {self.token}"}
+
+
+@dataclass
+class Fixture:
+    tutors: List[Account] = field(default_factory=list)
+    students: List[Account] = field(default_factory=list)
+    # Spent down by the spend_concurrency scenario; nothing else touches it
+    wallet_student: Optional[Account] = None
+    # (posting student, requirement id)
+    requirements: List[Tuple[Account, str]] = field(default_factory=list)
+    conversations: List[Tuple[Account, Account]] = field(default_factory=list)
+
+
+async def gather_limited(coroutines: Iterable[Awaitable[Any]], limit: int) -> List[Any]:
+    semaphore = asyncio.Semaphore(limit)
+
+    async def bounded(coroutine):
+        async with semaphore:
+            return await coroutine
+
+    return await asyncio.gather(*(bounded(coroutine) for coroutine in coroutines))
+
+
+def _check(response: httpx.Response) -> dict:
+    if response.status_code != 200:
+        raise RuntimeError(f"Seeding {response.request.method} {response.request.url.path} failed: "
+                           f"{response.status_code} {response.text}")
+    return response.json()
+
+
+async def _signup(client: httpx.AsyncClient, role: str, index: int) -> Account:
+    email = f"{role}{index}@bench.example.com"
+    data = _check(await client.post("/api/auth/signup", json={
+        "email": email,
+        "password": PASSWORD,
+        "role": role,
+        "name": f"Bench {role.title()} {index}",
+        "mobile": f"9{index:09d}",
+    }))
+    return Account(data["user"]["id"], email, data["token"])
+
+
+def _tutor_profile(rng: random.Random) -> dict:
+    fee_min = rng.randrange(200, 1500, 50)
+    return {
+        "subjects": [
+            {"subject": subject, "classes": rng.sample(CLASSES, 2)}
+            for subject in rng.sample(SUBJECTS, rng.randint(1, 3))
+        ],
+        "languages": rng.sample(LANGUAGES, rng.randint(1, 3)),
+        "fee_min": fee_min,
+        "fee_max": fee_min + rng.randrange(100, 1500, 50),
+        "location": rng.choice(LOCATIONS),
+        "teaches_online": rng.random() < 0.6,
+        "teaches_at_home": rng.random() < 0.5,
+        "experience": [{"role": "Teacher", "company_institute": "Bench Academy", "duration": f"{rng.randint(1, 15)} years"}],
+        "total_teaching_exp": f"{rng.randint(1, 15)} years",
+    }
+
+
+def _requirement(rng: random.Random, index: int) -> dict:
+    return {
+        "subject": rng.choice(SUBJECTS),
+        "level_class": rng.choice(CLASSES),
+        "mode": rng.sample(MODES, rng.randint(1, 2)),
+        "requirement_type": "tuition",
+        "time_preference": rng.choice(["morning", "evening", "weekend"]),
+        "languages": rng.sample(LANGUAGES, 1),
+        "location": rng.choice(LOCATIONS),
+        "phone": f"8{index:09d}",
+        "description": "Looking for a patient tutor " * rng.randint(1, 6),
+    }
+
+
+async def seed(client: httpx.AsyncClient, db, user_cache, scale: Scale, rng: random.Random, concurrency: int = 20) -> Fixture:
+    fixture = Fixture()
+
+    # Cheap hashes while signing up; everyone gets a real-cost hash below
+    rounds, passwords.BCRYPT_ROUNDS = passwords.BCRYPT_ROUNDS, 4
+    try:
+        fixture.tutors = await gather_limited((_signup(client, "tutor", i) for i in range(scale.tutors)), concurrency)
+        fixture.students = await gather_limited((_signup(client, "student", i) for i in range(scale.students)), concurrency)
+        fixture.wallet_student = await _signup(client, "student", scale.students)
+    finally:
+        passwords.BCRYPT_ROUNDS = rounds
+
+    # Email verification and coin purchases have no offline API path
+    await db.users.update_many(
+        {"role": {"$ne": "tutor"}},
+        {"$set": {"email_verified": True, "coins": 1_000_000}}
+    )
+    await db.users.update_many({}, {"$set": {"password": await passwords.hash_password(PASSWORD)}})
+    user_cache.clear()
+
+    for response in await gather_limited((
+        client.put("/api/tutor/profile", json=_tutor_profile(rng), headers=tutor.headers)
+        for tutor in fixture.tutors
+    ), concurrency):
+        _check(response)
+
+    posters = [rng.choice(fixture.students) for _ in range(scale.requirements)]
+    responses = await gather_limited((
+        client.post("/api/requirements", json=_requirement(rng, i), headers=student.headers)
+        for i, student in enumerate(posters)
+    ), concurrency)
+    fixture.requirements = [(student, _check(response)["id"]) for student, response in zip(posters, responses)]
+
+    pairs = {(rng.randrange(len(fixture.students)), rng.randrange(len(fixture.tutors))) for _ in range(scale.reviews)}
+    for response in await gather_limited((
+        client.post("/api/reviews", json={
+            "tutor_id": fixture.tutors[tutor].id,
+            "rating": rng.choice([3, 4, 4, 5, 5]),
+            "comment": "Explains concepts clearly. " * rng.randint(1, 4),
+        }, headers=fixture.students[student].headers)
+        for student, tutor in pairs
+    ), concurrency):
+        _check(response)
+
+    conversation_count = max(1, min(scale.messages // 5, len(fixture.students) * len(fixture.tutors)))
+    fixture.conversations = list({
+        (rng.randrange(len(fixture.students)), rng.randrange(len(fixture.tutors)))
+        for _ in range(conversation_count)
+    })
+    fixture.conversations = [(fixture.students[s], fixture.tutors[t]) for s, t in fixture.conversations]
+
+    async def send(index: int):
+        turn, position = divmod(index, len(fixture.conversations))
+        student, tutor = fixture.conversations[position]
+        sender, recipient = (student, tutor) if turn % 2 == 0 else (tutor, student)
+        return await client.post("/api/messages", json={
+            "recipient_id": recipient.id,
+            "message": f"Bench message {index}: " + "when can we schedule the next class? " * rng.randint(1, 3),
+        }, headers=sender.headers)
+
+    for response in await gather_limited((send(i) for i in range(scale.messages)), concurrency):
+        _check(response)
+
+    return fixture
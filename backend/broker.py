@@ -0,0 +1,208 @@
+"""Topic pub/sub that fans live events out to every worker process.
+
+Live endpoints (the requirement feed, the messaging socket) hold their
+connections in one worker, but the write that produces an event can land on
+any worker. Writers `publish(topic, payload)`. Every worker's broker calls
+the handlers `subscribe`d to that topic, and the handler delivers to the
+connections it holds locally.
+
+`MemoryBroker` calls the handlers in-process and is only correct for a
+single worker. `ChangeStreamBroker` inserts events into `realtime_events` and
+tails the collection with a change stream, which needs a replica set.
+`PollingBroker` is the stand-in for standalone servers: it re-reads the last
+few seconds of `realtime_events` on a short interval. A TTL index keeps the
+collection small either way. `create_broker` picks one from the
+REALTIME_BROKER setting.
+
+`Mailbox` is the bounded per-connection queue the live endpoints share.
+"""
+import asyncio
+import logging
+from abc import ABC, abstractmethod
+from collections import OrderedDict, defaultdict
+from datetime import datetime, timezone, timedelta
+from typing import Any, Callable, Dict, List, Optional
+
+from pymongo.errors import OperationFailure
+
+logger = logging.getLogger(__name__)
+
+REALTIME_INDEXES = [
+    # Events are only read within seconds of being written
+    ([("created_at", 1)], {"expireAfterSeconds": 300}),
+]
+
+# The server error codes for "change streams need a replica set" and
+# "resume point no longer in the oplog"
+_CHANGE_STREAMS_UNSUPPORTED = {40573}
+_CHANGE_STREAM_HISTORY_LOST = {280, 286}
+
+Handler = Callable[[Dict[str, Any]], Any]
+
+
+class Mailbox:
+    """Bounded event queue for one live connection"""
+
+    def __init__(self, max_queue: int):
+        # None is the close signal, so leave room for it
+        self.queue: "asyncio.Queue[Optional[Dict[str, Any]]]" = asyncio.Queue(max_queue + 1)
+        self.max_queue = max_queue
+        self.closed = False
+
+    def offer(self, event: Dict[str, Any]) -> bool:
+        """Queue `event`; False when the consumer has fallen too far behind"""
+        if self.closed or self.queue.qsize() >= self.max_queue:
+            return False
+        self.queue.put_nowait(event)
+        return True
+
+    def close(self) -> None:
+        if self.closed:
+            return
+        self.closed = True
+        # Undelivered events are dropped; clients catch up from MongoDB
+        while not self.queue.empty():
+            self.queue.get_nowait()
+        self.queue.put_nowait(None)
+
+
+class Broker(ABC):
+    """Interface: handlers run on every worker for every event published on their topic"""
+
+    def __init__(self):
+        self._handlers: Dict[str, List[Handler]] = defaultdict(list)
+        self.published_total = 0
+
+    def subscribe(self, topic: str, handler: Handler) -> None:
+        self._handlers[topic].append(handler)
+
+    def _dispatch(self, topic: str, payload: Dict[str, Any]) -> None:
+        for handler in self._handlers.get(topic, ()):
+            try:
+                handler(payload)
+            except Exception as e:
+                logger.error(f"Broker handler for {topic} failed: {str(e)}")
+
+    @abstractmethod
+    async def publish(self, topic: str, payload: Dict[str, Any]) -> None:
+        ...
+
+    def start(self) -> None:
+        pass
+
+    async def stop(self) -> None:
+        pass
+
+
+class MemoryBroker(Broker):
+    async def publish(self, topic: str, payload: Dict[str, Any]) -> None:
+        self.published_total += 1
+        self._dispatch(topic, payload)
+
+
+class PollingBroker(Broker):
+    def __init__(self, db, poll_interval: float = 0.5, window_seconds: float = 5.0):
+        super().__init__()
+        self.collection = db.realtime_events
+        self.poll_interval = poll_interval
+        # Workers' inserts do not become visible in created_at order; re-read
+        # a window behind the last poll and skip events already dispatched
+        self.window = timedelta(seconds=window_seconds)
+        self._seen: "OrderedDict[Any, datetime]" = OrderedDict()
+        self._since: Optional[datetime] = None
+        self._task: Optional[asyncio.Task] = None
+
+    async def publish(self, topic: str, payload: Dict[str, Any]) -> None:
+        await self.collection.insert_one({
+            "topic": topic,
+            "payload": payload,
+            "created_at": datetime.now(timezone.utc),
+        })
+        self.published_total += 1
+
+    async def poll(self) -> int:
+        started = datetime.now(timezone.utc)
+        since = (self._since or started) - self.window
+        events = await self.collection.find(
+            {"created_at": {"$gte": since}}, {"topic": 1, "payload": 1}
+        ).sort("created_at", 1).to_list(None)
+
+        dispatched = 0
+        for event in events:
+            if event["_id"] in self._seen:
+                continue
+            self._seen[event["_id"]] = started
+            self._dispatch(event["topic"], event["payload"])
+            dispatched += 1
+
+        # Anything older than the next window can no longer be re-read
+        while self._seen and next(iter(self._seen.values())) < since:
+            self._seen.popitem(last=False)
+        self._since = started
+        return dispatched
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.poll()
+            except Exception as e:
+                logger.error(f"Realtime event poll failed: {str(e)}")
+            await asyncio.sleep(self.poll_interval)
+
+    def start(self) -> None:
+        if self._task is None:
+            # Only events published from now on
+            self._since = datetime.now(timezone.utc)
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+class ChangeStreamBroker(PollingBroker):
+    """Tails `realtime_events` with a change stream; polls if the server cannot"""
+
+    async def _watch(self) -> None:
+        resume_token = None
+        while True:
+            try:
+                async with self.collection.watch(
+                    [{"$match": {"operationType": "insert"}}], resume_after=resume_token
+                ) as stream:
+                    async for change in stream:
+                        resume_token = change["_id"]
+                        event = change["fullDocument"]
+                        self._dispatch(event["topic"], event["payload"])
+            except OperationFailure as e:
+                if e.code in _CHANGE_STREAMS_UNSUPPORTED:
+                    raise
+                if e.code in _CHANGE_STREAM_HISTORY_LOST:
+                    resume_token = None
+                logger.error(f"Realtime change stream failed, reopening: {str(e)}")
+            except Exception as e:
+                logger.error(f"Realtime change stream failed, reopening: {str(e)}")
+            await asyncio.sleep(1)
+
+    async def _run(self) -> None:
+        try:
+            await self._watch()
+        except OperationFailure as e:
+            logger.warning(f"Change streams unavailable ({str(e)}); polling realtime_events instead")
+            self._since = datetime.now(timezone.utc)
+            await super()._run()
+
+
+def create_broker(kind: str, db, poll_interval: float = 0.5) -> Broker:
+    if kind == "memory":
+        return MemoryBroker()
+    if kind == "changestream":
+        return ChangeStreamBroker(db, poll_interval=poll_interval)
+    if kind == "polling":
+        return PollingBroker(db, poll_interval=poll_interval)
+    raise ValueError(f"Unknown REALTIME_BROKER '{kind}', expected 'memory', 'changestream' or 'polling'")
@@ -0,0 +1,219 @@
+"""Materialized conversation index for GET /api/messages/conversations.
+
+One document per (user_id, partner_id) holds the latest message, its time,
+the partner's name and the user's unread count for that partner. It is
+updated by the messaging write paths so listing conversations is a single
+indexed query whose cost does not grow with message history.
+
+`unread_counters` holds each user's total unread count under `_id`, so the
+unread badge is a primary-key read instead of a count over `messages`. Both
+counters are incremented on send and decremented by the number of messages
+a read actually flipped. `reconcile_unread_counters` recomputes them from
+`messages` if they ever drift.
+"""
+from collections import Counter
+from typing import Any, Dict, Set, Tuple
+
+from pymongo import UpdateOne
+
+CONVERSATIONS_DESC = [("last_message_time", -1), ("partner_id", -1)]
+
+CONVERSATION_INDEXES = [
+    ([("user_id", 1), ("partner_id", 1)], {"unique": True}),
+    ([("user_id", 1), ("last_message_time", -1), ("partner_id", -1)], {}),
+    ([("partner_id", 1)], {}),
+]
+
+CONVERSATION_PROJECTION = {"_id": 0, "user_id": 0, "last_message_id": 0}
+
+
+def _last_message(message: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "last_message": message["message"],
+        "last_message_time": message["created_at"],
+        "last_message_id": message["id"],
+    }
+
+
+async def record_message(db, message: Dict[str, Any]) -> None:
+    """Reflect a newly sent message in both participants' conversation rows"""
+    sender_id = message["sender_id"]
+    recipient_id = message["recipient_id"]
+
+    result = await db.conversations.update_one(
+        {"user_id": sender_id, "partner_id": recipient_id},
+        {"$set": _last_message(message), "$setOnInsert": {"unread_count": 0}},
+        upsert=True
+    )
+    if result.upserted_id is not None:
+        # Only a brand-new conversation needs the partner's name looked up
+        partner = await db.users.find_one({"id": recipient_id}, {"_id": 0, "name": 1})
+        await db.conversations.update_one(
+            {"_id": result.upserted_id},
+            {"$set": {"partner_name": partner.get("name", "Unknown") if partner else "Unknown"}}
+        )
+
+    await db.conversations.update_one(
+        {"user_id": recipient_id, "partner_id": sender_id},
+        {
+            "$set": {**_last_message(message), "partner_name": message.get("sender_name") or "Unknown"},
+            "$inc": {"unread_count": 1},
+        },
+        upsert=True
+    )
+    await db.unread_counters.update_one({"_id": recipient_id}, {"$inc": {"unread": 1}}, upsert=True)
+
+
+async def _decrement(collection, query: Dict[str, Any], field: str, count: int) -> None:
+    result = await collection.update_one({**query, field: {"$gte": count}}, {"$inc": {field: -count}})
+    if result.matched_count == 0:
+        # The counter had drifted below the real count; never go negative
+        await collection.update_one(query, {"$set": {field: 0}})
+
+
+async def mark_conversation_read(db, user_id: str, partner_id: str, count: int) -> None:
+    """`count` unread messages from `partner_id` were read by `user_id`"""
+    if count <= 0:
+        return
+    await _decrement(db.conversations, {"user_id": user_id, "partner_id": partner_id}, "unread_count", count)
+    await _decrement(db.unread_counters, {"_id": user_id}, "unread", count)
+
+
+async def message_read(db, user_id: str, partner_id: str) -> None:
+    """One unread message from `partner_id` was read by `user_id`"""
+    await mark_conversation_read(db, user_id, partner_id, 1)
+
+
+async def unread_count(db, user_id: str) -> int:
+    counter = await db.unread_counters.find_one({"_id": user_id})
+    return max(counter.get("unread", 0), 0) if counter else 0
+
+
+async def discard_unread_from(db, sender_id: str) -> None:
+    """Take `sender_id`'s unread messages off their recipients' counters, before deleting them"""
+    recipients = await db.messages.aggregate([
+        {"$match": {"sender_id": sender_id, "read": False}},
+        {"$group": {"_id": "$recipient_id", "count": {"$sum": 1}}},
+    ]).to_list(None)
+    for recipient in recipients:
+        await _decrement(db.unread_counters, {"_id": recipient["_id"]}, "unread", recipient["count"])
+
+
+async def delete_user_conversations(db, user_id: str) -> None:
+    await db.conversations.delete_many({"$or": [{"user_id": user_id}, {"partner_id": user_id}]})
+    await db.unread_counters.delete_one({"_id": user_id})
+
+
+async def reconcile_unread_counters(db) -> Dict[str, int]:
+    """Recompute per-conversation and per-user unread counts from `messages`.
+
+    One aggregation counts unread messages per (recipient, sender); counters
+    that disagree are rewritten and stale non-zero ones reset. A message sent
+    while this runs can be counted twice or not at all, so run it when
+    traffic is low.
+    """
+    pairs = await db.messages.aggregate([
+        {"$match": {"read": False}},
+        {"$group": {"_id": {"user_id": "$recipient_id", "partner_id": "$sender_id"}, "count": {"$sum": 1}}},
+    ], allowDiskUse=True).to_list(None)
+
+    by_pair: Dict[Tuple[str, str], int] = {
+        (pair["_id"]["user_id"], pair["_id"]["partner_id"]): pair["count"] for pair in pairs
+    }
+    by_user: Counter = Counter()
+    for (user_id, _), count in by_pair.items():
+        by_user[user_id] += count
+
+    conversation_ops = [
+        UpdateOne({"user_id": user_id, "partner_id": partner_id}, {"$set": {"unread_count": count}})
+        for (user_id, partner_id), count in by_pair.items()
+    ]
+    stale: Set[Tuple[str, str]] = set()
+    async for row in db.conversations.find({"unread_count": {"$ne": 0}}, {"_id": 0, "user_id": 1, "partner_id": 1}):
+        if (row["user_id"], row["partner_id"]) not in by_pair:
+            stale.add((row["user_id"], row["partner_id"]))
+    conversation_ops += [
+        UpdateOne({"user_id": user_id, "partner_id": partner_id}, {"$set": {"unread_count": 0}})
+        for user_id, partner_id in stale
+    ]
+
+    counter_ops = [
+        UpdateOne({"_id": user_id}, {"$set": {"unread": count}}, upsert=True)
+        for user_id, count in by_user.items()
+    ]
+    async for row in db.unread_counters.find({"unread": {"$ne": 0}}, {"_id": 1}):
+        if row["_id"] not in by_user:
+            counter_ops.append(UpdateOne({"_id": row["_id"]}, {"$set": {"unread": 0}}))
+
+    fixed = {"conversations": 0, "users": 0}
+    if conversation_ops:
+        result = await db.conversations.bulk_write(conversation_ops, ordered=False)
+        fixed["conversations"] = result.modified_count
+    if counter_ops:
+        result = await db.unread_counters.bulk_write(counter_ops, ordered=False)
+        fixed["users"] = result.modified_count + result.upserted_count
+    return fixed
+
+
+async def rebuild_conversations(db) -> None:
+    """Rebuild the whole read model from `messages` in one aggregation"""
+    pipeline = [
+        {"$project": {
+            "_id": 0,
+            "views": [
+                {
+                    "user_id": "$sender_id",
+                    "partner_id": "$recipient_id",
+                    "partner_name": None,
+                    "unread": 0,
+                },
+                {
+                    "user_id": "$recipient_id",
+                    "partner_id": "$sender_id",
+                    "partner_name": "$sender_name",
+                    "unread": {"$cond": [{"$eq": ["$read", False]}, 1, 0]},
+                },
+            ],
+            "id": 1,
+            "message": 1,
+            "created_at": 1,
+        }},
+        {"$unwind": "$views"},
+        {"$sort": {"created_at": -1}},
+        {"$group": {
+            "_id": {"user_id": "$views.user_id", "partner_id": "$views.partner_id"},
+            "last_message": {"$first": "$message"},
+            "last_message_time": {"$first": "$created_at"},
+            "last_message_id": {"$first": "$id"},
+            "partner_name": {"$max": "$views.partner_name"},
+            "unread_count": {"$sum": "$views.unread"},
+        }},
+        # Partners who never sent a message only have their name in users
+        {"$lookup": {
+            "from": "users",
+            "localField": "_id.partner_id",
+            "foreignField": "id",
+            "as": "partner",
+            "pipeline": [{"$project": {"_id": 0, "name": 1}}],
+        }},
+        {"$project": {
+            "_id": 0,
+            "user_id": "$_id.user_id",
+            "partner_id": "$_id.partner_id",
+            "last_message": 1,
+            "last_message_time": 1,
+            "last_message_id": 1,
+            "unread_count": 1,
+            "partner_name": {"$ifNull": [
+                {"$first": "$partner.name"},
+                {"$ifNull": ["$partner_name", "Unknown"]},
+            ]},
+        }},
+        {"$merge": {
+            "into": "conversations",
+            "on": ["user_id", "partner_id"],
+            "whenMatched": "replace",
+            "whenNotMatched": "insert",
+        }},
+    ]
+    await db.messages.aggregate(pipeline, allowDiskUse=True).to_list(None)
@@ -0,0 +1,127 @@
+"""Paid access a user holds to a target (tutor or requirement).
+
+Access checks used to scan `transactions` for a completed purchase on every
+message a student sent and twice per `check_tutor_access`. Each purchase now
+also writes one `entitlements` document, unique on (user_id, target_id,
+kind), and `Entitlements` answers checks from a small in-process cache
+backed by that index. Grants are permanent, so positive answers are cached
+for long; negative answers expire quickly so that a grant made by another
+worker process becomes visible.
+"""
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Iterable, Optional, Set, Tuple
+
+from pymongo import UpdateOne
+
+ENTITLEMENT_KINDS = ("message_tutor", "contact_tutor", "view_requirement")
+
+ENTITLEMENT_INDEXES = [
+    ([("user_id", 1), ("target_id", 1), ("kind", 1)], {"unique": True}),
+    ([("target_id", 1)], {}),
+]
+
+
+class Entitlements:
+    def __init__(self, db, max_entries: int = 50000, positive_ttl: float = 3600.0, negative_ttl: float = 10.0):
+        self.db = db
+        self.max_entries = max_entries
+        self.positive_ttl = positive_ttl
+        self.negative_ttl = negative_ttl
+        self._entries: "OrderedDict[Tuple[str, str, str], tuple]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def _cached(self, key: Tuple[str, str, str]) -> Optional[bool]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, granted = entry
+        if expires_at < time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return granted
+
+    def _remember(self, key: Tuple[str, str, str], granted: bool) -> None:
+        if self.max_entries <= 0:
+            return
+        ttl = self.positive_ttl if granted else self.negative_ttl
+        self._entries[key] = (time.monotonic() + ttl, granted)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def granted_kinds(self, user_id: str, target_id: str, kinds: Iterable[str]) -> Set[str]:
+        """Which of `kinds` the user holds on target, in at most one query"""
+        granted, unknown = set(), []
+        for kind in kinds:
+            cached = self._cached((user_id, target_id, kind))
+            if cached is None:
+                unknown.append(kind)
+            elif cached:
+                granted.add(kind)
+
+        if not unknown:
+            self.hits += 1
+            return granted
+
+        self.misses += 1
+        found = {
+            doc["kind"]
+            for doc in await self.db.entitlements.find(
+                {"user_id": user_id, "target_id": target_id, "kind": {"$in": unknown}},
+                {"_id": 0, "kind": 1}
+            ).to_list(len(unknown))
+        }
+        for kind in unknown:
+            self._remember((user_id, target_id, kind), kind in found)
+        return granted | found
+
+    async def has(self, user_id: str, target_id: str, kind: str) -> bool:
+        return kind in await self.granted_kinds(user_id, target_id, (kind,))
+
+    async def grant(self, user_id: str, target_id: str, kind: str, transaction_id: Optional[str] = None) -> None:
+        await self.db.entitlements.update_one(
+            {"user_id": user_id, "target_id": target_id, "kind": kind},
+            {"$setOnInsert": {
+                "transaction_id": transaction_id,
+                "created_at": datetime.now(timezone.utc).isoformat()
+            }},
+            upsert=True
+        )
+        self._remember((user_id, target_id, kind), True)
+
+    async def revoke_all(self, user_id: str) -> None:
+        """Drop entitlements held by or granted on a deleted account"""
+        await self.db.entitlements.delete_many({"$or": [{"user_id": user_id}, {"target_id": user_id}]})
+        for key in [key for key in self._entries if user_id in (key[0], key[1])]:
+            del self._entries[key]
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+async def backfill_entitlements(db, batch_size: int = 500) -> int:
+    """Create entitlements for purchases made before the collection existed"""
+    cursor = db.transactions.find(
+        {"status": "completed", "purpose": {"$in": list(ENTITLEMENT_KINDS)}, "target_id": {"$ne": None}},
+        {"_id": 0, "id": 1, "user_id": 1, "target_id": 1, "purpose": 1, "created_at": 1}
+    )
+    batch, created = [], 0
+    async for transaction in cursor:
+        batch.append(UpdateOne(
+            {"user_id": transaction["user_id"], "target_id": transaction["target_id"], "kind": transaction["purpose"]},
+            {"$setOnInsert": {"transaction_id": transaction["id"], "created_at": transaction.get("created_at")}},
+            upsert=True
+        ))
+        if len(batch) >= batch_size:
+            created += (await db.entitlements.bulk_write(batch, ordered=False)).upserted_count
+            batch = []
+    if batch:
+        created += (await db.entitlements.bulk_write(batch, ordered=False)).upserted_count
+    return created
@@ -0,0 +1,169 @@
+"""Facet counts for the tutor browse page.
+
+The browse UI wants to know how many tutors there are per subject, class,
+locality, language, mode and fee band, for the filters currently applied.
+`FacetCache.get` computes all of them in one `$facet` aggregation over the
+same filter GET /api/tutors uses. Results are cached per filter signature,
+and concurrent misses for the same filters share one aggregation.
+
+`update_tutor_profile` calls `invalidate` when a facet-relevant field
+changes. The TTL bounds staleness for writes made by other worker
+processes.
+"""
+import asyncio
+import json
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List
+
+from gazetteer import LOCALITIES_BY_ID
+
+# Profile fields whose changes can move a facet count
+FACET_FIELDS = frozenset({
+    "subjects", "languages", "location", "fee_min", "fee_max",
+    "teaches_online", "teaches_at_home", "can_travel",
+})
+
+# Fee band boundaries by starting fee (fee_min); the last band is open-ended
+FEE_BUCKETS = [0, 300, 500, 800, 1200, 2000]
+# $bucket's default catches everything outside the boundaries, so the top
+# band gets an explicit upper edge and the default only sees fees below 0
+FEE_BOUNDARIES = [*FEE_BUCKETS, float("inf")]
+BELOW_FEE_BANDS = "below"
+FACET_LIMIT = 50
+
+
+def _distinct_tutors(*unwind: str, value: Any) -> List[Dict[str, Any]]:
+    """Tutors per value; a tutor listing the same value twice counts once"""
+    return [
+        *({"$unwind": path} for path in unwind),
+        {"$group": {"_id": {"value": value, "tutor": "$user_id"}}},
+        {"$group": {"_id": "$_id.value", "count": {"$sum": 1}}},
+        {"$match": {"_id": {"$nin": [None, ""]}}},
+        {"$sort": {"count": -1, "_id": 1}},
+        {"$limit": FACET_LIMIT},
+    ]
+
+
+def facet_pipeline(query: Dict[str, Any]) -> List[Dict[str, Any]]:
+    return [
+        {"$match": query},
+        {"$facet": {
+            "total": [{"$count": "count"}],
+            "subjects": _distinct_tutors("$subjects", value="$subjects.subject"),
+            "classes": _distinct_tutors("$subjects", "$subjects.classes", value="$subjects.classes"),
+            "locations": _distinct_tutors(value={"$ifNull": ["$locality_id", "$location"]}),
+            "languages": _distinct_tutors("$languages", value="$languages"),
+            "modes": [{"$group": {
+                "_id": None,
+                "online": {"$sum": {"$cond": ["$teaches_online", 1, 0]}},
+                "home": {"$sum": {"$cond": ["$teaches_at_home", 1, 0]}},
+                "travel": {"$sum": {"$cond": ["$can_travel", 1, 0]}},
+            }}],
+            "fees": [
+                {"$match": {"fee_min": {"$type": "number"}}},
+                {"$bucket": {
+                    "groupBy": "$fee_min",
+                    "boundaries": FEE_BOUNDARIES,
+                    "default": BELOW_FEE_BANDS,
+                    "output": {"count": {"$sum": 1}},
+                }},
+            ],
+        }},
+    ]
+
+
+def _fee_band(lower: Any) -> Dict[str, Any]:
+    if lower == BELOW_FEE_BANDS:
+        return {"value": f"<{FEE_BUCKETS[0]}", "min": None, "max": FEE_BUCKETS[0]}
+    if lower == FEE_BUCKETS[-1]:
+        return {"value": f"{lower}+", "min": lower, "max": None}
+    upper = FEE_BUCKETS[FEE_BUCKETS.index(lower) + 1]
+    return {"value": f"{lower}-{upper}", "min": lower, "max": upper}
+
+
+def shape_facets(raw: Dict[str, Any]) -> Dict[str, Any]:
+    """Turn the `$facet` output into {facet: [{value, count}, ...]}"""
+    def counts(name: str) -> List[Dict[str, Any]]:
+        return [{"value": row["_id"], "count": row["count"]} for row in raw.get(name, [])]
+
+    locations = []
+    for row in counts("locations"):
+        locality = LOCALITIES_BY_ID.get(row["value"])
+        locations.append({**row, "label": locality.name if locality else row["value"]})
+
+    modes = (raw.get("modes") or [{}])[0]
+
+    return {
+        "total": raw["total"][0]["count"] if raw.get("total") else 0,
+        "subjects": counts("subjects"),
+        "classes": counts("classes"),
+        "locations": locations,
+        "languages": counts("languages"),
+        "modes": [{"value": mode, "count": modes.get(mode, 0)} for mode in ("online", "home", "travel")],
+        "fees": [{**_fee_band(row["_id"]), "count": row["count"]} for row in raw.get("fees", [])],
+    }
+
+
+class FacetCache:
+    def __init__(self, db, max_entries: int = 1000, ttl_seconds: float = 60.0):
+        self.db = db
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._generation = 0
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def signature(query: Dict[str, Any]) -> str:
+        return json.dumps(query, sort_keys=True, default=str)
+
+    async def get(self, query: Dict[str, Any]) -> Dict[str, Any]:
+        """Facet counts for `query`; callers must not mutate the result"""
+        key = self.signature(query)
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] >= time.monotonic():
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+        self.misses += 1
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            return await asyncio.shield(inflight)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        generation = self._generation
+        try:
+            raw = await self.db.tutor_profiles.aggregate(facet_pipeline(query)).to_list(1)
+            facets = shape_facets(raw[0] if raw else {})
+        except BaseException as e:
+            if isinstance(e, Exception):
+                future.set_exception(e)
+                # Mark it retrieved so a failure nobody waited on is not logged
+                future.exception()
+            else:
+                future.cancel()
+            raise
+        finally:
+            self._inflight.pop(key, None)
+
+        future.set_result(facets)
+        # A profile changed while we were counting; do not cache a stale answer
+        if generation == self._generation and self.max_entries > 0 and self.ttl_seconds > 0:
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, facets)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return facets
+
+    def invalidate(self) -> None:
+        # Any filter combination can include the changed profile
+        self._entries.clear()
+        self._generation += 1
+
+    def __len__(self) -> int:
+        return len(self._entries)
@@ -0,0 +1,64 @@
+"""Local stand-ins for the Twilio Verify and Razorpay REST APIs.
+
+Lets the whole OTP and payment flow run (and be load-tested) offline:
+
+    uvicorn fake_providers:app --port 9100
+
+and point the API at it with
+
+    TWILIO_VERIFY_BASE_URL=http://localhost:9100/twilio
+    RAZORPAY_API_BASE_URL=http://localhost:9100/razorpay
+
+FAKE_PROVIDER_LATENCY_MS adds a delay to every call and
+FAKE_PROVIDER_ERROR_RATE (0-1) answers that share of calls with a 503, to
+exercise timeouts, retries and the circuit breaker. Verification checks
+approve FAKE_OTP_CODE (default 123456).
+"""
+import asyncio
+import os
+import random
+import time
+import uuid
+
+from fastapi import FastAPI, Form, HTTPException, Request
+
+LATENCY_MS = float(os.environ.get('FAKE_PROVIDER_LATENCY_MS', '0'))
+ERROR_RATE = float(os.environ.get('FAKE_PROVIDER_ERROR_RATE', '0'))
+FAKE_OTP_CODE = os.environ.get('FAKE_OTP_CODE', '123456')
+
+app = FastAPI(title="Fake Twilio Verify / Razorpay")
+
+
+async def simulate_provider():
+    if LATENCY_MS:
+        await asyncio.sleep(LATENCY_MS / 1000)
+    if ERROR_RATE and random.random() < ERROR_RATE:
+        raise HTTPException(status_code=503, detail="Simulated provider outage")
+
+
+@app.post("/twilio/Services/{service_sid}/Verifications")
+async def create_verification(service_sid: str, To: str = Form(...), Channel: str = Form("sms")):
+    await simulate_provider()
+    return {"sid": f"VE{uuid.uuid4().hex}", "service_sid": service_sid, "to": To, "channel": Channel, "status": "pending"}
+
+
+@app.post("/twilio/Services/{service_sid}/VerificationCheck")
+async def check_verification(service_sid: str, To: str = Form(...), Code: str = Form(...)):
+    await simulate_provider()
+    status = "approved" if Code == FAKE_OTP_CODE else "pending"
+    return {"sid": f"VE{uuid.uuid4().hex}", "service_sid": service_sid, "to": To, "status": status}
+
+
+@app.post("/razorpay/orders")
+async def create_order(request: Request):
+    await simulate_provider()
+    order = await request.json()
+    return {
+        "id": f"order_{uuid.uuid4().hex[:14]}",
+        "entity": "order",
+        "amount": order.get("amount"),
+        "currency": order.get("currency", "INR"),
+        "status": "created",
+        "notes": order.get("notes", {}),
+        "created_at": int(time.time()),
+    }
@@ -0,0 +1,174 @@
+"""Live feed of newly posted requirements for tutor dashboards.
+
+Tutor dashboards used to poll GET /api/requirements, which re-sorted and
+re-sent the same page every time. `create_requirement` now publishes each new
+requirement on the broker's FEED_TOPIC. Each worker's `RequirementFeed` hands
+it only to the connected tutors teaching one of its subject words.
+Subscribers are indexed by subject word, so a post touches only the tutors
+it concerns.
+
+Every connection has a bounded queue. A client that falls `max_queue` events
+behind is disconnected instead of buffering without limit. It reconnects with
+the id of the last event it received, and the missed requirements are
+replayed from MongoDB in (created_at, id) order over the partial index on
+active requirements.
+"""
+import asyncio
+import logging
+from collections import defaultdict
+from typing import Any, AsyncIterator, Dict, FrozenSet, Iterable, List, Optional, Set, Tuple
+
+from broker import Mailbox
+from matching import subject_tokens
+from pagination import CREATED_ASC, after_cursor, decode_cursor, encode_cursor
+
+logger = logging.getLogger(__name__)
+
+FEED_TOPIC = "requirements"
+
+# Event ids are keyset cursors over this order, so a resume is a range scan
+FEED_ORDER = CREATED_ASC
+FEED_PROJECTION = {"_id": 0, "geo": 0}
+
+
+def feed_event(requirement: Dict[str, Any]) -> Dict[str, Any]:
+    return {key: value for key, value in requirement.items() if key not in FEED_PROJECTION}
+
+
+def event_id(requirement: Dict[str, Any]) -> str:
+    return encode_cursor(requirement, FEED_ORDER)
+
+
+def _position(requirement: Dict[str, Any]) -> Tuple[Any, ...]:
+    return tuple(requirement.get(field) for field, _ in FEED_ORDER)
+
+
+def tutor_subjects(subjects: Optional[Iterable[Dict[str, Any]]]) -> FrozenSet[str]:
+    """Subject words across a tutor profile's `subjects` entries"""
+    tokens: Set[str] = set()
+    for entry in subjects or []:
+        tokens.update(subject_tokens(entry.get("subject")))
+    return frozenset(tokens)
+
+
+class Subscription(Mailbox):
+    def __init__(self, user_id: str, subjects: FrozenSet[str], max_queue: int):
+        super().__init__(max_queue)
+        self.user_id = user_id
+        self.subjects = subjects
+
+
+class RequirementFeed:
+    def __init__(self, db, max_queue: int = 100, replay_limit: int = 500, heartbeat_seconds: float = 15.0):
+        self.db = db
+        self.max_queue = max_queue
+        self.replay_limit = replay_limit
+        self.heartbeat_seconds = heartbeat_seconds
+        self._by_subject: Dict[str, Set[Subscription]] = defaultdict(set)
+        self._by_user: Dict[str, Set[Subscription]] = defaultdict(set)
+        self.published_total = 0
+        self.overflow_total = 0
+
+    @property
+    def connections(self) -> int:
+        return sum(len(subscriptions) for subscriptions in self._by_user.values())
+
+    def _index(self, subscription: Subscription) -> None:
+        for token in subscription.subjects:
+            self._by_subject[token].add(subscription)
+
+    def _unindex(self, subscription: Subscription) -> None:
+        for token in subscription.subjects:
+            subscribers = self._by_subject.get(token)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._by_subject[token]
+
+    def subscribe(self, user_id: str, subjects: FrozenSet[str]) -> Subscription:
+        subscription = Subscription(user_id, subjects, self.max_queue)
+        self._index(subscription)
+        self._by_user[user_id].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        self._unindex(subscription)
+        subscriptions = self._by_user.get(subscription.user_id)
+        if subscriptions is not None:
+            subscriptions.discard(subscription)
+            if not subscriptions:
+                del self._by_user[subscription.user_id]
+
+    def retarget(self, user_id: str, subjects: Optional[Iterable[Dict[str, Any]]]) -> None:
+        """Follow a profile edit on the tutor's open connections"""
+        tokens = tutor_subjects(subjects)
+        for subscription in self._by_user.get(user_id, ()):
+            self._unindex(subscription)
+            subscription.subjects = tokens
+            self._index(subscription)
+
+    def disconnect(self, user_id: str) -> None:
+        for subscription in list(self._by_user.get(user_id, ())):
+            self.unsubscribe(subscription)
+            subscription.close()
+
+    def close(self) -> None:
+        for user_id in list(self._by_user):
+            self.disconnect(user_id)
+
+    def publish(self, requirement: Dict[str, Any]) -> int:
+        """Hand a new requirement to local matching subscribers; returns how many got it"""
+        subscribers: Set[Subscription] = set()
+        for token in subject_tokens(requirement.get("subject")):
+            subscribers.update(self._by_subject.get(token, ()))
+
+        delivered = 0
+        for subscription in subscribers:
+            if subscription.offer(requirement):
+                delivered += 1
+            else:
+                logger.info(f"Requirement feed for {subscription.user_id} fell behind; disconnecting")
+                self.overflow_total += 1
+                self.unsubscribe(subscription)
+                subscription.close()
+        self.published_total += 1
+        return delivered
+
+    async def _replay(self, subjects: FrozenSet[str], last_event_id: str) -> List[Dict[str, Any]]:
+        query = after_cursor({"status": "active"}, FEED_ORDER, last_event_id)
+        missed = await self.db.requirements.find(query, FEED_PROJECTION).sort(FEED_ORDER).to_list(self.replay_limit)
+        return [requirement for requirement in missed if subject_tokens(requirement.get("subject")) & subjects]
+
+    async def events(
+        self, user_id: str, subjects: FrozenSet[str], last_event_id: Optional[str] = None
+    ) -> AsyncIterator[Optional[Dict[str, Any]]]:
+        """Requirements for one connection, oldest first.
+
+        Anything posted after `last_event_id` (at most `replay_limit` posts)
+        is replayed before live events. Yields None after `heartbeat_seconds`
+        without an event so the transport can send a keep-alive. Ends when
+        the subscription is closed for falling behind or on shutdown.
+        """
+        # Subscribe before replaying so nothing posted in between is lost
+        subscription = self.subscribe(user_id, subjects)
+        try:
+            seen = tuple(decode_cursor(last_event_id, FEED_ORDER)) if last_event_id else None
+            if last_event_id:
+                for requirement in await self._replay(subjects, last_event_id):
+                    seen = _position(requirement)
+                    yield requirement
+
+            while True:
+                try:
+                    requirement = await asyncio.wait_for(subscription.queue.get(), self.heartbeat_seconds)
+                except asyncio.TimeoutError:
+                    yield None
+                    continue
+                if requirement is None:
+                    return
+                # Already sent by the replay
+                if seen is not None and _position(requirement) <= seen:
+                    continue
+                yield requirement
+        finally:
+            self.unsubscribe(subscription)
@@ -0,0 +1,379 @@
+"""Built-in gazetteer of Tricity localities.
+
+`location` is free text, so "Sector 17", "sec-17 Chandigarh" and
+"Chandigarh - Sector 17" used to be three different places. `resolve` maps
+such text onto one canonical locality: Chandigarh sectors, Mohali phases and
+sectors, Panchkula, Zirakpur and the surrounding towns (the same list the
+profile and requirement forms offer). Profiles and requirements store the
+result on write as `locality_id` plus a GeoJSON `geo` point, which backs
+the 2dsphere indexes used by `near=` / `radius_km=` searches.
+
+Coordinates are approximate locality centroids, good to about a kilometre.
+That is enough for radius search, but not for directions. Chandigarh
+sectors are placed on the city's rotated grid instead of being listed one
+by one.
+"""
+import math
+import re
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+from pymongo import UpdateOne
+
+GEO_INDEXES = [
+    ([("geo", "2dsphere")], {"name": "geo"}),
+]
+
+EARTH_RADIUS_KM = 6371.0
+
+
+@dataclass(frozen=True)
+class Locality:
+    id: str
+    name: str
+    city: Optional[str]
+    lat: float
+    lng: float
+
+    @property
+    def point(self) -> Dict[str, Any]:
+        return {"type": "Point", "coordinates": [self.lng, self.lat]}
+
+
+# Sector 17 and one step along a row / down a column of the sector grid
+_GRID_ORIGIN = (30.7412, 76.7788)
+_GRID_COLUMN = (-0.0034, 0.0081)
+_GRID_ROW = (-0.0093, -0.0082)
+
+# sector -> (row, column) on the grid; positions are taken as offsets from
+# Sector 17 at row 2, column 3
+_CHANDIGARH_GRID = {
+    1: (0, 1.5), 2: (0, 2.5), 3: (0, 3.5), 4: (0, 4.5), 5: (0, 5.5), 6: (0, 6.5),
+    12: (1, 0), 11: (1, 1), 10: (1, 2), 9: (1, 3), 8: (1, 4), 7: (1, 5),
+    14: (2, 0), 15: (2, 1), 16: (2, 2), 17: (2, 3), 18: (2, 4), 19: (2, 5), 26: (2, 6),
+    25: (3, 0), 24: (3, 1), 23: (3, 2), 22: (3, 3), 21: (3, 4), 20: (3, 5), 27: (3, 6), 28: (3, 7), 29: (3, 8),
+    39: (4, -1), 38: (4, 0), 37: (4, 1), 36: (4, 2), 35: (4, 3), 34: (4, 4), 33: (4, 5), 32: (4, 6), 31: (4, 7),
+    30: (4, 8),
+    40: (5, -1), 41: (5, 0), 42: (5, 1), 43: (5, 2), 44: (5, 3), 45: (5, 4), 46: (5, 5), 47: (5, 6), 48: (5, 7),
+    56: (6, -1), 55: (6, 0), 54: (6, 1), 53: (6, 2), 52: (6, 3), 51: (6, 4), 50: (6, 5), 49: (6, 6),
+}
+
+# (city, place, lat, lng); a place of None is the town itself
+_PLACES: List[Tuple[Optional[str], Optional[str], float, float]] = [
+    ("Chandigarh", None, 30.7333, 76.7794),
+    ("Chandigarh", "Manimajra", 30.7205, 76.8390),
+    ("Chandigarh", "Dhanas", 30.7640, 76.7490),
+    ("Chandigarh", "Maloya", 30.7207, 76.7325),
+    ("Chandigarh", "Daria", 30.7040, 76.8220),
+    ("Chandigarh", "Hallomajra", 30.6930, 76.7980),
+    ("Chandigarh", "Kaimbwala", 30.7740, 76.8080),
+    ("Chandigarh", "Khuda Ali Sher", 30.7780, 76.7900),
+    ("Chandigarh", "Burail", 30.7080, 76.7670),
+    ("Chandigarh", "Attawa", 30.7270, 76.7550),
+    ("Chandigarh", "IT Park", 30.7270, 76.8460),
+    ("Chandigarh", "PGI", 30.7646, 76.7758),
+    ("Chandigarh", "Panjab University Campus", 30.7600, 76.7680),
+    ("Chandigarh", "Industrial Area Phase 1", 30.7080, 76.7990),
+    ("Chandigarh", "Industrial Area Phase 2", 30.7000, 76.8040),
+    ("Chandigarh", "Grain Market", 30.7110, 76.8020),
+    ("Mohali", None, 30.7046, 76.7179),
+    ("Mohali", "Phase 1", 30.7290, 76.7230),
+    ("Mohali", "Phase 2", 30.7250, 76.7160),
+    ("Mohali", "Phase 3A", 30.7190, 76.7280),
+    ("Mohali", "Phase 3B", 30.7080, 76.7240),
+    ("Mohali", "Phase 4", 30.7150, 76.7160),
+    ("Mohali", "Phase 4A", 30.7170, 76.7110),
+    ("Mohali", "Phase 5", 30.7110, 76.7100),
+    ("Mohali", "Phase 6", 30.7280, 76.7100),
+    ("Mohali", "Phase 7", 30.7100, 76.7190),
+    ("Mohali", "Phase 8", 30.7050, 76.7050),
+    ("Mohali", "Phase 8A", 30.7080, 76.6950),
+    ("Mohali", "Phase 8B", 30.7000, 76.6980),
+    ("Mohali", "Phase 9", 30.6990, 76.7240),
+    ("Mohali", "Phase 10", 30.6950, 76.7170),
+    ("Mohali", "Phase 11", 30.6890, 76.7080),
+    ("Mohali", "Sector 58", 30.7200, 76.7040),
+    ("Mohali", "Sector 59", 30.7140, 76.7130),
+    ("Mohali", "Sector 60", 30.7080, 76.7220),
+    ("Mohali", "Sector 61", 30.7100, 76.7190),
+    ("Mohali", "Sector 62", 30.7040, 76.7060),
+    ("Mohali", "Sector 63", 30.6990, 76.7240),
+    ("Mohali", "Sector 64", 30.6950, 76.7170),
+    ("Mohali", "Sector 65", 30.6890, 76.7080),
+    ("Mohali", "Sector 66", 30.6840, 76.7180),
+    ("Mohali", "Sector 67", 30.6890, 76.7260),
+    ("Mohali", "Sector 68", 30.6950, 76.7320),
+    ("Mohali", "Sector 69", 30.6900, 76.7370),
+    ("Mohali", "Sector 70", 30.6960, 76.7080),
+    ("Mohali", "Sector 71", 30.7010, 76.7010),
+    ("Mohali", "Sector 72", 30.6980, 76.6910),
+    ("Mohali", "Sector 74", 30.6890, 76.6970),
+    ("Mohali", "Sector 76", 30.6890, 76.7220),
+    ("Mohali", "Sector 77", 30.6840, 76.7140),
+    ("Mohali", "Sector 78", 30.6800, 76.7060),
+    ("Mohali", "Sector 79", 30.6760, 76.7150),
+    ("Mohali", "Sector 80", 30.6720, 76.7240),
+    ("Mohali", "Sector 82", 30.6640, 76.7090),
+    ("Mohali", "Sector 86", 30.6720, 76.6900),
+    ("Mohali", "Sector 88", 30.6640, 76.6950),
+    ("Mohali", "Sector 91", 30.6610, 76.7160),
+    ("Mohali", "Aerocity", 30.6680, 76.7560),
+    ("Mohali", "IT City", 30.6510, 76.7290),
+    ("Mohali", "VR Punjab", 30.7360, 76.6830),
+    ("Mohali", "Kharar Road", 30.7300, 76.6900),
+    ("Mohali", "Airport Road", 30.6800, 76.7400),
+    ("Mohali", "Balongi", 30.7330, 76.6950),
+    ("Mohali", "Sohana", 30.6860, 76.7010),
+    ("Panchkula", None, 30.6942, 76.8606),
+    ("Panchkula", "Sector 1", 30.6990, 76.8530),
+    ("Panchkula", "Sector 2", 30.7080, 76.8520),
+    ("Panchkula", "Sector 3", 30.7130, 76.8560),
+    ("Panchkula", "Sector 4", 30.7040, 76.8600),
+    ("Panchkula", "Sector 5", 30.6940, 76.8600),
+    ("Panchkula", "Sector 6", 30.7050, 76.8480),
+    ("Panchkula", "Sector 7", 30.7100, 76.8450),
+    ("Panchkula", "Sector 8", 30.7080, 76.8400),
+    ("Panchkula", "Sector 9", 30.6990, 76.8460),
+    ("Panchkula", "Sector 10", 30.6960, 76.8540),
+    ("Panchkula", "Sector 11", 30.6920, 76.8470),
+    ("Panchkula", "Sector 12", 30.6870, 76.8510),
+    ("Panchkula", "Sector 12A", 30.6850, 76.8580),
+    ("Panchkula", "Sector 14", 30.6890, 76.8630),
+    ("Panchkula", "Sector 15", 30.6850, 76.8690),
+    ("Panchkula", "Sector 16", 30.6820, 76.8760),
+    ("Panchkula", "Sector 17", 30.6770, 76.8700),
+    ("Panchkula", "Sector 18", 30.6740, 76.8620),
+    ("Panchkula", "Sector 19", 30.6700, 76.8560),
+    ("Panchkula", "Sector 20", 30.6650, 76.8360),
+    ("Panchkula", "Sector 21", 30.6700, 76.8700),
+    ("Panchkula", "Sector 25", 30.6620, 76.8790),
+    ("Panchkula", "Sector 26", 30.6600, 76.8890),
+    ("Panchkula", "Sector 27", 30.6550, 76.8860),
+    ("Panchkula", "Sector 28", 30.6540, 76.8960),
+    ("Panchkula", "MDC", 30.7300, 76.8560),
+    ("Panchkula", "Pinjore", 30.7990, 76.9170),
+    ("Panchkula", "Kalka", 30.8390, 76.9400),
+    ("Panchkula", "Barwala", 30.6350, 76.9370),
+    ("Panchkula", "Ramgarh", 30.6830, 76.8950),
+    ("Zirakpur", None, 30.6425, 76.8173),
+    ("Zirakpur", "VIP Road", 30.6400, 76.8230),
+    ("Zirakpur", "Baltana", 30.6600, 76.8310),
+    ("Zirakpur", "Pabhat", 30.6480, 76.8070),
+    ("Zirakpur", "Dhakoli", 30.6620, 76.8380),
+    ("Zirakpur", "Peer Muchalla", 30.6720, 76.8490),
+    ("Zirakpur", "Gazipur", 30.6470, 76.8370),
+    ("Zirakpur", "Lohgarh", 30.6370, 76.8120),
+    ("Zirakpur", "NAC", 30.6350, 76.8200),
+    ("Zirakpur", "Maya Garden City", 30.6360, 76.8260),
+    ("Zirakpur", "PR7 Airport Road", 30.6550, 76.7900),
+    ("Kharar", None, 30.7460, 76.6450),
+    ("Kharar", "Landran", 30.6880, 76.6680),
+    ("Kharar", "Banur", 30.5540, 76.7190),
+    ("Derabassi", None, 30.5880, 76.8430),
+    ("Derabassi", "Industrial Area", 30.5950, 76.8400),
+    ("Mullanpur", None, 30.7800, 76.7000),
+    ("Mullanpur", "New Chandigarh", 30.7780, 76.7070),
+    ("New Chandigarh", "Omaxe", 30.7740, 76.7020),
+    ("New Chandigarh", "DLF", 30.7830, 76.7060),
+    ("Nayagaon", None, 30.7800, 76.7880),
+    ("Naya Gaon", "Sector 1", 30.7780, 76.7850),
+    ("Naya Gaon", "Sector 2", 30.7830, 76.7920),
+    ("Kurali", None, 30.8330, 76.5760),
+    ("Morinda", None, 30.7900, 76.5000),
+    ("Gharuan", None, 30.7700, 76.5600),
+    ("Lalru", None, 30.4870, 76.8000),
+    ("Rajpura", None, 30.4840, 76.5940),
+    (None, "Village Behlana", 30.6760, 76.7930),
+    (None, "Village Manauli", 30.6520, 76.7340),
+    (None, "Village Sarangpur", 30.7640, 76.7420),
+    (None, "Village Khuda Lahora", 30.7630, 76.7530),
+    (None, "Village Khuda Jassu", 30.7700, 76.7540),
+    (None, "Village Dadumajra", 30.7020, 76.7420),
+    (None, "Village Kishangarh", 30.7590, 76.8270),
+    (None, "Village Majri", 30.8150, 76.6950),
+    (None, "Village Raipur Khurd", 30.6860, 76.8200),
+    (None, "Village Raipur Kalan", 30.6810, 76.8050),
+]
+
+# Town spellings people type, longest first when matching
+CITY_ALIASES = {
+    "chandigarh": "chandigarh",
+    "chd": "chandigarh",
+    "mohali": "mohali",
+    "sas nagar": "mohali",
+    "panchkula": "panchkula",
+    "pkl": "panchkula",
+    "zirakpur": "zirakpur",
+    "kharar": "kharar",
+    "derabassi": "derabassi",
+    "dera bassi": "derabassi",
+    "mullanpur": "mullanpur",
+    "new chandigarh": "new chandigarh",
+    "nayagaon": "nayagaon",
+    "naya gaon": "nayagaon",
+    "kurali": "kurali",
+    "morinda": "morinda",
+    "gharuan": "gharuan",
+    "lalru": "lalru",
+    "rajpura": "rajpura",
+}
+# Unqualified "Sector 20" means Chandigarh before Panchkula, and so on
+CITY_PRIORITY = ("chandigarh", "mohali", "panchkula", "zirakpur")
+
+_NON_WORD = re.compile(r"[^a-z0-9]+")
+_ABBREVIATIONS = {"sec": "sector", "sect": "sector", "sctr": "sector", "ph": "phase", "indl": "industrial"}
+_GLUED_NUMBER = re.compile(r"\b(sector|sec|sect|sctr|phase|ph)(\d)")
+_NUMBERED = re.compile(r"\b(sector|phase) (\d+)([a-z]?)(?![a-z])")
+_COORDINATES = re.compile(r"^\s*(-?\d+(?:\.\d+)?)\s*,\s*(-?\d+(?:\.\d+)?)\s*$")
+
+
+def _canonical(text: Optional[str]) -> str:
+    # Same folding as search.normalize_search_text, which imports this module
+    normalized = _GLUED_NUMBER.sub(r"\1 \2", _NON_WORD.sub(" ", (text or "").lower()).strip())
+    return " ".join(_ABBREVIATIONS.get(word, word) for word in normalized.split())
+
+
+def _slug(text: str) -> str:
+    return _canonical(text).replace(" ", "-")
+
+
+def _split_city(text: str) -> Tuple[Optional[str], str]:
+    padded = f" {text} "
+    for alias in sorted(CITY_ALIASES, key=len, reverse=True):
+        if f" {alias} " in padded:
+            return CITY_ALIASES[alias], padded.replace(f" {alias} ", " ", 1).strip()
+    return None, text
+
+
+def _numbered_places(place: str) -> List[str]:
+    """References like "sector 12a" or "phase 3b2", most specific first"""
+    match = _NUMBERED.search(place)
+    if not match:
+        return []
+    kind, number, suffix = match.groups()
+    return [f"{kind} {int(number)}{suffix}", f"{kind} {int(number)}"]
+
+
+def _build() -> List[Tuple[Locality, str]]:
+    """Every locality with its canonical place name within its town"""
+    localities = []
+    for sector, (row, column) in sorted(_CHANDIGARH_GRID.items()):
+        d_row, d_column = row - 2, column - 3
+        localities.append((Locality(
+            id=f"chandigarh-sector-{sector}",
+            name=f"Chandigarh - Sector {sector}",
+            city="chandigarh",
+            lat=round(_GRID_ORIGIN[0] + d_column * _GRID_COLUMN[0] + d_row * _GRID_ROW[0], 4),
+            lng=round(_GRID_ORIGIN[1] + d_column * _GRID_COLUMN[1] + d_row * _GRID_ROW[1], 4),
+        ), f"sector {sector}"))
+    for city, place, lat, lng in _PLACES:
+        city_key = CITY_ALIASES[_canonical(city)] if city else None
+        name = " - ".join(part for part in (city, place) if part)
+        localities.append((Locality(
+            id="-".join(_slug(part) for part in (city_key, place) if part),
+            name=name,
+            city=city_key,
+            lat=lat,
+            lng=lng,
+        ), _canonical(place)))
+    return localities
+
+
+_LOCALITY_PLACES = _build()
+LOCALITIES = [locality for locality, _ in _LOCALITY_PLACES]
+LOCALITIES_BY_ID = {locality.id: locality for locality in LOCALITIES}
+
+_BY_NAME: Dict[str, Locality] = {}
+_BY_CITY_PLACE: Dict[Tuple[Optional[str], str], Locality] = {}
+_BY_PLACE: Dict[str, Locality] = {}
+
+
+def _index() -> None:
+    priority = {city: rank for rank, city in enumerate(CITY_PRIORITY)}
+    for locality, place in sorted(_LOCALITY_PLACES, key=lambda pair: priority.get(pair[0].city, len(priority))):
+        _BY_NAME.setdefault(_canonical(locality.name), locality)
+        _BY_CITY_PLACE.setdefault((locality.city, place), locality)
+        if place:
+            _BY_PLACE.setdefault(place, locality)
+            # "Behlana" for "Village Behlana"
+            _BY_PLACE.setdefault(place.replace("village ", "", 1), locality)
+
+
+_index()
+
+
+def resolve(text: Optional[str]) -> Optional[Locality]:
+    """Canonical locality for free-text `text`, or None when unrecognized"""
+    canonical = _canonical(text)
+    if not canonical:
+        return None
+    if canonical in _BY_NAME:
+        return _BY_NAME[canonical]
+
+    city, place = _split_city(canonical)
+    for candidate in [place, *_numbered_places(place)]:
+        locality = _BY_CITY_PLACE.get((city, candidate)) if city else _BY_PLACE.get(candidate)
+        if locality:
+            return locality
+    # "Near the bus stand, Kharar" is still Kharar
+    return _BY_CITY_PLACE.get((city, "")) if city else None
+
+
+def locality_predicate(locality: Locality) -> Dict[str, Any]:
+    """Filter on `locality_id`; a town also matches every locality within it"""
+    if locality.city and locality.id == _slug(locality.city):
+        return {"locality_id": {"$regex": f"^{re.escape(locality.id)}(-|$)"}}
+    return {"locality_id": locality.id}
+
+
+def locality_fields(text: Optional[str]) -> Dict[str, Any]:
+    """`locality_id` and `geo` to store next to a free-text location"""
+    locality = resolve(text)
+    if locality is None:
+        return {"locality_id": None, "geo": None}
+    return {"locality_id": locality.id, "geo": locality.point}
+
+
+def parse_near(value: str) -> Optional[Dict[str, Any]]:
+    """GeoJSON point for "lat,lng" or a locality name"""
+    coordinates = _COORDINATES.match(value)
+    if coordinates:
+        lat, lng = float(coordinates.group(1)), float(coordinates.group(2))
+        if -90 <= lat <= 90 and -180 <= lng <= 180:
+            return {"type": "Point", "coordinates": [lng, lat]}
+        return None
+    locality = resolve(value)
+    return locality.point if locality else None
+
+
+def within_radius(point: Dict[str, Any], radius_km: float) -> Dict[str, Any]:
+    """`geo` filter for documents within `radius_km` of a GeoJSON point"""
+    return {"geo": {"$geoWithin": {"$centerSphere": [point["coordinates"], radius_km / EARTH_RADIUS_KM]}}}
+
+
+def distance_km(a: Dict[str, Any], b: Dict[str, Any]) -> float:
+    """Great-circle distance between two GeoJSON points"""
+    (lng1, lat1), (lng2, lat2) = a["coordinates"], b["coordinates"]
+    d_lat, d_lng = math.radians(lat2 - lat1), math.radians(lng2 - lng1)
+    h = math.sin(d_lat / 2) ** 2 + math.cos(math.radians(lat1)) * math.cos(math.radians(lat2)) * math.sin(d_lng / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(h))
+
+
+async def backfill_localities(db, batch_size: int = 500) -> Dict[str, int]:
+    """Resolve `locality_id` / `geo` on profiles and requirements from their text"""
+    updated = {}
+    for collection in ("tutor_profiles", "requirements"):
+        count = 0
+        batch = []
+        cursor = db[collection].find({}, {"_id": 1, "location": 1}).batch_size(batch_size)
+        async for doc in cursor:
+            batch.append(UpdateOne({"_id": doc["_id"]}, {"$set": locality_fields(doc.get("location"))}))
+            if len(batch) >= batch_size:
+                await db[collection].bulk_write(batch, ordered=False)
+                count += len(batch)
+                batch = []
+        if batch:
+            await db[collection].bulk_write(batch, ordered=False)
+            count += len(batch)
+        updated[collection] = count
+    return updated
@@ -0,0 +1,193 @@
+"""Declarative index registry and query-shape verification.
+
+`ensure_indexes` runs at application startup and creates every index in
+`INDEX_REGISTRY` (create_index is a no-op for indexes that already exist).
+`check_indexes` explains each query shape the routers issue and reports the
+ones whose winning plan still contains a COLLSCAN; it backs
+`python manage.py --check-indexes`.
+"""
+import logging
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Tuple
+
+from pymongo.errors import OperationFailure
+
+from conversations import CONVERSATION_INDEXES, CONVERSATIONS_DESC
+from otp_store import OTP_INDEXES
+from outbox import OUTBOX_INDEXES
+from entitlements import ENTITLEMENT_INDEXES
+from matching import MATCHING_REQUIREMENT_INDEXES, MATCHING_TUTOR_INDEXES
+from gazetteer import GEO_INDEXES
+from photo_store import PHOTO_BUCKET, PHOTO_FILE_INDEXES
+from feed import FEED_ORDER
+from broker import REALTIME_INDEXES
+from pagination import CREATED_ASC, CREATED_DESC, PAGINATION_INDEXES, REGISTERED_DESC, after_cursor, encode_cursor
+from search import SEARCH_INDEXES, build_tutor_query
+
+logger = logging.getLogger(__name__)
+
+# (collection, keys, options)
+INDEX_REGISTRY: List[Tuple[str, List[Tuple[str, Any]], Dict[str, Any]]] = [
+    ("users", [("id", 1)], {"unique": True}),
+    ("users", [("email", 1)], {"unique": True}),
+    ("tutor_profiles", [("user_id", 1)], {"unique": True}),
+    ("tutor_profiles", [("id", 1)], {"unique": True}),
+    ("requirements", [("id", 1)], {"unique": True}),
+    # Tutors only ever browse active requirements; closed ones stay out of the index
+    (
+        "requirements",
+        [("created_at", -1), ("id", -1)],
+        {"name": "active_created_at_id", "partialFilterExpression": {"status": "active"}},
+    ),
+    ("reviews", [("id", 1)], {"unique": True}),
+    ("reviews", [("tutor_id", 1), ("student_id", 1)], {"unique": True}),
+    # Account deletion finds and removes everything a student wrote
+    ("reviews", [("student_id", 1)], {}),
+    ("messages", [("id", 1)], {"unique": True}),
+    # Both directions of a thread are ranges on this index, merged newest first
+    ("messages", [("sender_id", 1), ("recipient_id", 1), ("created_at", -1), ("id", -1)], {}),
+    ("messages", [("recipient_id", 1), ("read", 1)], {}),
+    ("transactions", [("id", 1)], {"unique": True}),
+    ("transactions", [("user_id", 1), ("target_id", 1), ("purpose", 1), ("status", 1)], {}),
+    *[("tutor_profiles", keys, options) for keys, options in SEARCH_INDEXES],
+    *[("conversations", keys, options) for keys, options in CONVERSATION_INDEXES],
+    *[("otp_codes", keys, options) for keys, options in OTP_INDEXES],
+    *[("email_outbox", keys, options) for keys, options in OUTBOX_INDEXES],
+    *[("entitlements", keys, options) for keys, options in ENTITLEMENT_INDEXES],
+    *[("tutor_profiles", keys, options) for keys, options in MATCHING_TUTOR_INDEXES],
+    *[("requirements", keys, options) for keys, options in MATCHING_REQUIREMENT_INDEXES],
+    *[(collection, keys, options) for collection in ("tutor_profiles", "requirements") for keys, options in GEO_INDEXES],
+    *[("realtime_events", keys, options) for keys, options in REALTIME_INDEXES],
+    *[(f"{PHOTO_BUCKET}.files", keys, options) for keys, options in PHOTO_FILE_INDEXES],
+    *[(collection, keys, {}) for collection, keys in PAGINATION_INDEXES],
+]
+
+
+async def ensure_indexes(db) -> None:
+    for collection, keys, options in INDEX_REGISTRY:
+        try:
+            await db[collection].create_index(keys, **options)
+        except OperationFailure as e:
+            # e.g. duplicate data blocking a unique index; keep serving and let
+            # --check-indexes report the missing index
+            logger.error(f"Index creation failed on {collection} {keys}: {str(e)}")
+
+
+_SAMPLE_ID = "00000000-0000-0000-0000-000000000000"
+_OTHER_ID = "11111111-1111-1111-1111-111111111111"
+_SAMPLE_TIME = "2026-01-01T00:00:00+00:00"
+_SAMPLE_DATE = datetime(2026, 1, 1, tzinfo=timezone.utc)
+# Cursors are positional, so one sample fits both (created_at, id) and (registered_at, id)
+_SAMPLE_CURSOR = encode_cursor({"created_at": _SAMPLE_TIME, "id": _SAMPLE_ID}, CREATED_DESC)
+_SAMPLE_POINT = {"type": "Point", "coordinates": [76.7788, 30.7412]}
+_PARTICIPANTS = {"$or": [{"sender_id": _SAMPLE_ID}, {"recipient_id": _SAMPLE_ID}]}
+_THREAD = {"$or": [
+    {"sender_id": _SAMPLE_ID, "recipient_id": _OTHER_ID},
+    {"sender_id": _OTHER_ID, "recipient_id": _SAMPLE_ID},
+]}
+
+# (name, collection, filter, sort) for every query the routers issue
+QUERY_SHAPES: List[Tuple[str, str, Dict[str, Any], Any]] = [
+    ("users by id", "users", {"id": _SAMPLE_ID}, None),
+    ("users by email", "users", {"email": "someone@example.com"}, None),
+    ("tutor profile by user", "tutor_profiles", {"user_id": _SAMPLE_ID}, None),
+    ("embedded review", "tutor_profiles", {"user_id": _SAMPLE_ID, "reviews.id": _OTHER_ID}, None),
+    ("browse tutors", "tutor_profiles", build_tutor_query(), REGISTERED_DESC),
+    ("browse tutors by subject", "tutor_profiles", build_tutor_query(subject="Mathematics"), REGISTERED_DESC),
+    ("browse tutors by short subject", "tutor_profiles", build_tutor_query(subject="ma"), REGISTERED_DESC),
+    ("browse tutors by locality", "tutor_profiles", build_tutor_query(location="Sector 17"), REGISTERED_DESC),
+    ("browse tutors by town", "tutor_profiles", build_tutor_query(location="Mohali"), REGISTERED_DESC),
+    ("browse tutors by location text", "tutor_profiles", build_tutor_query(location="Near Elante Mall"), REGISTERED_DESC),
+    ("tutors near", "tutor_profiles", {"geo": {"$nearSphere": {"$geometry": _SAMPLE_POINT, "$maxDistance": 5000}}}, None),
+    ("browse tutors by fee", "tutor_profiles", build_tutor_query(min_fee=200, max_fee=800), REGISTERED_DESC),
+    ("browse tutors next page", "tutor_profiles", after_cursor({}, REGISTERED_DESC, _SAMPLE_CURSOR), REGISTERED_DESC),
+    ("requirement by id", "requirements", {"id": _SAMPLE_ID}, None),
+    ("requirements near", "requirements", {"geo": {"$nearSphere": {"$geometry": _SAMPLE_POINT, "$maxDistance": 5000}}, "status": "active"}, None),
+    ("matched requirements", "requirements", {"id": {"$in": [_SAMPLE_ID, _OTHER_ID]}, "status": "active"}, None),
+    # Matching answers from MongoDB until its first in-memory build is done
+    ("matching fallback tutors", "tutor_profiles", {"$or": [
+        build_tutor_query(subject="maths"), build_tutor_query(subject="mathematics"),
+    ]}, None),
+    ("matched tutors", "tutor_profiles", {"user_id": {"$in": [_SAMPLE_ID, _OTHER_ID]}}, None),
+    ("tutor profiles changed since", "tutor_profiles", {"updated_at": {"$gt": _SAMPLE_TIME}}, None),
+    ("requirements changed since", "requirements", {"updated_at": {"$gt": _SAMPLE_TIME}}, None),
+    ("active requirements", "requirements", {"status": "active"}, CREATED_DESC),
+    ("active requirements by subject", "requirements", {"status": "active", "subject": {"$regex": "math", "$options": "i"}}, CREATED_DESC),
+    ("active requirements by mode", "requirements", {"status": "active", "mode": "Online"}, CREATED_DESC),
+    ("active requirements next page", "requirements", after_cursor({"status": "active"}, CREATED_DESC, _SAMPLE_CURSOR), CREATED_DESC),
+    # Last-Event-ID resume walks the same partial index backwards
+    ("requirement feed replay", "requirements", after_cursor({"status": "active"}, FEED_ORDER, _SAMPLE_CURSOR), FEED_ORDER),
+    ("realtime events since", "realtime_events", {"created_at": {"$gte": _SAMPLE_DATE}}, [("created_at", 1)]),
+    ("my requirements", "requirements", {"student_id": _SAMPLE_ID}, CREATED_DESC),
+    ("review by tutor and student", "reviews", {"tutor_id": _SAMPLE_ID, "student_id": _SAMPLE_ID}, None),
+    ("reviews for tutor", "reviews", {"tutor_id": _SAMPLE_ID}, CREATED_DESC),
+    ("reviews by student", "reviews", {"student_id": _SAMPLE_ID}, None),
+    ("my messages", "messages", _PARTICIPANTS, CREATED_DESC),
+    ("my messages next page", "messages", after_cursor(_PARTICIPANTS, CREATED_DESC, _SAMPLE_CURSOR), CREATED_DESC),
+    ("messages received", "messages", {"recipient_id": _SAMPLE_ID}, None),
+    ("message thread", "messages", _THREAD, CREATED_DESC),
+    ("message thread older page", "messages", after_cursor(_THREAD, CREATED_DESC, _SAMPLE_CURSOR), CREATED_DESC),
+    ("message thread newer page", "messages", after_cursor(_THREAD, CREATED_ASC, _SAMPLE_CURSOR), CREATED_ASC),
+    ("message in thread", "messages", {"id": _SAMPLE_ID, **_THREAD}, None),
+    ("read thread up to", "messages", {
+        "sender_id": _SAMPLE_ID, "recipient_id": _OTHER_ID, "read": False,
+        "$or": [{"created_at": {"$lt": _SAMPLE_TIME}}, {"created_at": _SAMPLE_TIME, "id": {"$lte": _SAMPLE_ID}}],
+    }, None),
+    ("unread sent by user", "messages", {"sender_id": _SAMPLE_ID, "read": False}, None),
+    ("unread counter", "unread_counters", {"_id": _SAMPLE_ID}, None),
+    ("conversations", "conversations", {"user_id": _SAMPLE_ID}, CONVERSATIONS_DESC),
+    ("conversation row", "conversations", {"user_id": _SAMPLE_ID, "partner_id": _OTHER_ID}, None),
+    ("conversations with user", "conversations", {"$or": [{"user_id": _SAMPLE_ID}, {"partner_id": _SAMPLE_ID}]}, None),
+    ("otp code", "otp_codes", {"key": "someone@example.com_email"}, None),
+    ("email outbox claim", "email_outbox", {"$or": [
+        {"status": "pending", "next_attempt_at": {"$lte": _SAMPLE_TIME}},
+        {"status": "sending", "locked_until": {"$lte": _SAMPLE_TIME}},
+    ]}, [("next_attempt_at", 1)]),
+    ("email outbox message", "email_outbox", {"id": _SAMPLE_ID}, None),
+    ("email outbox backlog", "email_outbox", {"status": "pending"}, None),
+    ("message by id", "messages", {"id": _SAMPLE_ID, "recipient_id": _SAMPLE_ID, "read": False}, None),
+    ("profile photo", f"{PHOTO_BUCKET}.files", {"filename": "0" * 64 + ".jpg"}, None),
+    ("transaction by id", "transactions", {"id": _SAMPLE_ID}, None),
+    ("wallet transactions", "transactions", {"user_id": _SAMPLE_ID}, CREATED_DESC),
+    ("entitlement check", "entitlements", {"user_id": _SAMPLE_ID, "target_id": _OTHER_ID, "kind": {"$in": ["message_tutor", "contact_tutor"]}}, None),
+    ("entitlements of user", "entitlements", {"$or": [{"user_id": _SAMPLE_ID}, {"target_id": _SAMPLE_ID}]}, None),
+    ("paid access", "transactions", {"user_id": _SAMPLE_ID, "target_id": _SAMPLE_ID, "purpose": "message_tutor", "status": "completed"}, None),
+]
+
+
+def plan_stages(plan: Dict[str, Any]) -> List[str]:
+    """Flatten an explain() winning plan into its list of stage names"""
+    stages = [plan.get("stage")]
+    if "inputStage" in plan:
+        stages.extend(plan_stages(plan["inputStage"]))
+    for child in plan.get("inputStages", []):
+        stages.extend(plan_stages(child))
+    if "queryPlan" in plan:
+        stages.extend(plan_stages(plan["queryPlan"]))
+    return [stage for stage in stages if stage]
+
+
+async def explain_stages(db, collection: str, query: Dict[str, Any], sort=None) -> List[str]:
+    cursor = db[collection].find(query)
+    if sort:
+        cursor = cursor.sort(sort)
+    explanation = await cursor.explain()
+    return plan_stages(explanation["queryPlanner"]["winningPlan"])
+
+
+async def explain_tutor_query(db, **filters) -> List[str]:
+    """Winning-plan stages for a GET /api/tutors browse with these filters"""
+    return await explain_stages(db, "tutor_profiles", build_tutor_query(**filters), REGISTERED_DESC)
+
+
+async def check_indexes(db) -> List[str]:
+    """Names of query shapes that would still scan their whole collection"""
+    unindexed = []
+    for name, collection, query, sort in QUERY_SHAPES:
+        stages = await explain_stages(db, collection, query, sort)
+        if "COLLSCAN" in stages:
+            unindexed.append(name)
+            logger.error(f"COLLSCAN for '{name}' on {collection}: {' <- '.join(stages)}")
+        else:
+            logger.info(f"ok '{name}': {' <- '.join(stages)}")
+    return unindexed
@@ -0,0 +1,190 @@
+"""Non-blocking clients for the Twilio Verify and Razorpay REST APIs.
+
+The vendor SDKs are synchronous and were called directly on the event loop,
+so a slow provider froze the whole API. These clients talk to the same REST
+endpoints over pooled keep-alive `httpx` connections with per-provider
+timeouts, a concurrency limit, retries with jitter for requests that cannot
+be applied twice, and a circuit breaker that fails fast while a provider
+is down. Base URLs are configurable so `fake_providers.py` can stand in for
+both providers in offline load tests.
+"""
+import asyncio
+import hashlib
+import hmac
+import logging
+import random
+import time
+from typing import Any, Dict, Optional
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+TWILIO_VERIFY_BASE_URL = "https://verify.twilio.com/v2"
+RAZORPAY_API_BASE_URL = "https://api.razorpay.com/v1"
+
+# Failures where the request provably never reached the provider, so a retry
+# cannot duplicate an SMS or an order
+RETRYABLE_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+# Rate limited: the provider refused the request without acting on it
+REJECTED_STATUS = {429}
+# A 5xx may come after the provider already sent the SMS or created the
+# order, so these are only retried for idempotent requests
+RETRYABLE_STATUS = {502, 503, 504}
+IDEMPOTENT_METHODS = {"GET", "HEAD", "OPTIONS", "PUT", "DELETE"}
+
+
+class ProviderError(Exception):
+    def __init__(self, provider: str, message: str, status_code: Optional[int] = None):
+        super().__init__(f"{provider}: {message}")
+        self.provider = provider
+        self.status_code = status_code
+
+
+class ProviderUnavailable(ProviderError):
+    """Circuit open or retries exhausted; the provider is not reachable"""
+
+
+class CircuitBreaker:
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half_open"
+        return "open"
+
+    def allow(self) -> bool:
+        return self.state != "open"
+
+    def record_success(self) -> None:
+        self.failures = 0
+        self.opened_at = None
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        if self.failures >= self.failure_threshold or self.state == "half_open":
+            self.opened_at = time.monotonic()
+
+
+class ProviderClient:
+    def __init__(
+        self,
+        name: str,
+        base_url: str,
+        auth: httpx.Auth,
+        timeout: float,
+        max_concurrency: int = 20,
+        max_retries: int = 2,
+        backoff_base: float = 0.1,
+        breaker: Optional[CircuitBreaker] = None,
+    ):
+        self.name = name
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.breaker = breaker or CircuitBreaker()
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._client = httpx.AsyncClient(
+            base_url=base_url,
+            auth=auth,
+            timeout=httpx.Timeout(timeout),
+            limits=httpx.Limits(max_connections=max_concurrency, max_keepalive_connections=max_concurrency),
+        )
+
+    async def request(self, method: str, path: str, idempotent: Optional[bool] = None, **kwargs) -> Dict[str, Any]:
+        """Send one API call; `idempotent` defaults to whether `method` is.
+
+        Pass idempotent=True only when the provider deduplicates the request
+        itself (e.g. by an idempotency key); 5xx responses are then retried.
+        """
+        if not self.breaker.allow():
+            raise ProviderUnavailable(self.name, "circuit open")
+        if idempotent is None:
+            idempotent = method.upper() in IDEMPOTENT_METHODS
+
+        for attempt in range(self.max_retries + 1):
+            retryable = False
+            try:
+                async with self._semaphore:
+                    response = await self._client.request(method, path, **kwargs)
+            except RETRYABLE_ERRORS as e:
+                retryable, error = True, ProviderUnavailable(self.name, f"connection failed: {str(e)}")
+            except httpx.HTTPError as e:
+                self.breaker.record_failure()
+                raise ProviderUnavailable(self.name, f"request failed: {str(e)}")
+            else:
+                if response.status_code < 400:
+                    self.breaker.record_success()
+                    return response.json()
+                if response.status_code in REJECTED_STATUS or response.status_code >= 500:
+                    self.breaker.record_failure()
+                    retryable = response.status_code in REJECTED_STATUS or (
+                        idempotent and response.status_code in RETRYABLE_STATUS
+                    )
+                    error = ProviderUnavailable(self.name, f"HTTP {response.status_code}", response.status_code)
+                else:
+                    # The provider answered; a 4xx is about our request, not its health
+                    self.breaker.record_success()
+                    raise ProviderError(self.name, f"HTTP {response.status_code}: {response.text}", response.status_code)
+
+            if not retryable or attempt == self.max_retries or not self.breaker.allow():
+                break
+            # Full jitter keeps retries from many requests from synchronizing
+            await asyncio.sleep(random.uniform(0, self.backoff_base * (2 ** attempt)))
+
+        if isinstance(error, ProviderUnavailable) and error.status_code is None:
+            self.breaker.record_failure()
+        raise error
+
+    async def aclose(self) -> None:
+        await self._client.aclose()
+
+
+class TwilioVerify:
+    def __init__(self, account_sid: str, auth_token: str, service_sid: str, base_url: str = TWILIO_VERIFY_BASE_URL, **options):
+        self.service_sid = service_sid
+        self.client = ProviderClient("twilio", base_url, httpx.BasicAuth(account_sid, auth_token), **options)
+
+    async def send_verification(self, to: str, channel: str = "sms") -> str:
+        result = await self.client.request(
+            "POST", f"/Services/{self.service_sid}/Verifications",
+            data={"To": to, "Channel": channel}
+        )
+        return result.get("status", "")
+
+    async def check_verification(self, to: str, code: str) -> str:
+        result = await self.client.request(
+            "POST", f"/Services/{self.service_sid}/VerificationCheck",
+            data={"To": to, "Code": code}
+        )
+        return result.get("status", "")
+
+    async def aclose(self) -> None:
+        await self.client.aclose()
+
+
+class Razorpay:
+    def __init__(self, key_id: str, key_secret: str, base_url: str = RAZORPAY_API_BASE_URL, **options):
+        self.key_secret = key_secret
+        self.client = ProviderClient("razorpay", base_url, httpx.BasicAuth(key_id, key_secret), **options)
+
+    async def create_order(self, order: Dict[str, Any]) -> Dict[str, Any]:
+        return await self.client.request("POST", "/orders", json=order)
+
+    def verify_payment_signature(self, order_id: str, payment_id: str, signature: str) -> bool:
+        """Checkout signature check; pure HMAC, no network round-trip"""
+        expected = hmac.new(
+            self.key_secret.encode("utf-8"),
+            f"{order_id}|{payment_id}".encode("utf-8"),
+            hashlib.sha256
+        ).hexdigest()
+        return hmac.compare_digest(expected, signature)
+
+    async def aclose(self) -> None:
+        await self.client.aclose()
@@ -0,0 +1,100 @@
+"""Coin debits as a single conditional update on the user document.
+
+Spending used to read the balance, insert a transaction and then `$inc` the
+user, so two concurrent spends could both pass the balance check and drive
+the wallet negative. `debit` does the balance check and the decrement in one
+`find_one_and_update({coins: {$gte: n}})` and returns the new balance from
+that same operation.
+
+Callers may pass an idempotency key. The key is recorded on the user in the
+same atomic update (the last LEDGER_KEYS_KEPT keys are kept), so a retried
+or concurrent duplicate request cannot debit twice; it is answered with the
+original transaction instead. The transaction id is derived from the key,
+which makes writing the ledger entry itself safe to repeat.
+"""
+import uuid
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional
+
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+LEDGER_KEYS_KEPT = 100
+
+_LEDGER_NAMESPACE = uuid.UUID("5b0f6a62-5c1e-4f39-9d0e-2f4f1c8a7d31")
+
+
+class InsufficientCoins(Exception):
+    def __init__(self, balance: int):
+        super().__init__("Insufficient coins")
+        self.balance = balance
+
+
+def transaction_id_for(user_id: str, idempotency_key: str) -> str:
+    return str(uuid.uuid5(_LEDGER_NAMESPACE, f"{user_id}:{idempotency_key}"))
+
+
+async def debit(
+    db,
+    user_id: str,
+    coins: int,
+    purpose: str,
+    target_id: Optional[str] = None,
+    idempotency_key: Optional[str] = None,
+) -> Dict[str, Any]:
+    """Spend `coins` or raise InsufficientCoins.
+
+    Returns {"balance", "transaction", "replayed"}; `replayed` is True when
+    the key had already been applied and nothing was debited this time.
+    """
+    query: Dict[str, Any] = {"id": user_id, "coins": {"$gte": coins}}
+    update: Dict[str, Any] = {"$inc": {"coins": -coins}}
+    if idempotency_key:
+        query["ledger_keys"] = {"$ne": idempotency_key}
+        update["$push"] = {"ledger_keys": {"$each": [idempotency_key], "$slice": -LEDGER_KEYS_KEPT}}
+        transaction_id = transaction_id_for(user_id, idempotency_key)
+    else:
+        transaction_id = str(uuid.uuid4())
+
+    user = await db.users.find_one_and_update(
+        query,
+        update,
+        projection={"coins": 1},
+        return_document=ReturnDocument.AFTER
+    )
+
+    if user is None:
+        current = await db.users.find_one({"id": user_id}, {"_id": 0, "coins": 1, "ledger_keys": 1})
+        balance = (current or {}).get("coins", 0)
+        if idempotency_key and idempotency_key in (current or {}).get("ledger_keys", []):
+            transaction = await db.transactions.find_one({"id": transaction_id}, {"_id": 0})
+            if transaction is None:
+                # The debit landed but the ledger write did not; repair it
+                transaction = await _record(db, transaction_id, user_id, coins, purpose, target_id, idempotency_key, None)
+            return {"balance": balance, "transaction": transaction, "replayed": True}
+        raise InsufficientCoins(balance)
+
+    transaction = await _record(db, transaction_id, user_id, coins, purpose, target_id, idempotency_key, user["coins"])
+    return {"balance": user["coins"], "transaction": transaction, "replayed": False}
+
+
+async def _record(db, transaction_id, user_id, coins, purpose, target_id, idempotency_key, balance_after):
+    transaction = {
+        "id": transaction_id,
+        "user_id": user_id,
+        "type": "spend",
+        "coins": -coins,
+        "purpose": purpose,
+        "target_id": target_id,
+        "status": "completed",
+        "created_at": datetime.now(timezone.utc).isoformat()
+    }
+    if idempotency_key:
+        transaction["idempotency_key"] = idempotency_key
+    if balance_after is not None:
+        transaction["balance_after"] = balance_after
+    try:
+        await db.transactions.insert_one(dict(transaction))
+    except DuplicateKeyError:
+        transaction = await db.transactions.find_one({"id": transaction_id}, {"_id": 0})
+    return transaction
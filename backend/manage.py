@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""Maintenance commands that run against the configured MongoDB.
+
+Usage (from the backend directory, with the same .env as the API):
+
+    python manage.py --backfill-search-keys
+    python manage.py --migrate-photos
+    python manage.py --check-indexes
+    python manage.py --backfill-ratings
+    python manage.py --rebuild-conversations
+    python manage.py --backfill-entitlements
+    python manage.py --backfill-localities
+    python manage.py --reconcile-unread
+"""
+import argparse
+import asyncio
+import logging
+import os
+import sys
+from pathlib import Path
+
+from dotenv import load_dotenv
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from conversations import rebuild_conversations, reconcile_unread_counters
+from entitlements import backfill_entitlements
+from gazetteer import backfill_localities
+from indexes import check_indexes, ensure_indexes
+from photo_store import PhotoStore, migrate_data_url_photos
+from ratings import rebuild_rating_aggregates
+from search import backfill_search_keys
+
+ROOT_DIR = Path(__file__).parent
+load_dotenv(ROOT_DIR / '.env')
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger("manage")
+
+
+async def run(args) -> int:
+    client = AsyncIOMotorClient(os.environ['MONGO_URL'])
+    db = client[os.environ['DB_NAME']]
+    try:
+        if args.backfill_search_keys:
+            await ensure_indexes(db)
+            updated = await backfill_search_keys(db, batch_size=args.batch_size)
+            logger.info(f"Backfilled search keys on {updated} tutor profiles")
+        elif args.migrate_photos:
+            store = PhotoStore(db)
+            removed = await store.remove_duplicates()
+            if removed:
+                logger.info(f"Removed {removed} duplicate copies from the photo store")
+            await ensure_indexes(db)
+            migrated = await migrate_data_url_photos(db, store, batch_size=args.batch_size)
+            logger.info(f"Moved {migrated} profile photos into the photo store")
+        elif args.check_indexes:
+            unindexed = await check_indexes(db)
+            if unindexed:
+                logger.error(f"{len(unindexed)} query shapes are not index-backed: {', '.join(unindexed)}")
+                return 1
+            logger.info("All query shapes are index-backed")
+        elif args.backfill_ratings:
+            reset = await rebuild_rating_aggregates(db)
+            logger.info(f"Rebuilt rating aggregates ({reset} tutors without reviews reset to zero)")
+        elif args.rebuild_conversations:
+            await ensure_indexes(db)
+            await rebuild_conversations(db)
+            logger.info("Rebuilt the conversations read model from messages")
+        elif args.backfill_entitlements:
+            await ensure_indexes(db)
+            created = await backfill_entitlements(db, batch_size=args.batch_size)
+            logger.info(f"Created {created} entitlements from past purchases")
+        elif args.backfill_localities:
+            await ensure_indexes(db)
+            updated = await backfill_localities(db, batch_size=args.batch_size)
+            logger.info(f"Resolved localities on {updated['tutor_profiles']} tutor profiles and {updated['requirements']} requirements")
+        elif args.reconcile_unread:
+            fixed = await reconcile_unread_counters(db)
+            logger.info(f"Corrected unread counts on {fixed['conversations']} conversations and {fixed['users']} users")
+        return 0
+    finally:
+        client.close()
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Tricity Tutors maintenance commands")
+    commands = parser.add_mutually_exclusive_group(required=True)
+    commands.add_argument(
+        "--backfill-search-keys",
+        action="store_true",
+        help="Add normalized search keys to tutor profiles created before they existed",
+    )
+    commands.add_argument(
+        "--migrate-photos",
+        action="store_true",
+        help="Move base64 data-URL profile photos out of tutor_profiles into GridFS",
+    )
+    commands.add_argument(
+        "--check-indexes",
+        action="store_true",
+        help="Explain every query shape the API issues and fail on any collection scan",
+    )
+    commands.add_argument(
+        "--backfill-ratings",
+        action="store_true",
+        help="Rebuild rating_sum/rating_count/rating_histogram from reviews in one aggregation",
+    )
+    commands.add_argument(
+        "--rebuild-conversations",
+        action="store_true",
+        help="Rebuild the conversations read model from the messages collection",
+    )
+    commands.add_argument(
+        "--backfill-entitlements",
+        action="store_true",
+        help="Create entitlements for coin purchases made before the entitlements collection",
+    )
+    commands.add_argument(
+        "--backfill-localities",
+        action="store_true",
+        help="Resolve locality_id and geo points from free-text locations via the gazetteer",
+    )
+    commands.add_argument(
+        "--reconcile-unread",
+        action="store_true",
+        help="Recompute per-user and per-conversation unread counters from messages",
+    )
+    parser.add_argument("--batch-size", type=int, default=500)
+    return asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
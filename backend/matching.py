@@ -0,0 +1,446 @@
+"""Tutor–requirement matching over in-memory inverted indexes.
+
+Tutors used to find students by paging through GET /api/requirements with a
+regex subject filter. `MatchingEngine` keeps a compact entry for every tutor
+profile and active requirement, with subjects, classes, languages and modes
+normalized into sets once, on write. Inverted indexes by subject word, mode
+and gender pick the candidates, so a match only looks at tutors (or
+requirements) sharing a subject word, and scores each one with set lookups.
+
+Writes on this worker update the engine directly (`index_tutor`,
+`add_requirement`, ...). Writes on other workers are picked up by polling
+`updated_at`, and a periodic full rebuild drops anything deleted elsewhere.
+
+The first build runs in the background so startup does not wait on a full
+scan of both collections. Until it is done, `tutors_for` and
+`requirements_for` score a bounded set of candidates read from MongoDB.
+"""
+import asyncio
+import heapq
+import logging
+import re
+import time
+from collections import defaultdict
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Any, Dict, FrozenSet, Iterable, List, Optional, Set, Tuple
+
+from gazetteer import distance_km
+from search import build_tutor_query, normalize_search_text
+
+logger = logging.getLogger(__name__)
+
+MATCHING_TUTOR_INDEXES = [
+    ([("updated_at", 1)], {"name": "updated_at"}),
+]
+MATCHING_REQUIREMENT_INDEXES = [
+    ([("updated_at", 1)], {"name": "updated_at"}),
+]
+
+# Candidates scored per request while the first build is still running
+FALLBACK_CANDIDATES = 500
+
+MATCH_TUTOR_PROJECTION = {
+    "_id": 0, "user_id": 1, "subjects": 1, "languages": 1, "gender": 1, "location": 1, "locality_id": 1, "geo": 1,
+    "teaches_online": 1, "teaches_at_home": 1, "can_travel": 1,
+    "fee_min": 1, "fee_max": 1, "average_rating": 1, "rating_count": 1,
+}
+MATCH_REQUIREMENT_PROJECTION = {
+    "_id": 0, "id": 1, "student_id": 1, "subject": 1, "level_class": 1, "mode": 1,
+    "languages": 1, "location": 1, "locality_id": 1, "geo": 1, "gender_preference": 1, "max_fee": 1, "status": 1,
+}
+
+# Requirement modes as posted by the student dashboard
+ONLINE = "online"
+HOME = "home"
+TRAVEL = "i can travel"
+
+SCORE_SUBJECT = 40
+SCORE_CLASS = 25
+SCORE_LANGUAGE = 15
+SCORE_LOCATION = 20
+SCORE_NEARBY = 10
+NEARBY_KM = 3.0
+
+SUBJECT_ALIASES = {
+    "math": "mathematics",
+    "maths": "mathematics",
+    "bio": "biology",
+    "chem": "chemistry",
+    "phy": "physics",
+    "eng": "english",
+    "comp": "computer",
+    "cs": "computer",
+    "sst": "social",
+    "evs": "environmental",
+}
+_SUBJECT_STOPWORDS = {"and", "of", "the", "for", "in", "subject", "subjects"}
+_CLASS_SEPARATORS = re.compile(r"\s*(?:,|/|&|\band\b)\s*")
+_CLASS_RANGE = re.compile(r"(?:class|grade|std)?\s*(\d{1,2}) (\d{1,2})")
+_CLASS_NUMBER = re.compile(r"(?:class|grade|std)?\s*(\d{1,2})(?:st|nd|rd|th)?(?:\s*(?:class|grade|std))?")
+
+
+def subject_tokens(subject: Optional[str]) -> FrozenSet[str]:
+    words = normalize_search_text(subject).split()
+    return frozenset(SUBJECT_ALIASES.get(word, word) for word in words if word not in _SUBJECT_STOPWORDS)
+
+
+def normalize_class(value: Optional[str]) -> str:
+    """Map "10th", "Class 10" and "grade 10" to "class 10" """
+    normalized = normalize_search_text(value)
+    number = _CLASS_NUMBER.fullmatch(normalized)
+    if number:
+        return f"class {int(number.group(1))}"
+    return normalized
+
+
+def class_keys(level_class: Optional[str]) -> FrozenSet[str]:
+    """Normalized classes named by free text such as "Class 9, 10" or "Class 6-8" """
+    keys = set()
+    for part in _CLASS_SEPARATORS.split(level_class or ""):
+        span = _CLASS_RANGE.fullmatch(normalize_search_text(part))
+        if span and int(span.group(1)) < int(span.group(2)) <= 12:
+            keys.update(f"class {number}" for number in range(int(span.group(1)), int(span.group(2)) + 1))
+        elif part:
+            keys.add(normalize_class(part))
+    keys.discard("")
+    return frozenset(keys)
+
+
+def _location_key(doc: Dict[str, Any]) -> str:
+    # The gazetteer id when the text resolved, so spellings of one place agree
+    return doc.get("locality_id") or normalize_search_text(doc.get("location"))
+
+
+def _normalized_set(values: Optional[Iterable[str]]) -> FrozenSet[str]:
+    return frozenset(filter(None, (normalize_search_text(value) for value in values or [])))
+
+
+@dataclass
+class TutorEntry:
+    user_id: str
+    subjects: FrozenSet[str]
+    classes: FrozenSet[Tuple[str, str]]
+    languages: FrozenSet[str]
+    modes: FrozenSet[str]
+    gender: str
+    location: str
+    geo: Optional[Dict[str, Any]]
+    fee_min: Optional[int]
+    rating: float
+    rating_count: int
+
+    @classmethod
+    def from_profile(cls, profile: Dict[str, Any]) -> "TutorEntry":
+        subjects: Set[str] = set()
+        classes: Set[Tuple[str, str]] = set()
+        for entry in profile.get("subjects") or []:
+            tokens = subject_tokens(entry.get("subject"))
+            subjects.update(tokens)
+            for class_name in entry.get("classes") or []:
+                classes.update((token, key) for token in tokens for key in class_keys(class_name))
+
+        modes = set()
+        if profile.get("teaches_online"):
+            modes.add(ONLINE)
+        if profile.get("teaches_at_home") or profile.get("can_travel"):
+            modes.add(HOME)
+
+        return cls(
+            user_id=profile["user_id"],
+            subjects=frozenset(subjects),
+            classes=frozenset(classes),
+            languages=_normalized_set(profile.get("languages")),
+            modes=frozenset(modes),
+            gender=normalize_search_text(profile.get("gender")),
+            location=_location_key(profile),
+            geo=profile.get("geo"),
+            fee_min=profile.get("fee_min"),
+            rating=profile.get("average_rating") or 0.0,
+            rating_count=profile.get("rating_count") or 0,
+        )
+
+
+@dataclass
+class RequirementEntry:
+    id: str
+    student_id: Optional[str]
+    subjects: FrozenSet[str]
+    classes: FrozenSet[str]
+    languages: FrozenSet[str]
+    modes: FrozenSet[str]
+    gender: str
+    location: str
+    geo: Optional[Dict[str, Any]]
+    max_fee: Optional[int]
+
+    @classmethod
+    def from_requirement(cls, requirement: Dict[str, Any]) -> "RequirementEntry":
+        gender = normalize_search_text(requirement.get("gender_preference"))
+        return cls(
+            id=requirement["id"],
+            student_id=requirement.get("student_id"),
+            subjects=subject_tokens(requirement.get("subject")),
+            classes=class_keys(requirement.get("level_class")),
+            languages=_normalized_set(requirement.get("languages")),
+            modes=_normalized_set(requirement.get("mode")),
+            gender="" if gender == "any" else gender,
+            location=_location_key(requirement),
+            geo=requirement.get("geo"),
+            max_fee=requirement.get("max_fee"),
+        )
+
+
+def eligible(requirement: RequirementEntry, tutor: TutorEntry, max_fee: Optional[int] = None) -> bool:
+    """Hard filters: a shared subject word, a usable mode, gender and budget"""
+    if not requirement.subjects & tutor.subjects:
+        return False
+    # Students who travel can reach any tutor; otherwise the tutor must offer a requested mode
+    if requirement.modes and TRAVEL not in requirement.modes and not requirement.modes & tutor.modes:
+        return False
+    if requirement.gender and requirement.gender != tutor.gender:
+        return False
+    budget = max_fee if max_fee is not None else requirement.max_fee
+    if budget is not None and tutor.fee_min is not None and tutor.fee_min > budget:
+        return False
+    return True
+
+
+def score(requirement: RequirementEntry, tutor: TutorEntry) -> int:
+    shared = requirement.subjects & tutor.subjects
+    total = SCORE_SUBJECT * len(shared) / len(requirement.subjects)
+    if any((token, class_name) in tutor.classes for token in shared for class_name in requirement.classes):
+        total += SCORE_CLASS
+    if requirement.languages:
+        total += SCORE_LANGUAGE * len(requirement.languages & tutor.languages) / len(requirement.languages)
+    else:
+        total += SCORE_LANGUAGE
+    if requirement.location and requirement.location == tutor.location:
+        total += SCORE_LOCATION
+    elif requirement.geo and tutor.geo and distance_km(requirement.geo, tutor.geo) <= NEARBY_KM:
+        total += SCORE_NEARBY
+    return round(total)
+
+
+class _Catalog:
+    """Entries plus the inverted indexes over them; swapped whole on rebuild"""
+
+    def __init__(self):
+        self.tutors: Dict[str, TutorEntry] = {}
+        self.requirements: Dict[str, RequirementEntry] = {}
+        self.tutors_by_subject: Dict[str, Set[str]] = defaultdict(set)
+        self.tutors_by_mode: Dict[str, Set[str]] = defaultdict(set)
+        self.tutors_by_gender: Dict[str, Set[str]] = defaultdict(set)
+        self.requirements_by_subject: Dict[str, Set[str]] = defaultdict(set)
+
+    def _tutor_keys(self, tutor: TutorEntry):
+        yield from ((self.tutors_by_subject, key) for key in tutor.subjects)
+        yield from ((self.tutors_by_mode, key) for key in tutor.modes)
+        yield self.tutors_by_gender, tutor.gender
+
+    def put_tutor(self, tutor: TutorEntry) -> None:
+        self.remove_tutor(tutor.user_id)
+        self.tutors[tutor.user_id] = tutor
+        for index, key in self._tutor_keys(tutor):
+            index[key].add(tutor.user_id)
+
+    def remove_tutor(self, user_id: str) -> None:
+        tutor = self.tutors.pop(user_id, None)
+        if tutor is None:
+            return
+        for index, key in self._tutor_keys(tutor):
+            ids = index.get(key)
+            if ids is not None:
+                ids.discard(user_id)
+                if not ids:
+                    del index[key]
+
+    def put_requirement(self, requirement: RequirementEntry) -> None:
+        self.remove_requirement(requirement.id)
+        self.requirements[requirement.id] = requirement
+        for token in requirement.subjects:
+            self.requirements_by_subject[token].add(requirement.id)
+
+    def remove_requirement(self, requirement_id: str) -> None:
+        requirement = self.requirements.pop(requirement_id, None)
+        if requirement is None:
+            return
+        for token in requirement.subjects:
+            ids = self.requirements_by_subject.get(token)
+            if ids is not None:
+                ids.discard(requirement_id)
+                if not ids:
+                    del self.requirements_by_subject[token]
+
+    def tutor_candidates(self, requirement: RequirementEntry) -> Set[str]:
+        candidates: Set[str] = set()
+        for token in requirement.subjects:
+            candidates |= self.tutors_by_subject.get(token, set())
+        if requirement.modes and TRAVEL not in requirement.modes:
+            offering: Set[str] = set()
+            for mode in requirement.modes:
+                offering |= self.tutors_by_mode.get(mode, set())
+            candidates &= offering
+        if requirement.gender:
+            candidates &= self.tutors_by_gender.get(requirement.gender, set())
+        return candidates
+
+    def requirement_candidates(self, tutor: TutorEntry) -> Set[str]:
+        candidates: Set[str] = set()
+        for token in tutor.subjects:
+            candidates |= self.requirements_by_subject.get(token, set())
+        return candidates
+
+
+class MatchingEngine:
+    def __init__(self, db, poll_interval: float = 15.0, rebuild_interval: float = 900.0):
+        self.db = db
+        self.poll_interval = poll_interval
+        self.rebuild_interval = rebuild_interval
+        self._catalog = _Catalog()
+        self._synced_until: Optional[str] = None
+        self._rebuilt_at = 0.0
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def ready(self) -> bool:
+        """Whether the first full build has finished"""
+        return self._rebuilt_at > 0
+
+    @property
+    def tutor_count(self) -> int:
+        return len(self._catalog.tutors)
+
+    @property
+    def requirement_count(self) -> int:
+        return len(self._catalog.requirements)
+
+    async def rebuild(self) -> None:
+        started = datetime.now(timezone.utc).isoformat()
+        catalog = _Catalog()
+        async for profile in self.db.tutor_profiles.find({}, MATCH_TUTOR_PROJECTION):
+            catalog.put_tutor(TutorEntry.from_profile(profile))
+        async for requirement in self.db.requirements.find({"status": "active"}, MATCH_REQUIREMENT_PROJECTION):
+            catalog.put_requirement(RequirementEntry.from_requirement(requirement))
+        self._catalog = catalog
+        self._synced_until = started
+        self._rebuilt_at = time.monotonic()
+        logger.info(f"Matching indexes rebuilt: {len(catalog.tutors)} tutors, {len(catalog.requirements)} requirements")
+
+    async def sync(self) -> None:
+        """Apply profiles and requirements changed since the last sync, e.g. by another worker"""
+        started = datetime.now(timezone.utc).isoformat()
+        changed = {"updated_at": {"$gt": self._synced_until}} if self._synced_until else {}
+        async for profile in self.db.tutor_profiles.find(changed, MATCH_TUTOR_PROJECTION):
+            self.index_tutor(profile)
+        async for requirement in self.db.requirements.find(changed, MATCH_REQUIREMENT_PROJECTION):
+            if requirement.get("status") == "active":
+                self.add_requirement(requirement)
+            else:
+                self.remove_requirement(requirement["id"])
+        self._synced_until = started
+
+    def index_tutor(self, profile: Dict[str, Any]) -> None:
+        self._catalog.put_tutor(TutorEntry.from_profile(profile))
+
+    def remove_tutor(self, user_id: str) -> None:
+        self._catalog.remove_tutor(user_id)
+
+    def add_requirement(self, requirement: Dict[str, Any]) -> None:
+        self._catalog.put_requirement(RequirementEntry.from_requirement(requirement))
+
+    def remove_requirement(self, requirement_id: str) -> None:
+        self._catalog.remove_requirement(requirement_id)
+
+    def remove_student_requirements(self, student_id: str) -> None:
+        catalog = self._catalog
+        for requirement in [r for r in catalog.requirements.values() if r.student_id == student_id]:
+            catalog.remove_requirement(requirement.id)
+
+    def match_tutors(self, requirement: Dict[str, Any], limit: int, max_fee: Optional[int] = None) -> List[Tuple[str, int]]:
+        """Top `limit` (tutor user_id, score) for a requirement document"""
+        return self._rank_tutors(self._catalog, requirement, limit, max_fee)
+
+    def match_requirements(self, profile: Dict[str, Any], limit: int) -> List[Tuple[str, int]]:
+        """Top `limit` (requirement id, score) for a tutor profile document"""
+        return self._rank_requirements(self._catalog, profile, limit)
+
+    async def tutors_for(self, requirement: Dict[str, Any], limit: int, max_fee: Optional[int] = None) -> List[Tuple[str, int]]:
+        """`match_tutors`, or a ranking of tutors read from MongoDB before the first build"""
+        if self.ready:
+            return self.match_tutors(requirement, limit, max_fee)
+
+        # Tutors teaching any of the subject words, under any alias
+        words = set()
+        for token in subject_tokens(requirement.get("subject")):
+            words.add(token)
+            words.update(word for word, canonical in SUBJECT_ALIASES.items() if canonical == token)
+        if not words:
+            return []
+        catalog = _Catalog()
+        query = {"$or": [build_tutor_query(subject=word) for word in sorted(words)]}
+        async for profile in self.db.tutor_profiles.find(query, MATCH_TUTOR_PROJECTION).limit(FALLBACK_CANDIDATES):
+            catalog.put_tutor(TutorEntry.from_profile(profile))
+        return self._rank_tutors(catalog, requirement, limit, max_fee)
+
+    async def requirements_for(self, profile: Dict[str, Any], limit: int) -> List[Tuple[str, int]]:
+        """`match_requirements`, or a ranking of the newest active requirements before the first build"""
+        if self.ready:
+            return self.match_requirements(profile, limit)
+
+        catalog = _Catalog()
+        newest = self.db.requirements.find({"status": "active"}, MATCH_REQUIREMENT_PROJECTION)
+        async for requirement in newest.sort([("created_at", -1), ("id", -1)]).limit(FALLBACK_CANDIDATES):
+            catalog.put_requirement(RequirementEntry.from_requirement(requirement))
+        return self._rank_requirements(catalog, profile, limit)
+
+    @staticmethod
+    def _rank_tutors(catalog: "_Catalog", requirement: Dict[str, Any], limit: int, max_fee: Optional[int]) -> List[Tuple[str, int]]:
+        entry = RequirementEntry.from_requirement(requirement)
+        ranked = (
+            (score(entry, tutor), tutor.rating, tutor.rating_count, tutor.user_id)
+            for tutor in map(catalog.tutors.__getitem__, catalog.tutor_candidates(entry))
+            if eligible(entry, tutor, max_fee)
+        )
+        return [(user_id, points) for points, _, _, user_id in heapq.nlargest(limit, ranked)]
+
+    @staticmethod
+    def _rank_requirements(catalog: "_Catalog", profile: Dict[str, Any], limit: int) -> List[Tuple[str, int]]:
+        tutor = TutorEntry.from_profile(profile)
+        ranked = (
+            (score(requirement, tutor), requirement.id)
+            for requirement in map(catalog.requirements.__getitem__, catalog.requirement_candidates(tutor))
+            if eligible(requirement, tutor)
+        )
+        return [(requirement_id, points) for points, requirement_id in heapq.nlargest(limit, ranked)]
+
+    async def _run(self) -> None:
+        while not self.ready:
+            try:
+                await self.rebuild()
+            except Exception as e:
+                logger.error(f"Matching index build failed, will retry: {str(e)}")
+                await asyncio.sleep(self.poll_interval)
+
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            try:
+                if time.monotonic() - self._rebuilt_at >= self.rebuild_interval:
+                    await self.rebuild()
+                else:
+                    await self.sync()
+            except Exception as e:
+                logger.error(f"Matching index refresh failed, will retry: {str(e)}")
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
@@ -0,0 +1,199 @@
+"""Per-route request metrics and Mongo command accounting.
+
+`MetricsMiddleware` times every request and labels it with its route
+template (e.g. /api/tutors/{tutor_id}), so paths with ids do not explode the
+label set. `CommandMetrics` is a pymongo CommandListener. Motor runs
+commands in threads that inherit the calling task's contextvars, so each
+command is charged to the request that issued it. A handler doing N+1
+queries shows up as a high mongo-commands-per-request for its route.
+
+Everything is rendered by `Metrics.render()` in the Prometheus text format
+served at /api/metrics. Gauges registered with `Metrics.gauge` are read at
+scrape time.
+"""
+import threading
+import time
+from collections import defaultdict
+from contextvars import ContextVar
+from typing import Callable, Dict, List, Optional, Tuple
+
+from pymongo import monitoring
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COMMANDS_PER_REQUEST_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 50, 100)
+
+BACKGROUND_ROUTE = "background"
+
+
+class RequestStats:
+    __slots__ = ("scope", "commands", "command_seconds")
+
+    def __init__(self, scope: Scope):
+        self.scope = scope
+        self.commands = 0
+        self.command_seconds = 0.0
+
+    @property
+    def route(self) -> str:
+        # The router stores the matched route in the shared scope
+        route = self.scope.get("route")
+        # Unmatched paths share one label so scanners cannot blow up cardinality
+        return getattr(route, "path", None) or "unmatched"
+
+
+_current_request: ContextVar[Optional[RequestStats]] = ContextVar("metrics_current_request", default=None)
+
+
+def current_request() -> Optional[RequestStats]:
+    return _current_request.get()
+
+
+class _Histogram:
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.total = 0
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        self.total += 1
+        self.sum += value
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(**labels) -> str:
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in labels.items()) + "}"
+
+
+class Metrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests: Dict[Tuple[str, str, str], int] = defaultdict(int)
+        self.latency: Dict[Tuple[str, str], _Histogram] = {}
+        self.commands_per_request: Dict[str, _Histogram] = {}
+        self.commands: Dict[Tuple[str, str], int] = defaultdict(int)
+        self.command_failures: Dict[Tuple[str, str], int] = defaultdict(int)
+        self.command_seconds: Dict[str, float] = defaultdict(float)
+        self._gauges: List[Tuple[str, str, str, Callable[[], float]]] = []
+
+    def observe_request(self, method: str, route: str, status: int, seconds: float, stats: RequestStats) -> None:
+        with self._lock:
+            self.requests[(method, route, str(status))] += 1
+            self.latency.setdefault((method, route), _Histogram(LATENCY_BUCKETS)).observe(seconds)
+            self.commands_per_request.setdefault(route, _Histogram(COMMANDS_PER_REQUEST_BUCKETS)).observe(stats.commands)
+
+    def observe_command(self, route: str, command: str, seconds: float, failed: bool) -> None:
+        with self._lock:
+            self.commands[(route, command)] += 1
+            self.command_seconds[route] += seconds
+            if failed:
+                self.command_failures[(route, command)] += 1
+
+    def gauge(self, name: str, help_text: str, read: Callable[[], float], kind: str = "gauge") -> None:
+        """Expose a value owned elsewhere; `kind="counter"` for monotonic totals"""
+        self._gauges.append((name, kind, help_text, read))
+
+    def render(self) -> str:
+        lines: List[str] = []
+
+        def header(name: str, kind: str, help_text: str) -> None:
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+
+        def histogram(name: str, labels: Dict[str, str], hist: _Histogram) -> None:
+            for bound, count in zip(hist.buckets, hist.counts):
+                lines.append(f"{name}_bucket{_labels(**labels, le=bound)} {count}")
+            lines.append(f"{name}_bucket{_labels(**labels, le='+Inf')} {hist.total}")
+            lines.append(f"{name}_sum{_labels(**labels)} {hist.sum}")
+            lines.append(f"{name}_count{_labels(**labels)} {hist.total}")
+
+        with self._lock:
+            header("http_requests_total", "counter", "HTTP requests by route and status")
+            for (method, route, status), count in sorted(self.requests.items()):
+                lines.append(f"http_requests_total{_labels(method=method, route=route, status=status)} {count}")
+
+            header("http_request_duration_seconds", "histogram", "HTTP request latency by route")
+            for (method, route), hist in sorted(self.latency.items()):
+                histogram("http_request_duration_seconds", {"method": method, "route": route}, hist)
+
+            header("mongo_commands_per_request", "histogram", "Mongo commands issued per HTTP request")
+            for route, hist in sorted(self.commands_per_request.items()):
+                histogram("mongo_commands_per_request", {"route": route}, hist)
+
+            header("mongo_commands_total", "counter", "Mongo commands by originating route and command name")
+            for (route, command), count in sorted(self.commands.items()):
+                lines.append(f"mongo_commands_total{_labels(route=route, command=command)} {count}")
+
+            header("mongo_command_failures_total", "counter", "Failed Mongo commands by route and command name")
+            for (route, command), count in sorted(self.command_failures.items()):
+                lines.append(f"mongo_command_failures_total{_labels(route=route, command=command)} {count}")
+
+            header("mongo_command_seconds_total", "counter", "Time spent in Mongo commands by originating route")
+            for route, seconds in sorted(self.command_seconds.items()):
+                lines.append(f"mongo_command_seconds_total{_labels(route=route)} {seconds}")
+
+        for name, kind, help_text, read in self._gauges:
+            header(name, kind, help_text)
+            lines.append(f"{name} {read()}")
+
+        return "\n".join(lines) + "\n"
+
+
+class CommandMetrics(monitoring.CommandListener):
+    def __init__(self, metrics: Metrics):
+        self.metrics = metrics
+
+    def _record(self, event, failed: bool) -> None:
+        stats = _current_request.get()
+        seconds = event.duration_micros / 1e6
+        if stats is not None:
+            stats.commands += 1
+            stats.command_seconds += seconds
+        route = stats.route if stats is not None else BACKGROUND_ROUTE
+        self.metrics.observe_command(route, event.command_name, seconds, failed)
+
+    def started(self, event) -> None:
+        pass
+
+    def succeeded(self, event) -> None:
+        self._record(event, failed=False)
+
+    def failed(self, event) -> None:
+        self._record(event, failed=True)
+
+
+class MetricsMiddleware:
+    def __init__(self, app: ASGIApp, metrics: Metrics):
+        self.app = app
+        self.metrics = metrics
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats(scope)
+        token = _current_request.set(stats)
+        status = 500
+        started = time.perf_counter()
+
+        async def send_with_status(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            self.metrics.observe_request(
+                scope["method"], stats.route, status, time.perf_counter() - started, stats
+            )
+            _current_request.reset(token)
@@ -0,0 +1,127 @@
+"""Storage for one-time passwords used by signup verification and password reset.
+
+`InMemoryOtpStore` is only correct for a single worker process; it caps its
+size and sweeps expired codes in the background. `MongoOtpStore` shares codes
+between workers and survives restarts, with expiry enforced by a TTL index.
+`create_otp_store` picks one from the OTP_STORE setting.
+"""
+import asyncio
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from datetime import datetime, timezone, timedelta
+from typing import Any, Dict, Optional
+
+OTP_TTL = timedelta(minutes=10)
+
+OTP_INDEXES = [
+    ([("key", 1)], {"unique": True}),
+    # Mongo's TTL monitor deletes codes once expires_at has passed
+    ([("expires_at", 1)], {"expireAfterSeconds": 0}),
+]
+
+
+def otp_key(email: str, otp_type: str) -> str:
+    return f"{email}_{otp_type}"
+
+
+def is_expired(otp: Dict[str, Any]) -> bool:
+    return datetime.now(timezone.utc) >= otp["expires_at"]
+
+
+class OtpStore(ABC):
+    """Interface: codes are dicts with "code" and an aware "expires_at" datetime"""
+
+    @abstractmethod
+    async def put(self, key: str, code: str, ttl: timedelta = OTP_TTL) -> None:
+        ...
+
+    @abstractmethod
+    async def get(self, key: str) -> Optional[Dict[str, Any]]:
+        ...
+
+    @abstractmethod
+    async def delete(self, key: str) -> None:
+        ...
+
+    def start(self) -> None:
+        pass
+
+    async def stop(self) -> None:
+        pass
+
+
+class InMemoryOtpStore(OtpStore):
+    def __init__(self, max_entries: int = 10000, sweep_interval: float = 60.0):
+        self.max_entries = max_entries
+        self.sweep_interval = sweep_interval
+        self._codes: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._task: Optional[asyncio.Task] = None
+
+    async def put(self, key: str, code: str, ttl: timedelta = OTP_TTL) -> None:
+        self._codes.pop(key, None)
+        self._codes[key] = {"code": code, "expires_at": datetime.now(timezone.utc) + ttl}
+        while len(self._codes) > self.max_entries:
+            self._codes.popitem(last=False)
+
+    async def get(self, key: str) -> Optional[Dict[str, Any]]:
+        otp = self._codes.get(key)
+        return dict(otp) if otp else None
+
+    async def delete(self, key: str) -> None:
+        self._codes.pop(key, None)
+
+    def sweep(self) -> int:
+        expired = [key for key, otp in self._codes.items() if is_expired(otp)]
+        for key in expired:
+            del self._codes[key]
+        return len(expired)
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.sweep_interval)
+            self.sweep()
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+class MongoOtpStore(OtpStore):
+    def __init__(self, db):
+        self.collection = db.otp_codes
+
+    async def put(self, key: str, code: str, ttl: timedelta = OTP_TTL) -> None:
+        await self.collection.update_one(
+            {"key": key},
+            {"$set": {"code": code, "expires_at": datetime.now(timezone.utc) + ttl}},
+            upsert=True
+        )
+
+    async def get(self, key: str) -> Optional[Dict[str, Any]]:
+        otp = await self.collection.find_one({"key": key}, {"_id": 0, "code": 1, "expires_at": 1})
+        if not otp:
+            return None
+        # BSON dates come back naive (UTC)
+        if otp["expires_at"].tzinfo is None:
+            otp["expires_at"] = otp["expires_at"].replace(tzinfo=timezone.utc)
+        return otp
+
+    async def delete(self, key: str) -> None:
+        await self.collection.delete_one({"key": key})
+
+
+def create_otp_store(kind: str, db, max_entries: int = 10000) -> OtpStore:
+    if kind == "memory":
+        return InMemoryOtpStore(max_entries=max_entries)
+    if kind == "mongo":
+        return MongoOtpStore(db)
+    raise ValueError(f"Unknown OTP_STORE '{kind}', expected 'memory' or 'mongo'")
@@ -0,0 +1,192 @@
+"""Durable email outbox with a background delivery worker.
+
+Handlers used to render HTML and call the email provider inline, so request
+latency included a third-party round-trip and a provider hiccup became a 500.
+Now they only insert a message into the `email_outbox` collection; the
+`EmailOutbox` worker claims due messages in batches, sends them, retries
+failures with exponential backoff and dead-letters messages that keep
+failing. Claims carry a lease, so several API workers can drain the same
+outbox and a crashed worker's messages are picked up again.
+"""
+import asyncio
+import html
+import logging
+import random
+import uuid
+from datetime import datetime, timezone, timedelta
+from string import Template
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+OUTBOX_INDEXES = [
+    ([("id", 1)], {"unique": True}),
+    ([("status", 1), ("next_attempt_at", 1)], {}),
+    ([("status", 1), ("locked_until", 1)], {}),
+]
+
+_EMAIL_LAYOUT = """
+<html>
+    <body style="font-family: Arial, sans-serif; padding: 20px; background-color: #f5f5f5;">
+        <div style="max-width: 600px; margin: 0 auto; background-color: white; padding: 30px; border-radius: 10px; box-shadow: 0 2px 10px rgba(0,0,0,0.1);">
+            <h2 style="color: #4F46E5; text-align: center;">$heading</h2>
+            <p style="font-size: 16px; color: #333;">Hello $name,</p>
+            <p style="font-size: 16px; color: #333;">$intro</p>
+            <div style="background-color: #4F46E5; color: white; font-size: 32px; font-weight: bold; text-align: center; padding: 20px; border-radius: 5px; margin: 20px 0; letter-spacing: 5px;">
+                $otp_code
+            </div>
+            <p style="font-size: 14px; color: #666;">This OTP will expire in 10 minutes.</p>
+            <p style="font-size: 14px; color: #666;">$ignore_note</p>
+            <hr style="border: none; border-top: 1px solid #eee; margin: 30px 0;">
+            <p style="font-size: 12px; color: #999; text-align: center;">Tricity Tutors - Chandigarh Region</p>
+        </div>
+    </body>
+</html>
+"""
+
+# Compiled once at import; only the name and code vary per message
+VERIFICATION_EMAIL = Template(Template(_EMAIL_LAYOUT).safe_substitute(
+    heading="Tricity Tutors - Email Verification",
+    intro="Your OTP for email verification is:",
+    ignore_note="If you didn't request this verification, please ignore this email.",
+))
+RESET_EMAIL = Template(Template(_EMAIL_LAYOUT).safe_substitute(
+    heading="Password Reset - Tricity Tutors",
+    intro="You requested to reset your password. Use this OTP:",
+    ignore_note="If you didn't request this, please ignore this email.",
+))
+
+
+def render_otp_email(template: Template, name: Optional[str], otp_code: str) -> str:
+    return template.substitute(name=html.escape(name or "User"), otp_code=otp_code)
+
+
+class EmailOutbox:
+    def __init__(
+        self,
+        db,
+        sender: str,
+        send: Callable[[Dict[str, Any]], Awaitable[Any]],
+        batch_size: int = 20,
+        poll_interval: float = 2.0,
+        max_attempts: int = 5,
+        backoff_base: float = 5.0,
+        lease_seconds: float = 60.0,
+    ):
+        self.collection = db.email_outbox
+        self.sender = sender
+        self.send = send
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.lease_seconds = lease_seconds
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self.sent_total = 0
+        self.failed_total = 0
+        self.dead_total = 0
+
+    async def enqueue(self, to: str, subject: str, html_content: str) -> str:
+        message_id = str(uuid.uuid4())
+        now = datetime.now(timezone.utc)
+        await self.collection.insert_one({
+            "id": message_id,
+            "to": to,
+            "subject": subject,
+            "html": html_content,
+            "status": "pending",
+            "attempts": 0,
+            "next_attempt_at": now,
+            "created_at": now,
+        })
+        self._wakeup.set()
+        return message_id
+
+    async def _claim(self) -> Optional[Dict[str, Any]]:
+        now = datetime.now(timezone.utc)
+        return await self.collection.find_one_and_update(
+            {"$or": [
+                {"status": "pending", "next_attempt_at": {"$lte": now}},
+                # A worker died mid-send; its lease ran out
+                {"status": "sending", "locked_until": {"$lte": now}},
+            ]},
+            {"$set": {"status": "sending", "locked_until": now + timedelta(seconds=self.lease_seconds)}},
+            projection={"_id": 0},
+            sort=[("next_attempt_at", 1)]
+        )
+
+    async def _deliver(self, message: Dict[str, Any]) -> bool:
+        try:
+            await self.send({
+                "from": self.sender,
+                "to": [message["to"]],
+                "subject": message["subject"],
+                "html": message["html"],
+            })
+        except Exception as e:
+            attempts = message.get("attempts", 0) + 1
+            self.failed_total += 1
+            if attempts >= self.max_attempts:
+                self.dead_total += 1
+                logger.error(f"Email {message['id']} dead-lettered after {attempts} attempts: {str(e)}")
+                update = {"status": "dead", "attempts": attempts, "last_error": str(e)}
+            else:
+                delay = self.backoff_base * (2 ** (attempts - 1)) * random.uniform(0.5, 1.0)
+                logger.warning(f"Email {message['id']} failed (attempt {attempts}), retrying in {delay:.0f}s: {str(e)}")
+                update = {
+                    "status": "pending",
+                    "attempts": attempts,
+                    "last_error": str(e),
+                    "next_attempt_at": datetime.now(timezone.utc) + timedelta(seconds=delay),
+                }
+            await self.collection.update_one({"id": message["id"]}, {"$set": update, "$unset": {"locked_until": ""}})
+            return False
+
+        self.sent_total += 1
+        await self.collection.update_one(
+            {"id": message["id"]},
+            {"$set": {"status": "sent", "sent_at": datetime.now(timezone.utc)}, "$unset": {"locked_until": "", "html": ""}}
+        )
+        return True
+
+    async def drain_once(self) -> int:
+        """Claim and deliver up to one batch; returns how many were claimed"""
+        batch = []
+        while len(batch) < self.batch_size:
+            message = await self._claim()
+            if not message:
+                break
+            batch.append(message)
+        if not batch:
+            return 0
+
+        await asyncio.gather(*(self._deliver(message) for message in batch))
+        return len(batch)
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                claimed = await self.drain_once()
+            except Exception as e:
+                logger.error(f"Email outbox drain failed: {str(e)}")
+                claimed = 0
+            if claimed < self.batch_size:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
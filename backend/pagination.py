@@ -0,0 +1,174 @@
+"""Opaque keyset cursors for list endpoints.
+
+A cursor encodes the sort-key values of the last document on a page, so the
+next page is a range predicate on a compound index instead of a growing
+`skip()`. Cursors are URL-safe base64 JSON and carry no meaning for clients.
+"""
+import base64
+import json
+import math
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from fastapi import HTTPException
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+SortSpec = Sequence[Tuple[str, int]]
+
+CREATED_DESC = [("created_at", -1), ("id", -1)]
+CREATED_ASC = [("created_at", 1), ("id", 1)]
+REGISTERED_DESC = [("registered_at", -1), ("id", -1)]
+
+DISTANCE_FIELD = "distance_m"
+
+# tutor_profiles(registered_at, id) comes with the search indexes and active
+# requirements use a partial index, both declared in indexes.py.
+PAGINATION_INDEXES = [
+    ("requirements", [("student_id", 1), ("created_at", -1), ("id", -1)]),
+    ("messages", [("sender_id", 1), ("created_at", -1), ("id", -1)]),
+    ("messages", [("recipient_id", 1), ("created_at", -1), ("id", -1)]),
+    ("reviews", [("tutor_id", 1), ("created_at", -1), ("id", -1)]),
+    ("transactions", [("user_id", 1), ("created_at", -1), ("id", -1)]),
+]
+
+
+def encode_cursor(doc: Dict[str, Any], sort: SortSpec) -> str:
+    values = [doc.get(field) for field, _ in sort]
+    raw = json.dumps(values, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str, sort: SortSpec) -> List[Any]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+    except (ValueError, UnicodeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if not isinstance(values, list) or len(values) != len(sort):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    # Sort keys are scalars; an object here would be read as a query operator
+    if any(isinstance(value, (dict, list)) for value in values):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return values
+
+
+def after_cursor(query: Dict[str, Any], sort: SortSpec, cursor: Optional[str]) -> Dict[str, Any]:
+    """Restrict `query` to documents strictly after `cursor` in `sort` order"""
+    if not cursor:
+        return query
+
+    values = decode_cursor(cursor, sort)
+    branches = []
+    for i, (field, direction) in enumerate(sort):
+        branch = {sort[j][0]: values[j] for j in range(i)}
+        branch[field] = {"$lt" if direction < 0 else "$gt": values[i]}
+        branches.append(branch)
+
+    if "$or" in query:
+        # Distribute the keyset into each alternative so every branch of the
+        # $or stays an index range scan (e.g. sender_id / recipient_id).
+        rest = {k: v for k, v in query.items() if k != "$or"}
+        return {
+            **rest,
+            "$or": [{**alternative, **branch} for alternative in query["$or"] for branch in branches],
+        }
+    return {**query, "$or": branches}
+
+
+async def fetch_page(
+    collection,
+    query: Dict[str, Any],
+    projection: Dict[str, Any],
+    sort: SortSpec,
+    limit: int,
+    cursor: Optional[str] = None,
+) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """Fetch one page and the cursor for the next one (None on the last page)"""
+    docs = await collection.find(
+        after_cursor(query, sort, cursor), projection
+    ).sort(list(sort)).limit(limit + 1).to_list(limit + 1)
+
+    if len(docs) > limit:
+        docs = docs[:limit]
+        return docs, encode_cursor(docs[-1], sort)
+    return docs, None
+
+
+def _sort_key(value: Any) -> Tuple[bool, Any]:
+    # MongoDB sorts null (and missing) before any value
+    return value is not None, value
+
+
+async def fetch_nearest_page(
+    collection,
+    query: Dict[str, Any],
+    projection: Dict[str, Any],
+    point: Dict[str, Any],
+    max_distance_m: float,
+    sort: SortSpec,
+    limit: int,
+    cursor: Optional[str] = None,
+) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """Nearest-first page within `max_distance_m` of a GeoJSON `point`.
+
+    Many documents share a locality centroid, so distance alone cannot be a
+    keyset; `sort` breaks ties. A cursor resumes the 2dsphere scan at the
+    last page's distance via `minDistance`, and the tie-break keys filter out
+    the documents already returned at exactly that distance.
+
+    `$geoNear` already returns documents nearest first, so the page is cut
+    with `$limit` straight away. Only the documents tied at the page's last
+    distance are re-read, sorted and cut again.
+    """
+    order = [(DISTANCE_FIELD, 1), *sort]
+    min_distance_m = 0
+    if cursor:
+        min_distance_m = decode_cursor(cursor, order)[0]
+        if (
+            isinstance(min_distance_m, bool)
+            or not isinstance(min_distance_m, (int, float))
+            or not math.isfinite(min_distance_m)
+            or min_distance_m < 0
+        ):
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    def nearest_pipeline(min_m: float, max_m: float, tie_sorted: bool, count: int) -> List[Dict[str, Any]]:
+        geo_near = {
+            "near": point,
+            "distanceField": DISTANCE_FIELD,
+            "minDistance": min_m,
+            "maxDistance": max_m,
+            "query": query,
+            "spherical": True,
+        }
+        return [
+            {"$geoNear": geo_near},
+            {"$match": after_cursor({}, order, cursor)},
+            *([{"$sort": dict(sort)}] if tie_sorted else []),
+            {"$limit": count},
+            {"$project": projection},
+        ]
+
+    docs = await collection.aggregate(nearest_pipeline(min_distance_m, max_distance_m, False, limit + 1)).to_list(limit + 1)
+
+    if len(docs) > limit:
+        # $geoNear orders equal distances arbitrarily, so the cut may have
+        # split the last distance's documents; re-read those in `sort` order
+        boundary = docs[-1][DISTANCE_FIELD]
+        docs = [doc for doc in docs if doc[DISTANCE_FIELD] < boundary]
+        remaining = limit + 1 - len(docs)
+        tied = await collection.aggregate(nearest_pipeline(boundary, boundary, True, remaining)).to_list(remaining)
+    else:
+        tied = []
+    # Ties below the boundary came back whole; put them in `sort` order too
+    for field, direction in reversed(order):
+        docs.sort(key=lambda doc: _sort_key(doc.get(field)), reverse=direction < 0)
+    docs += tied
+
+    next_cursor = None
+    if len(docs) > limit:
+        docs = docs[:limit]
+        next_cursor = encode_cursor(docs[-1], order)
+    for doc in docs:
+        doc["distance_km"] = round(doc.pop(DISTANCE_FIELD) / 1000, 2)
+    return docs, next_cursor
@@ -0,0 +1,61 @@
+"""bcrypt hashing off the event loop.
+
+bcrypt is deliberately slow (~250ms at cost 12), so calling it inside an
+async handler stalls every other in-flight request. Hashes are computed in
+a small dedicated thread pool instead, and the number of queued or running
+jobs is tracked so saturation is visible.
+"""
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import bcrypt
+
+BCRYPT_ROUNDS = int(os.environ.get('BCRYPT_ROUNDS', '12'))
+BCRYPT_WORKERS = int(os.environ.get('BCRYPT_WORKERS', '4'))
+
+_executor = ThreadPoolExecutor(max_workers=BCRYPT_WORKERS, thread_name_prefix="bcrypt")
+_pending = 0
+
+
+def _hash(password: str, rounds: int) -> str:
+    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(rounds=rounds)).decode('utf-8')
+
+
+def _verify(password: str, hashed: str) -> bool:
+    return bcrypt.checkpw(password.encode('utf-8'), hashed.encode('utf-8'))
+
+
+async def _run(func, *args):
+    global _pending
+    _pending += 1
+    try:
+        return await asyncio.get_running_loop().run_in_executor(_executor, func, *args)
+    finally:
+        _pending -= 1
+
+
+async def hash_password(password: str) -> str:
+    return await _run(_hash, password, BCRYPT_ROUNDS)
+
+
+async def verify_password(password: str, hashed: str) -> bool:
+    return await _run(_verify, password, hashed)
+
+
+def hash_rounds(hashed: str) -> int:
+    """Cost factor encoded in a `$2b$<rounds>$...` hash, or 0 if unreadable"""
+    try:
+        return int(hashed.split("$")[2])
+    except (IndexError, ValueError):
+        return 0
+
+
+def needs_rehash(hashed: str) -> bool:
+    return hash_rounds(hashed) != BCRYPT_ROUNDS
+
+
+def queue_depth() -> int:
+    """Hash/verify jobs currently queued or running in the pool"""
+    return _pending
+
@@ -0,0 +1,187 @@
+"""Content-addressed profile photo storage in GridFS.
+
+Photos used to live inside `tutor_profiles.profile_photo` as base64 data
+URLs, which made every browse response carry ~133KB per tutor. Now the raw
+bytes are stored once per SHA-256 digest in the `profile_photos` GridFS
+bucket and the profile only keeps a short URL served by
+GET /api/uploads/profile_photos/{filename}.
+
+A unique index on the bucket's filenames keeps concurrent uploads of the same
+photo from storing it twice: the losing upload's files document is rejected
+and its chunks are removed.
+"""
+import asyncio
+import base64
+import binascii
+import hashlib
+import io
+import logging
+from typing import Any, Dict, Optional, Tuple
+
+from bson import ObjectId
+from gridfs.errors import FileExists
+from motor.motor_asyncio import AsyncIOMotorGridFSBucket
+from pymongo import UpdateOne
+
+try:
+    from PIL import Image
+except ImportError:  # Thumbnails are optional; originals are served instead
+    Image = None
+
+logger = logging.getLogger(__name__)
+
+PHOTO_BUCKET = "profile_photos"
+PHOTO_URL_PREFIX = "/api/uploads/profile_photos/"
+THUMBNAIL_SIZE = (160, 160)
+THUMBNAIL_SUFFIX = ".thumb.jpg"
+PHOTO_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+# On the bucket's files collection; filenames are content digests
+PHOTO_FILE_INDEXES = [
+    ([("filename", 1)], {"unique": True, "name": "filename_unique"}),
+]
+
+CONTENT_TYPE_EXTENSIONS = {
+    "image/jpeg": "jpg",
+    "image/jpg": "jpg",
+    "image/png": "png",
+    "image/webp": "webp",
+}
+
+
+def photo_url(filename: str) -> str:
+    return f"{PHOTO_URL_PREFIX}{filename}"
+
+
+def thumbnail_filename(filename: str) -> str:
+    return filename.split(".", 1)[0] + THUMBNAIL_SUFFIX
+
+
+def parse_data_url(data_url: str) -> Optional[Tuple[str, bytes]]:
+    """Split a `data:<type>;base64,<payload>` URL into (content type, bytes)"""
+    try:
+        header, payload = data_url.split(",", 1)
+        content_type = header[len("data:"):].split(";", 1)[0]
+        return content_type, base64.b64decode(payload)
+    except (ValueError, binascii.Error):
+        return None
+
+
+def make_thumbnail(content: bytes) -> Optional[bytes]:
+    if Image is None:
+        return None
+    try:
+        with Image.open(io.BytesIO(content)) as image:
+            image = image.convert("RGB")
+            image.thumbnail(THUMBNAIL_SIZE)
+            output = io.BytesIO()
+            image.save(output, format="JPEG", quality=80, optimize=True)
+            return output.getvalue()
+    except Exception as e:
+        logger.warning(f"Thumbnail generation failed: {str(e)}")
+        return None
+
+
+class PhotoStore:
+    def __init__(self, db, bucket_name: str = PHOTO_BUCKET):
+        self.bucket = AsyncIOMotorGridFSBucket(db, bucket_name=bucket_name)
+        self.files = db[f"{bucket_name}.files"]
+        self.chunks = db[f"{bucket_name}.chunks"]
+
+    async def _exists(self, filename: str) -> bool:
+        return await self.files.find_one({"filename": filename}, {"_id": 1}) is not None
+
+    async def _upload(self, filename: str, content: bytes, metadata: Dict[str, Any]) -> None:
+        file_id = ObjectId()
+        try:
+            await self.bucket.upload_from_stream_with_id(file_id, filename, content, metadata=metadata)
+        except FileExists:
+            # A concurrent upload of the same digest stored it first; GridFS
+            # wrote our chunks before the files document was rejected
+            await self.chunks.delete_many({"files_id": file_id})
+
+    async def remove_duplicates(self) -> int:
+        """Delete all but the oldest copy of each filename; returns how many went.
+
+        Copies stored before the unique index existed would block creating it.
+        """
+        removed = 0
+        duplicates = self.files.aggregate([
+            {"$sort": {"uploadDate": 1}},
+            {"$group": {"_id": "$filename", "ids": {"$push": "$_id"}, "count": {"$sum": 1}}},
+            {"$match": {"count": {"$gt": 1}}},
+        ])
+        async for duplicate in duplicates:
+            for file_id in duplicate["ids"][1:]:
+                await self.bucket.delete(file_id)
+                removed += 1
+        return removed
+
+    async def put(self, content: bytes, content_type: str) -> str:
+        """Store `content` once per digest and return its filename"""
+        digest = hashlib.sha256(content).hexdigest()
+        extension = CONTENT_TYPE_EXTENSIONS.get(content_type, "bin")
+        filename = f"{digest}.{extension}"
+
+        if not await self._exists(filename):
+            await self._upload(filename, content, {"contentType": content_type, "sha256": digest})
+
+        thumb_name = thumbnail_filename(filename)
+        if Image is not None and not await self._exists(thumb_name):
+            thumbnail = await asyncio.to_thread(make_thumbnail, content)
+            if thumbnail:
+                await self._upload(
+                    thumb_name,
+                    thumbnail,
+                    {"contentType": "image/jpeg", "sha256": hashlib.sha256(thumbnail).hexdigest()}
+                )
+
+        return filename
+
+    async def get(self, filename: str) -> Optional[Dict[str, Any]]:
+        """Return {"content", "content_type", "etag"} or None if unknown"""
+        file_doc = await self.files.find_one({"filename": filename})
+        if not file_doc:
+            return None
+
+        stream = await self.bucket.open_download_stream(file_doc["_id"])
+        content = await stream.read()
+        metadata = file_doc.get("metadata") or {}
+        return {
+            "content": content,
+            "content_type": metadata.get("contentType", "application/octet-stream"),
+            "etag": f'"{metadata.get("sha256") or filename}"',
+        }
+
+
+async def migrate_data_url_photos(db, store: PhotoStore, batch_size: int = 50) -> int:
+    """Move base64 data-URL photos out of tutor_profiles into the store.
+
+    Profiles are streamed in small batches so only `batch_size` photos are
+    held in memory at a time.
+    """
+    migrated = 0
+    updates = []
+    cursor = db.tutor_profiles.find(
+        {"profile_photo": {"$regex": "^data:"}},
+        {"_id": 1, "user_id": 1, "profile_photo": 1}
+    ).batch_size(batch_size)
+
+    async for profile in cursor:
+        parsed = parse_data_url(profile["profile_photo"])
+        if not parsed:
+            logger.warning(f"Skipping unreadable photo for tutor {profile.get('user_id')}")
+            continue
+
+        content_type, content = parsed
+        filename = await store.put(content, content_type)
+        updates.append(UpdateOne({"_id": profile["_id"]}, {"$set": {"profile_photo": photo_url(filename)}}))
+        if len(updates) >= batch_size:
+            await db.tutor_profiles.bulk_write(updates, ordered=False)
+            migrated += len(updates)
+            updates = []
+
+    if updates:
+        await db.tutor_profiles.bulk_write(updates, ordered=False)
+        migrated += len(updates)
+    return migrated
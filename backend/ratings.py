@@ -0,0 +1,106 @@
+"""Incrementally maintained rating aggregates on tutor_profiles.
+
+Each profile carries `rating_sum`, `rating_count`, a per-star
+`rating_histogram` and the derived `average_rating`. Review writes apply a
+delta through a single pipeline update, so the average is recomputed from
+the new sum and count atomically instead of re-reading every review.
+"""
+import uuid
+from typing import Any, Dict, List
+
+STARS = (1, 2, 3, 4, 5)
+
+
+def _plus(field: str, delta: int) -> Dict[str, Any]:
+    return {"$add": [{"$ifNull": [f"${field}", 0]}, delta]}
+
+
+def rating_delta_pipeline(sum_delta: int, count_delta: int, star_deltas: Dict[int, int]) -> List[Dict[str, Any]]:
+    """Update pipeline applying a rating delta and refreshing average_rating"""
+    fields = {
+        "rating_sum": _plus("rating_sum", sum_delta),
+        "rating_count": _plus("rating_count", count_delta),
+    }
+    for star, delta in star_deltas.items():
+        if delta:
+            fields[f"rating_histogram.{star}"] = _plus(f"rating_histogram.{star}", delta)
+
+    return [
+        {"$set": fields},
+        {"$set": {"average_rating": {"$cond": [
+            {"$gt": ["$rating_count", 0]},
+            {"$divide": ["$rating_sum", "$rating_count"]},
+            0
+        ]}}},
+    ]
+
+
+def added_review(rating: int) -> List[Dict[str, Any]]:
+    return rating_delta_pipeline(rating, 1, {rating: 1})
+
+
+def changed_review(old_rating: int, new_rating: int) -> List[Dict[str, Any]]:
+    star_deltas = {old_rating: -1}
+    # An unchanged rating must cancel out, not overwrite the -1
+    star_deltas[new_rating] = star_deltas.get(new_rating, 0) + 1
+    return rating_delta_pipeline(new_rating - old_rating, 0, star_deltas)
+
+
+def removed_review(rating: int) -> List[Dict[str, Any]]:
+    return rating_delta_pipeline(-rating, -1, {rating: -1})
+
+
+def empty_aggregates() -> Dict[str, Any]:
+    return {
+        "rating_sum": 0,
+        "rating_count": 0,
+        "rating_histogram": {str(star): 0 for star in STARS},
+        "average_rating": 0,
+    }
+
+
+async def rebuild_rating_aggregates(db) -> int:
+    """Recompute every tutor's aggregates from `reviews` in one aggregation.
+
+    Results are merged straight into tutor_profiles on the server; profiles
+    the pass did not touch (no reviews left) are then reset to zero and the
+    temporary run marker is removed. Returns the number of profiles reset.
+    """
+    run_id = str(uuid.uuid4())
+    histogram = {
+        str(star): {"$sum": {"$cond": [{"$eq": ["$rating", star]}, 1, 0]}}
+        for star in STARS
+    }
+    pipeline = [
+        {"$group": {
+            "_id": "$tutor_id",
+            "rating_sum": {"$sum": "$rating"},
+            "rating_count": {"$sum": 1},
+            **{f"star_{star}": spec for star, spec in histogram.items()},
+        }},
+        {"$project": {
+            "_id": 0,
+            "user_id": "$_id",
+            "rating_sum": 1,
+            "rating_count": 1,
+            "rating_histogram": {str(star): f"$star_{star}" for star in STARS},
+            "average_rating": {"$divide": ["$rating_sum", "$rating_count"]},
+            "ratings_rebuilt_by": run_id,
+        }},
+        {"$merge": {
+            "into": "tutor_profiles",
+            "on": "user_id",
+            "whenMatched": "merge",
+            "whenNotMatched": "discard",
+        }},
+    ]
+    await db.reviews.aggregate(pipeline).to_list(None)
+    reset = await db.tutor_profiles.update_many(
+        {"ratings_rebuilt_by": {"$ne": run_id}},
+        {"$set": empty_aggregates()}
+    )
+    await db.tutor_profiles.update_many(
+        {"ratings_rebuilt_by": run_id},
+        {"$unset": {"ratings_rebuilt_by": ""}}
+    )
+    return reset.modified_count
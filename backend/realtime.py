@@ -0,0 +1,117 @@
+"""Live message delivery, read receipts and typing indicators.
+
+Clients used to poll /api/messages/unread and the open thread to notice new
+messages. `MessagingHub` holds each worker's /api/messages/ws connections by
+user. The messaging write paths `send` events addressed to users through the
+broker, so a user gets them on whichever worker holds the socket. A user
+with no open socket simply gets nothing; the REST endpoints still show
+everything on the next load.
+
+Events are small JSON objects with a "type":
+
+- message: {"type": "message", "message": {...}} for a new message, to the
+  recipient and the sender's other tabs
+- read: {"type": "read", "reader_id", "partner_id", "message_id" | "up_to"}
+  when `reader_id` has read one of `partner_id`'s messages, or all of them
+  up to and including `up_to`, to both of them
+- typing: {"type": "typing", "user_id"}, relayed from one participant to the
+  other and never stored
+"""
+import logging
+import time
+from collections import defaultdict
+from typing import Any, Dict, Iterable, Optional, Set
+
+from broker import Broker, Mailbox
+
+logger = logging.getLogger(__name__)
+
+USER_EVENTS_TOPIC = "user_events"
+# Clients send typing on every keystroke; partners need it far less often
+TYPING_INTERVAL = 2.0
+
+
+def message_event(message: Dict[str, Any]) -> Dict[str, Any]:
+    return {"type": "message", "message": {key: value for key, value in message.items() if key != "_id"}}
+
+
+def read_event(
+    reader_id: str, partner_id: str, message_id: Optional[str] = None, up_to: Optional[str] = None
+) -> Dict[str, Any]:
+    event = {"type": "read", "reader_id": reader_id, "partner_id": partner_id}
+    if message_id is not None:
+        event["message_id"] = message_id
+    if up_to is not None:
+        event["up_to"] = up_to
+    return event
+
+
+def typing_event(user_id: str) -> Dict[str, Any]:
+    return {"type": "typing", "user_id": user_id}
+
+
+class Connection(Mailbox):
+    def __init__(self, user_id: str, max_queue: int):
+        super().__init__(max_queue)
+        self.user_id = user_id
+        # Partners this socket may send typing events to, checked once each
+        self.partners: Set[str] = set()
+        self.last_typing: Dict[str, float] = {}
+
+    def typing_due(self, partner_id: str) -> bool:
+        now = time.monotonic()
+        if now - self.last_typing.get(partner_id, float("-inf")) < TYPING_INTERVAL:
+            return False
+        self.last_typing[partner_id] = now
+        return True
+
+
+class MessagingHub:
+    def __init__(self, broker: Broker, max_queue: int = 100, heartbeat_seconds: float = 25.0):
+        self.broker = broker
+        self.max_queue = max_queue
+        self.heartbeat_seconds = heartbeat_seconds
+        self._connections: Dict[str, Set[Connection]] = defaultdict(set)
+        self.delivered_total = 0
+        self.overflow_total = 0
+        broker.subscribe(USER_EVENTS_TOPIC, self._deliver)
+
+    @property
+    def connections(self) -> int:
+        return sum(len(connections) for connections in self._connections.values())
+
+    def connect(self, user_id: str) -> Connection:
+        connection = Connection(user_id, self.max_queue)
+        self._connections[user_id].add(connection)
+        return connection
+
+    def disconnect(self, connection: Connection) -> None:
+        connections = self._connections.get(connection.user_id)
+        if connections is not None:
+            connections.discard(connection)
+            if not connections:
+                del self._connections[connection.user_id]
+        connection.close()
+
+    def disconnect_user(self, user_id: str) -> None:
+        for connection in list(self._connections.get(user_id, ())):
+            self.disconnect(connection)
+
+    def close(self) -> None:
+        for user_id in list(self._connections):
+            self.disconnect_user(user_id)
+
+    async def send(self, user_ids: Iterable[str], event: Dict[str, Any]) -> None:
+        """Deliver `event` to every open socket of `user_ids`, on any worker"""
+        await self.broker.publish(USER_EVENTS_TOPIC, {"user_ids": sorted(set(user_ids)), "event": event})
+
+    def _deliver(self, payload: Dict[str, Any]) -> None:
+        event = payload["event"]
+        for user_id in payload["user_ids"]:
+            for connection in list(self._connections.get(user_id, ())):
+                if connection.offer(event):
+                    self.delivered_total += 1
+                else:
+                    logger.info(f"Messaging socket for {user_id} fell behind; disconnecting")
+                    self.overflow_total += 1
+                    self.disconnect(connection)
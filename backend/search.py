@@ -0,0 +1,169 @@
+"""Tutor search keys and index-backed query building for GET /api/tutors.
+
+Free-text filters used to be unanchored case-insensitive `$regex` matches on
+`subjects.subject` and `location`, which can never use an index. Instead we
+keep normalized search keys on every tutor profile (maintained on write by
+`update_tutor_profile`) and translate browse filters into predicates that
+hit multikey trigram indexes.
+"""
+import re
+from typing import Any, Dict, Iterable, List, Optional
+
+from pymongo import UpdateOne
+
+from gazetteer import locality_fields, locality_predicate, resolve
+
+GRAM_SIZE = 3
+# Only the first few grams are needed to narrow the index scan; the regex on
+# the normalized key, applied to the fetched documents, keeps the match exact.
+MAX_QUERY_GRAMS = 8
+
+SEARCH_FIELDS = (
+    "search_subjects",
+    "search_subject_grams",
+    "search_location",
+    "search_location_grams",
+    "geo",
+)
+
+# Internal keys never leave the API.
+SEARCH_KEY_PROJECTION = {field: 0 for field in SEARCH_FIELDS}
+
+SEARCH_INDEXES = [
+    ([("search_subject_grams", 1)], {"name": "search_subject_grams"}),
+    ([("search_subjects", 1)], {"name": "search_subjects"}),
+    ([("search_location_grams", 1)], {"name": "search_location_grams"}),
+    ([("search_location", 1)], {"name": "search_location"}),
+    ([("locality_id", 1)], {"name": "locality_id"}),
+    ([("fee_min", 1), ("fee_max", 1)], {"name": "fee_range"}),
+    ([("registered_at", -1), ("id", -1)], {"name": "registered_at_id"}),
+]
+
+_NON_WORD = re.compile(r"[^a-z0-9]+")
+
+
+def normalize_search_text(value: Optional[str]) -> str:
+    """Lower-case and collapse punctuation/whitespace into single spaces"""
+    if not value:
+        return ""
+    return _NON_WORD.sub(" ", value.lower()).strip()
+
+
+def trigrams(text: str) -> List[str]:
+    """Distinct character trigrams of already-normalized text, in order"""
+    if len(text) < GRAM_SIZE:
+        return []
+    seen = []
+    for i in range(len(text) - GRAM_SIZE + 1):
+        gram = text[i:i + GRAM_SIZE]
+        if gram not in seen:
+            seen.append(gram)
+    return seen
+
+
+def subject_search_keys(subjects: Iterable[Any]) -> Dict[str, List[str]]:
+    names = []
+    for entry in subjects or []:
+        subject = entry.get("subject") if isinstance(entry, dict) else getattr(entry, "subject", None)
+        normalized = normalize_search_text(subject)
+        if normalized and normalized not in names:
+            names.append(normalized)
+
+    grams = []
+    for name in names:
+        for gram in trigrams(name):
+            if gram not in grams:
+                grams.append(gram)
+
+    return {"search_subjects": names, "search_subject_grams": grams}
+
+
+def location_search_keys(location: Optional[str]) -> Dict[str, Any]:
+    normalized = normalize_search_text(location)
+    return {
+        "search_location": normalized,
+        "search_location_grams": trigrams(normalized),
+        **locality_fields(location),
+    }
+
+
+def build_search_keys(update_data: Dict[str, Any]) -> Dict[str, Any]:
+    """Search keys to `$set` alongside a tutor profile update.
+
+    Only the keys derived from fields present in `update_data` are returned,
+    so partial updates never need to re-read the rest of the profile.
+    """
+    keys = {}
+    if "subjects" in update_data:
+        keys.update(subject_search_keys(update_data["subjects"]))
+    if "location" in update_data:
+        keys.update(location_search_keys(update_data["location"]))
+    return keys
+
+
+def _text_predicate(key_field: str, gram_field: str, value: str) -> Dict[str, Any]:
+    normalized = normalize_search_text(value)
+    if not normalized:
+        return {}
+
+    grams = trigrams(normalized)
+    if not grams:
+        # Too short for trigrams: a prefix match on the normalized key still
+        # turns into tight index bounds.
+        return {key_field: {"$regex": "^" + re.escape(normalized)}}
+
+    return {
+        gram_field: {"$all": grams[:MAX_QUERY_GRAMS]},
+        key_field: {"$regex": re.escape(normalized)},
+    }
+
+
+def build_tutor_query(
+    subject: Optional[str] = None,
+    location: Optional[str] = None,
+    min_fee: Optional[int] = None,
+    max_fee: Optional[int] = None,
+) -> Dict[str, Any]:
+    """Turn browse filters into an index-backed `tutor_profiles` filter"""
+    query = {}
+    if subject:
+        query.update(_text_predicate("search_subjects", "search_subject_grams", subject))
+    if location:
+        # Known localities match however they were spelled; anything else
+        # falls back to the text search
+        locality = resolve(location)
+        if locality is not None:
+            query.update(locality_predicate(locality))
+        else:
+            query.update(_text_predicate("search_location", "search_location_grams", location))
+    if min_fee is not None:
+        query["fee_max"] = {"$gte": min_fee}
+    if max_fee is not None:
+        query["fee_min"] = {"$lte": max_fee}
+    return query
+
+
+async def backfill_search_keys(db, batch_size: int = 500) -> int:
+    """Populate search keys on profiles written before they existed"""
+    updated = 0
+    batch = []
+    cursor = db.tutor_profiles.find(
+        {"search_subjects": {"$exists": False}},
+        {"_id": 1, "subjects": 1, "location": 1},
+    ).batch_size(batch_size)
+
+    async for profile in cursor:
+        keys = build_search_keys({
+            "subjects": profile.get("subjects", []),
+            "location": profile.get("location", ""),
+        })
+        batch.append(UpdateOne({"_id": profile["_id"]}, {"$set": keys}))
+        if len(batch) >= batch_size:
+            await db.tutor_profiles.bulk_write(batch, ordered=False)
+            updated += len(batch)
+            batch = []
+
+    if batch:
+        await db.tutor_profiles.bulk_write(batch, ordered=False)
+        updated += len(batch)
+    return updated
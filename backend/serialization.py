@@ -0,0 +1,35 @@
+"""orjson-backed JSON responses.
+
+`FastJSONResponse` is the app's default response class. orjson serializes
+datetimes as RFC 3339 strings (the same text `isoformat()` produced) and
+enums such as `UserRole` by value, so responses are unchanged on the wire.
+
+FastAPI still runs `jsonable_encoder` over whatever a handler returns before
+rendering it. The large list endpoints return a `FastJSONResponse` directly
+instead, which skips that pass over every nested document.
+"""
+from decimal import Decimal
+from typing import Any
+
+import orjson
+from bson import ObjectId
+from fastapi.responses import ORJSONResponse
+
+
+def _default(value: Any) -> Any:
+    if isinstance(value, ObjectId):
+        return str(value)
+    if isinstance(value, Decimal):
+        return float(value)
+    if hasattr(value, "model_dump"):
+        return value.model_dump(mode="json")
+    raise TypeError(f"Type is not JSON serializable: {type(value).__name__}")
+
+
+def dumps(content: Any) -> bytes:
+    return orjson.dumps(content, default=_default, option=orjson.OPT_NON_STR_KEYS)
+
+
+class FastJSONResponse(ORJSONResponse):
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
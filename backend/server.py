@@ -1,8 +1,11 @@
-from fastapi import FastAPI, APIRouter, HTTPException, UploadFile, File, Form, Depends, status, Request
+from fastapi import FastAPI, APIRouter, HTTPException, UploadFile, File, Form, Depends, status, Request, Response, Query, Header, WebSocket
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
 import os
 import logging
 from pathlib import Path
@@ -10,36 +13,114 @@ from pydantic import BaseModel, Field, ConfigDict, EmailStr, validator
 from typing import List, Optional, Dict, Any
 import uuid
 from datetime import datetime, timezone, timedelta
-import bcrypt
 import jwt
 from enum import Enum
-import razorpay
 import hmac
 import hashlib
+import json
 import asyncio
 import random
+from contextlib import aclosing
 import resend
-from twilio.rest import Client as TwilioClient
+from integrations import (
+    RAZORPAY_API_BASE_URL,
+    TWILIO_VERIFY_BASE_URL,
+    CircuitBreaker,
+    Razorpay,
+    TwilioVerify,
+)
+from search import (
+    SEARCH_KEY_PROJECTION,
+    build_search_keys,
+    build_tutor_query,
+)
+from pagination import (
+    CREATED_ASC,
+    CREATED_DESC,
+    NEXT_CURSOR_HEADER,
+    REGISTERED_DESC,
+    decode_cursor,
+    encode_cursor,
+    fetch_nearest_page,
+    fetch_page,
+)
+from gazetteer import locality_fields, parse_near, within_radius
+from facets import FACET_FIELDS, FacetCache
+from indexes import ensure_indexes
+from photo_store import PhotoStore, photo_url, thumbnail_filename, PHOTO_CACHE_CONTROL
+from user_cache import UserCache
+from view_counter import ViewCounter
+from otp_store import create_otp_store, is_expired, otp_key
+from outbox import EmailOutbox, RESET_EMAIL, VERIFICATION_EMAIL, render_otp_email
+from ledger import InsufficientCoins, debit
+from serialization import FastJSONResponse, dumps
+from compression import CompressionMiddleware
+from metrics import CommandMetrics, Metrics, MetricsMiddleware
+from slow_queries import SlowCommandLog
+from entitlements import ENTITLEMENT_KINDS, Entitlements
+from matching import MATCH_TUTOR_PROJECTION, MatchingEngine
+from feed import FEED_ORDER, FEED_TOPIC, RequirementFeed, event_id, feed_event, tutor_subjects
+from broker import create_broker
+from realtime import MessagingHub, message_event, read_event, typing_event
+import passwords
+import ratings
+from conversations import (
+    CONVERSATION_PROJECTION,
+    CONVERSATIONS_DESC,
+    delete_user_conversations,
+    discard_unread_from,
+    mark_conversation_read,
+    message_read,
+    unread_count,
+    record_message,
+)
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
+metrics = Metrics()
+slow_log = SlowCommandLog(
+    lambda: client,
+    threshold_ms=float(os.environ.get('SLOW_QUERY_MS', '100')),
+    capacity=int(os.environ.get('SLOW_QUERY_LOG_SIZE', '500')),
+    explain_sample_rate=float(os.environ.get('SLOW_QUERY_EXPLAIN_RATE', '0.1'))
+)
+
 mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
+client = AsyncIOMotorClient(mongo_url, event_listeners=[CommandMetrics(metrics), slow_log])
 db = client[os.environ['DB_NAME']]
+photo_store = PhotoStore(db)
 
-app = FastAPI()
+app = FastAPI(default_response_class=FastJSONResponse)
 api_router = APIRouter(prefix="/api")
 security = HTTPBearer()
+# EventSource and WebSocket clients cannot set headers and pass ?token= instead
+optional_security = HTTPBearer(auto_error=False)
 
 JWT_SECRET = os.environ.get('JWT_SECRET')
 JWT_ALGORITHM = "HS256"
 
+def provider_options(prefix: str, default_timeout: str) -> dict:
+    return {
+        "timeout": float(os.environ.get(f'{prefix}_TIMEOUT_SECONDS', default_timeout)),
+        "max_concurrency": int(os.environ.get(f'{prefix}_MAX_CONCURRENCY', '20')),
+        "max_retries": int(os.environ.get(f'{prefix}_MAX_RETRIES', '2')),
+        "breaker": CircuitBreaker(
+            failure_threshold=int(os.environ.get(f'{prefix}_BREAKER_THRESHOLD', '5')),
+            reset_timeout=float(os.environ.get(f'{prefix}_BREAKER_RESET_SECONDS', '30'))
+        )
+    }
+
 RAZORPAY_KEY_ID = os.environ.get('RAZORPAY_KEY_ID', '')
 RAZORPAY_KEY_SECRET = os.environ.get('RAZORPAY_KEY_SECRET', '')
 
 if RAZORPAY_KEY_ID and RAZORPAY_KEY_SECRET:
-    razorpay_client = razorpay.Client(auth=(RAZORPAY_KEY_ID, RAZORPAY_KEY_SECRET))
+    razorpay_client = Razorpay(
+        RAZORPAY_KEY_ID,
+        RAZORPAY_KEY_SECRET,
+        base_url=os.environ.get('RAZORPAY_API_BASE_URL', RAZORPAY_API_BASE_URL),
+        **provider_options('RAZORPAY', '10')
+    )
 else:
     razorpay_client = None
 
@@ -48,7 +129,13 @@ TWILIO_AUTH_TOKEN = os.environ.get('TWILIO_AUTH_TOKEN', '')
 TWILIO_VERIFY_SERVICE_SID = os.environ.get('TWILIO_VERIFY_SERVICE_SID', '')
 
 if TWILIO_ACCOUNT_SID and TWILIO_AUTH_TOKEN and not TWILIO_ACCOUNT_SID.startswith('PLACEHOLDER'):
-    twilio_client = TwilioClient(TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN)
+    twilio_client = TwilioVerify(
+        TWILIO_ACCOUNT_SID,
+        TWILIO_AUTH_TOKEN,
+        TWILIO_VERIFY_SERVICE_SID,
+        base_url=os.environ.get('TWILIO_VERIFY_BASE_URL', TWILIO_VERIFY_BASE_URL),
+        **provider_options('TWILIO', '5')
+    )
 else:
     twilio_client = None
 
@@ -61,7 +148,119 @@ if RESEND_API_KEY and not RESEND_API_KEY.startswith('re_PLACEHOLDER'):
 else:
     resend_enabled = False
 
-otp_storage = {}
+async def send_email_via_resend(params: dict):
+    return await asyncio.to_thread(resend.Emails.send, params)
+
+email_outbox = EmailOutbox(
+    db,
+    SENDER_EMAIL,
+    send_email_via_resend,
+    batch_size=int(os.environ.get('EMAIL_OUTBOX_BATCH_SIZE', '20')),
+    poll_interval=float(os.environ.get('EMAIL_OUTBOX_POLL_SECONDS', '2')),
+    max_attempts=int(os.environ.get('EMAIL_OUTBOX_MAX_ATTEMPTS', '5'))
+)
+
+# "mongo" shares codes between uvicorn workers; "memory" is single-process only
+otp_store = create_otp_store(
+    os.environ.get('OTP_STORE', 'mongo'),
+    db,
+    max_entries=int(os.environ.get('OTP_MEMORY_MAX_ENTRIES', '10000'))
+)
+
+user_cache = UserCache(
+    max_entries=int(os.environ.get('USER_CACHE_MAX_ENTRIES', '10000')),
+    ttl_seconds=float(os.environ.get('USER_CACHE_TTL_SECONDS', '30'))
+)
+
+view_counter = ViewCounter(
+    db,
+    flush_interval=float(os.environ.get('PROFILE_VIEW_FLUSH_SECONDS', '5')),
+    max_pending_tutors=int(os.environ.get('PROFILE_VIEW_MAX_PENDING', '10000')),
+    max_tracked_tutors=int(os.environ.get('PROFILE_VIEW_MAX_TRACKED', '50000'))
+)
+
+entitlements = Entitlements(
+    db,
+    max_entries=int(os.environ.get('ENTITLEMENT_CACHE_MAX_ENTRIES', '50000'))
+)
+
+facet_cache = FacetCache(
+    db,
+    max_entries=int(os.environ.get('FACET_CACHE_MAX_ENTRIES', '1000')),
+    ttl_seconds=float(os.environ.get('FACET_CACHE_TTL_SECONDS', '60'))
+)
+
+matching = MatchingEngine(
+    db,
+    poll_interval=float(os.environ.get('MATCHING_POLL_SECONDS', '15')),
+    rebuild_interval=float(os.environ.get('MATCHING_REBUILD_SECONDS', '900'))
+)
+
+# "memory" is single-process only; "changestream" (replica sets) and
+# "polling" fan live events out to every uvicorn worker
+realtime_broker = create_broker(
+    os.environ.get('REALTIME_BROKER', 'memory'),
+    db,
+    poll_interval=float(os.environ.get('REALTIME_POLL_SECONDS', '0.5'))
+)
+
+messaging_hub = MessagingHub(
+    realtime_broker,
+    max_queue=int(os.environ.get('MESSAGING_MAX_QUEUE', '100')),
+    heartbeat_seconds=float(os.environ.get('MESSAGING_HEARTBEAT_SECONDS', '25'))
+)
+
+requirement_feed = RequirementFeed(
+    db,
+    max_queue=int(os.environ.get('REQUIREMENT_FEED_MAX_QUEUE', '100')),
+    replay_limit=int(os.environ.get('REQUIREMENT_FEED_REPLAY_LIMIT', '500')),
+    heartbeat_seconds=float(os.environ.get('REQUIREMENT_FEED_HEARTBEAT_SECONDS', '15'))
+)
+
+realtime_broker.subscribe(FEED_TOPIC, requirement_feed.publish)
+
+metrics.gauge("bcrypt_queue_depth", "Password hash/verify jobs queued or running", passwords.queue_depth)
+metrics.gauge("profile_view_pending_increments", "Profile views buffered but not yet flushed", view_counter.pending_increments)
+metrics.gauge("profile_view_flushed_total", "Profile views flushed to MongoDB", lambda: view_counter.flushed_total, kind="counter")
+metrics.gauge("profile_view_dropped_total", "Profile views dropped because the buffer was full", lambda: view_counter.dropped_total, kind="counter")
+metrics.gauge("user_cache_entries", "Users held in the auth cache", lambda: len(user_cache))
+metrics.gauge("user_cache_hits_total", "Auth cache hits", lambda: user_cache.hits, kind="counter")
+metrics.gauge("user_cache_misses_total", "Auth cache misses", lambda: user_cache.misses, kind="counter")
+metrics.gauge("entitlement_cache_hits_total", "Access checks answered from memory", lambda: entitlements.hits, kind="counter")
+metrics.gauge("entitlement_cache_misses_total", "Access checks that queried MongoDB", lambda: entitlements.misses, kind="counter")
+metrics.gauge("email_sent_total", "Emails delivered by the outbox worker", lambda: email_outbox.sent_total, kind="counter")
+metrics.gauge("email_failed_total", "Email delivery attempts that failed", lambda: email_outbox.failed_total, kind="counter")
+metrics.gauge("email_dead_lettered_total", "Emails given up on after max attempts", lambda: email_outbox.dead_total, kind="counter")
+metrics.gauge("facet_cache_hits_total", "Tutor facet requests answered from memory", lambda: facet_cache.hits, kind="counter")
+metrics.gauge("facet_cache_misses_total", "Tutor facet requests that ran the aggregation", lambda: facet_cache.misses, kind="counter")
+metrics.gauge("matching_tutors_indexed", "Tutor profiles held by the matching engine", lambda: matching.tutor_count)
+metrics.gauge("matching_requirements_indexed", "Active requirements held by the matching engine", lambda: matching.requirement_count)
+metrics.gauge("matching_ready", "1 once the matching engine's first build has finished", lambda: int(matching.ready))
+metrics.gauge("requirement_feed_connections", "Open live requirement feed connections", lambda: requirement_feed.connections)
+metrics.gauge("requirement_feed_published_total", "Requirements published to the live feed", lambda: requirement_feed.published_total, kind="counter")
+metrics.gauge("requirement_feed_overflows_total", "Feed connections dropped for falling behind", lambda: requirement_feed.overflow_total, kind="counter")
+metrics.gauge("messaging_connections", "Open messaging sockets", lambda: messaging_hub.connections)
+metrics.gauge("messaging_events_delivered_total", "Live messaging events handed to sockets", lambda: messaging_hub.delivered_total, kind="counter")
+metrics.gauge("messaging_overflows_total", "Messaging sockets dropped for falling behind", lambda: messaging_hub.overflow_total, kind="counter")
+metrics.gauge("realtime_events_published_total", "Events published on the realtime broker", lambda: realtime_broker.published_total, kind="counter")
+
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+ADMIN_EMAILS = {email.strip().lower() for email in os.environ.get('ADMIN_EMAILS', '').split(',') if email.strip()}
+
+# Password hashes and ledger bookkeeping never leave the users collection
+# through get_current_user
+USER_PROJECTION = {"_id": 0, "password": 0, "ledger_keys": 0}
+# The GeoJSON point only backs the 2dsphere index
+REQUIREMENT_PROJECTION = {"_id": 0, "geo": 0}
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 100
+DEFAULT_RADIUS_KM = 5.0
+MAX_RADIUS_KM = 50.0
+DEFAULT_MATCHES = 10
+# How long an EventSource waits before reconnecting with Last-Event-ID
+FEED_RETRY_MS = 3000
+MAX_MATCHES = 50
 
 class UserRole(str, Enum):
     TUTOR = "tutor"
@@ -176,6 +375,7 @@ class StudentRequirement(BaseModel):
     location: str
     phone: str
     description: Optional[str] = None
+    max_fee: Optional[int] = None
     
     @validator('phone')
     def validate_phone(cls, v):
@@ -199,6 +399,12 @@ class ReviewCreate(BaseModel):
     tutor_id: str
     rating: int
     comment: Optional[str] = None
+    
+    @validator('rating')
+    def validate_rating(cls, v):
+        if v not in ratings.STARS:
+            raise ValueError('Rating must be between 1 and 5')
+        return v
 
 class MessageCreate(BaseModel):
     recipient_id: str
@@ -228,12 +434,6 @@ class User(BaseModel):
     created_at: datetime
     last_login: Optional[datetime] = None
 
-def hash_password(password: str) -> str:
-    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
-
-def verify_password(password: str, hashed: str) -> bool:
-    return bcrypt.checkpw(password.encode('utf-8'), hashed.encode('utf-8'))
-
 def create_token(user_id: str, email: str, role: str) -> str:
     payload = {
         "user_id": user_id,
@@ -243,19 +443,46 @@ def create_token(user_id: str, email: str, role: str) -> str:
     }
     return jwt.encode(payload, JWT_SECRET, algorithm=JWT_ALGORITHM)
 
-async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
+async def get_current_user(request: Request, credentials: HTTPAuthorizationCredentials = Depends(security)):
+    # Request-scoped memo: a handler never loads the same user twice
+    memo = getattr(request.state, "current_user", None)
+    if memo is not None:
+        return memo
+    
+    user = await user_from_token(credentials.credentials)
+    request.state.current_user = user
+    return user
+
+async def user_from_token(token: str) -> dict:
     try:
-        token = credentials.credentials
         payload = jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGORITHM])
-        user = await db.users.find_one({"id": payload["user_id"]}, {"_id": 0})
-        if not user:
-            raise HTTPException(status_code=401, detail="User not found")
+        user_id = payload["user_id"]
+        user = user_cache.get(user_id)
+        if user is None:
+            user = await db.users.find_one({"id": user_id}, USER_PROJECTION)
+            if not user:
+                raise HTTPException(status_code=401, detail="User not found")
+            user_cache.set(user_id, user)
         return user
     except jwt.ExpiredSignatureError:
         raise HTTPException(status_code=401, detail="Token expired")
     except jwt.InvalidTokenError:
         raise HTTPException(status_code=401, detail="Invalid token")
 
+async def get_admin_user(current_user: dict = Depends(get_current_user)):
+    if current_user.get("email", "").lower() not in ADMIN_EMAILS:
+        raise HTTPException(status_code=403, detail="Admin access required")
+    return current_user
+
+async def mark_verified(email: str, field: str):
+    user = await db.users.find_one_and_update(
+        {"email": email},
+        {"$set": {field: True}},
+        projection={"_id": 0, "id": 1}
+    )
+    if user:
+        user_cache.invalidate(user["id"])
+
 @api_router.post("/auth/signup")
 async def signup(data: SignupRequest):
     existing = await db.users.find_one({"email": data.email}, {"_id": 0})
@@ -266,7 +493,7 @@ async def signup(data: SignupRequest):
     user_doc = {
         "id": user_id,
         "email": data.email,
-        "password": hash_password(data.password),
+        "password": await passwords.hash_password(data.password),
         "role": data.role,
         "name": data.name,
         "mobile": data.mobile,
@@ -279,7 +506,11 @@ async def signup(data: SignupRequest):
         "last_login": None
     }
     
-    await db.users.insert_one(user_doc)
+    try:
+        await db.users.insert_one(user_doc)
+    except DuplicateKeyError:
+        # Lost a race with a concurrent signup for the same email
+        raise HTTPException(status_code=400, detail="Email already registered")
     
     if data.role == UserRole.TUTOR:
         await db.tutor_profiles.insert_one({
@@ -307,7 +538,8 @@ async def signup(data: SignupRequest):
             "registered_at": datetime.now(timezone.utc).isoformat(),
             "last_login": None,
             "reviews": [],
-            "average_rating": 0
+            **ratings.empty_aggregates(),
+            **build_search_keys({"subjects": [], "location": ""})
         })
     
     token = create_token(user_id, data.email, data.role)
@@ -327,13 +559,19 @@ async def signup(data: SignupRequest):
 @api_router.post("/auth/login")
 async def login(data: LoginRequest):
     user = await db.users.find_one({"email": data.email}, {"_id": 0})
-    if not user or not verify_password(data.password, user["password"]):
+    if not user or not await passwords.verify_password(data.password, user["password"]):
         raise HTTPException(status_code=401, detail="Invalid credentials")
     
+    login_update = {"last_login": datetime.now(timezone.utc).isoformat()}
+    # Upgrade hashes made with a different cost factor while we have the plaintext
+    if passwords.needs_rehash(user["password"]):
+        login_update["password"] = await passwords.hash_password(data.password)
+    
     await db.users.update_one(
         {"email": data.email},
-        {"$set": {"last_login": datetime.now(timezone.utc).isoformat()}}
+        {"$set": login_update}
     )
+    user_cache.invalidate(user["id"])
     
     token = create_token(user["id"], user["email"], user["role"])
     
@@ -359,41 +597,18 @@ async def forgot_password(data: ForgotPasswordRequest):
     
     otp_code = str(random.randint(100000, 999999))
     
-    otp_storage[f"{data.email}_reset"] = {
-        "code": otp_code,
-        "expires_at": (datetime.now(timezone.utc) + timedelta(minutes=10)).isoformat()
-    }
+    await otp_store.put(otp_key(data.email, "reset"), otp_code)
     
     if resend_enabled:
         try:
-            html_content = f"""
-            <html>
-                <body style="font-family: Arial, sans-serif; padding: 20px; background-color: #f5f5f5;">
-                    <div style="max-width: 600px; margin: 0 auto; background-color: white; padding: 30px; border-radius: 10px; box-shadow: 0 2px 10px rgba(0,0,0,0.1);">
-                        <h2 style="color: #4F46E5; text-align: center;">Password Reset - Tricity Tutors</h2>
-                        <p style="font-size: 16px; color: #333;">Hello {user.get('name', 'User')},</p>
-                        <p style="font-size: 16px; color: #333;">You requested to reset your password. Use this OTP:</p>
-                        <div style="background-color: #4F46E5; color: white; font-size: 32px; font-weight: bold; text-align: center; padding: 20px; border-radius: 5px; margin: 20px 0; letter-spacing: 5px;">
-                            {otp_code}
-                        </div>
-                        <p style="font-size: 14px; color: #666;">This OTP will expire in 10 minutes.</p>
-                        <p style="font-size: 14px; color: #666;">If you didn't request this, please ignore this email.</p>
-                        <hr style="border: none; border-top: 1px solid #eee; margin: 30px 0;">
-                        <p style="font-size: 12px; color: #999; text-align: center;">Tricity Tutors - Chandigarh Region</p>
-                    </div>
-                </body>
-            </html>
-            """
-            params = {
-                "from": SENDER_EMAIL,
-                "to": [data.email],
-                "subject": f"Password Reset OTP - Tricity Tutors",
-                "html": html_content
-            }
-            await asyncio.to_thread(resend.Emails.send, params)
+            await email_outbox.enqueue(
+                data.email,
+                "Password Reset OTP - Tricity Tutors",
+                render_otp_email(RESET_EMAIL, user.get('name'), otp_code)
+            )
             return {"message": "Password reset OTP sent to your email", "mode": "real"}
         except Exception as e:
-            logger.error(f"Resend email failed: {str(e)}")
+            logger.error(f"Queueing reset email failed: {str(e)}")
             raise HTTPException(status_code=500, detail="Failed to send OTP email. Please try again later.")
     else:
         raise HTTPException(status_code=500, detail="Email service not configured. Please contact support.")
@@ -401,38 +616,40 @@ async def forgot_password(data: ForgotPasswordRequest):
 @api_router.post("/auth/reset-password")
 async def reset_password(data: ResetPasswordRequest):
     """Reset password using OTP"""
-    stored_otp = otp_storage.get(f"{data.email}_reset")
+    key = otp_key(data.email, "reset")
+    stored_otp = await otp_store.get(key)
     
     if not stored_otp:
         raise HTTPException(status_code=400, detail="No reset request found. Please request a new OTP.")
     
-    if datetime.now(timezone.utc).isoformat() > stored_otp["expires_at"]:
-        del otp_storage[f"{data.email}_reset"]
+    if is_expired(stored_otp):
+        await otp_store.delete(key)
         raise HTTPException(status_code=400, detail="OTP expired. Please request a new one.")
     
     if data.otp != stored_otp["code"]:
         raise HTTPException(status_code=400, detail="Invalid OTP")
     
     # Update password
-    hashed_password = hash_password(data.new_password)
+    hashed_password = await passwords.hash_password(data.new_password)
     await db.users.update_one(
         {"email": data.email},
         {"$set": {"password": hashed_password}}
     )
     
-    del otp_storage[f"{data.email}_reset"]
+    await otp_store.delete(key)
     
     return {"message": "Password reset successfully"}
 
 @api_router.post("/auth/verify-otp")
 async def verify_otp(data: VerifyOTPRequest):
-    stored_otp = otp_storage.get(f"{data.email}_{data.otp_type}")
+    key = otp_key(data.email, data.otp_type)
+    stored_otp = await otp_store.get(key)
     
     if not stored_otp:
         raise HTTPException(status_code=400, detail="No OTP found. Please request a new one.")
     
-    if datetime.now(timezone.utc).isoformat() > stored_otp["expires_at"]:
-        del otp_storage[f"{data.email}_{data.otp_type}"]
+    if is_expired(stored_otp):
+        await otp_store.delete(key)
         raise HTTPException(status_code=400, detail="OTP expired. Please request a new one.")
     
     if data.otp_type == "mobile":
@@ -442,17 +659,11 @@ async def verify_otp(data: VerifyOTPRequest):
         if twilio_client and TWILIO_VERIFY_SERVICE_SID:
             try:
                 phone_number = f"+91{mobile}" if not mobile.startswith('+') else mobile
-                verification_check = twilio_client.verify.v2.services(TWILIO_VERIFY_SERVICE_SID).verification_checks.create(
-                    to=phone_number,
-                    code=data.otp
-                )
-                if verification_check.status == "approved":
+                verification_status = await twilio_client.check_verification(phone_number, data.otp)
+                if verification_status == "approved":
                     field = "email_verified" if data.otp_type == "email" else "mobile_verified"
-                    await db.users.update_one(
-                        {"email": data.email},
-                        {"$set": {field: True}}
-                    )
-                    del otp_storage[f"{data.email}_{data.otp_type}"]
+                    await mark_verified(data.email, field)
+                    await otp_store.delete(key)
                     return {"message": f"{data.otp_type.capitalize()} verified successfully"}
                 else:
                     raise HTTPException(status_code=400, detail="Invalid OTP")
@@ -461,13 +672,8 @@ async def verify_otp(data: VerifyOTPRequest):
     
     if data.otp == stored_otp["code"]:
         field = "email_verified" if data.otp_type == "email" else "mobile_verified"
-        await db.users.update_one(
-            {"email": data.email},
-            {"$set": {field: True}}
-        )
-        
-        if f"{data.email}_{data.otp_type}" in otp_storage:
-            del otp_storage[f"{data.email}_{data.otp_type}"]
+        await mark_verified(data.email, field)
+        await otp_store.delete(key)
         
         return {"message": f"{data.otp_type.capitalize()} verified successfully"}
     
@@ -481,42 +687,19 @@ async def send_otp(email: EmailStr, otp_type: str):
     
     otp_code = str(random.randint(100000, 999999))
     
-    otp_storage[f"{email}_{otp_type}"] = {
-        "code": otp_code,
-        "expires_at": (datetime.now(timezone.utc) + timedelta(minutes=10)).isoformat()
-    }
+    await otp_store.put(otp_key(email, otp_type), otp_code)
     
     if otp_type == "email":
         if resend_enabled:
             try:
-                html_content = f"""
-                <html>
-                    <body style="font-family: Arial, sans-serif; padding: 20px; background-color: #f5f5f5;">
-                        <div style="max-width: 600px; margin: 0 auto; background-color: white; padding: 30px; border-radius: 10px; box-shadow: 0 2px 10px rgba(0,0,0,0.1);">
-                            <h2 style="color: #4F46E5; text-align: center;">Tricity Tutors - Email Verification</h2>
-                            <p style="font-size: 16px; color: #333;">Hello {user.get('name', 'User')},</p>
-                            <p style="font-size: 16px; color: #333;">Your OTP for email verification is:</p>
-                            <div style="background-color: #4F46E5; color: white; font-size: 32px; font-weight: bold; text-align: center; padding: 20px; border-radius: 5px; margin: 20px 0; letter-spacing: 5px;">
-                                {otp_code}
-                            </div>
-                            <p style="font-size: 14px; color: #666;">This OTP will expire in 10 minutes.</p>
-                            <p style="font-size: 14px; color: #666;">If you didn't request this verification, please ignore this email.</p>
-                            <hr style="border: none; border-top: 1px solid #eee; margin: 30px 0;">
-                            <p style="font-size: 12px; color: #999; text-align: center;">Tricity Tutors - Chandigarh Region</p>
-                        </div>
-                    </body>
-                </html>
-                """
-                params = {
-                    "from": SENDER_EMAIL,
-                    "to": [email],
-                    "subject": f"Your Tricity Tutors Verification OTP",
-                    "html": html_content
-                }
-                await asyncio.to_thread(resend.Emails.send, params)
+                await email_outbox.enqueue(
+                    email,
+                    "Your Tricity Tutors Verification OTP",
+                    render_otp_email(VERIFICATION_EMAIL, user.get('name'), otp_code)
+                )
                 return {"message": "OTP sent to your email! Please check your inbox.", "mode": "real"}
             except Exception as e:
-                logger.error(f"Resend email failed: {str(e)}")
+                logger.error(f"Queueing verification email failed: {str(e)}")
                 raise HTTPException(status_code=500, detail="Failed to send OTP email. Please try again later.")
         else:
             raise HTTPException(status_code=500, detail="Email service not configured. Please contact support.")
@@ -526,10 +709,7 @@ async def send_otp(email: EmailStr, otp_type: str):
         if twilio_client and TWILIO_VERIFY_SERVICE_SID:
             try:
                 phone_number = f"+91{mobile}" if not mobile.startswith('+') else mobile
-                verification = twilio_client.verify.v2.services(TWILIO_VERIFY_SERVICE_SID).verifications.create(
-                    to=phone_number,
-                    channel='sms'
-                )
+                await twilio_client.send_verification(phone_number, channel='sms')
                 return {"message": "OTP sent to your mobile! Please check your phone.", "mode": "real"}
             except Exception as e:
                 logger.error(f"Twilio SMS failed: {str(e)}")
@@ -544,7 +724,10 @@ async def get_tutor_profile(current_user: dict = Depends(get_current_user)):
     if current_user["role"] != UserRole.TUTOR:
         raise HTTPException(status_code=403, detail="Access denied")
     
-    profile = await db.tutor_profiles.find_one({"user_id": current_user["id"]}, {"_id": 0, "reviews._id": 0})
+    profile = await db.tutor_profiles.find_one(
+        {"user_id": current_user["id"]},
+        {"_id": 0, "reviews._id": 0, **SEARCH_KEY_PROJECTION}
+    )
     if not profile:
         raise HTTPException(status_code=404, detail="Profile not found")
     
@@ -589,52 +772,89 @@ async def update_tutor_profile(data: TutorProfileUpdate, current_user: dict = De
             if errors:
                 raise HTTPException(status_code=400, detail="; ".join(errors))
         
-        await db.tutor_profiles.update_one(
+        profile = await db.tutor_profiles.find_one_and_update(
             {"user_id": current_user["id"]},
-            {"$set": update_data}
+            {"$set": {
+                **update_data,
+                **build_search_keys(update_data),
+                "updated_at": datetime.now(timezone.utc).isoformat()
+            }},
+            projection=MATCH_TUTOR_PROJECTION,
+            return_document=ReturnDocument.AFTER
         )
+        if profile:
+            matching.index_tutor(profile)
+            if 'subjects' in update_data:
+                requirement_feed.retarget(current_user["id"], profile.get("subjects"))
+        if FACET_FIELDS.intersection(update_data):
+            facet_cache.invalidate()
     
     return {"message": "Profile updated successfully"}
 
+def near_point(near: str) -> dict:
+    point = parse_near(near)
+    if point is None:
+        raise HTTPException(status_code=400, detail="Unknown locality; use a Tricity locality name or 'lat,lng'")
+    return point
+
 @api_router.get("/tutors")
 async def get_all_tutors(
     subject: Optional[str] = None,
     location: Optional[str] = None,
     min_fee: Optional[int] = None,
-    max_fee: Optional[int] = None
+    max_fee: Optional[int] = None,
+    near: Optional[str] = None,
+    radius_km: float = Query(DEFAULT_RADIUS_KM, gt=0, le=MAX_RADIUS_KM),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None
 ):
-    query = {}
-    if subject:
-        query["subjects.subject"] = {"$regex": subject, "$options": "i"}
-    if location:
-        query["location"] = {"$regex": location, "$options": "i"}
-    if min_fee is not None or max_fee is not None:
-        query["$and"] = []
-        if min_fee is not None:
-            query["$and"].append({"fee_max": {"$gte": min_fee}})
-        if max_fee is not None:
-            query["$and"].append({"fee_min": {"$lte": max_fee}})
-    
-    tutors = await db.tutor_profiles.find(query, {"_id": 0, "reviews._id": 0}).to_list(100)
+    query = build_tutor_query(subject, location, min_fee, max_fee)
+    projection = {"_id": 0, "reviews._id": 0, **SEARCH_KEY_PROJECTION}
+    
+    if near:
+        # Nearest first, each with distance_km
+        tutors, next_cursor = await fetch_nearest_page(
+            db.tutor_profiles, query, projection, near_point(near), radius_km * 1000, REGISTERED_DESC, limit, cursor
+        )
+    else:
+        tutors, next_cursor = await fetch_page(
+            db.tutor_profiles, query, projection, REGISTERED_DESC, limit, cursor
+        )
     
     for tutor in tutors:
         if 'reviews' in tutor and tutor['reviews']:
             for review in tutor['reviews']:
                 review.pop('_id', None)
     
-    return tutors
+    # Returned directly so FastAPI skips jsonable_encoder on every nested review
+    return FastJSONResponse(tutors, headers={NEXT_CURSOR_HEADER: next_cursor} if next_cursor else None)
+
+@api_router.get("/tutors/facets")
+async def get_tutor_facets(
+    subject: Optional[str] = None,
+    location: Optional[str] = None,
+    min_fee: Optional[int] = None,
+    max_fee: Optional[int] = None,
+    near: Optional[str] = None,
+    radius_km: float = Query(DEFAULT_RADIUS_KM, gt=0, le=MAX_RADIUS_KM)
+):
+    """Tutor counts per subject, class, locality, language, mode and fee band for the current filters"""
+    query = build_tutor_query(subject, location, min_fee, max_fee)
+    if near:
+        query.update(within_radius(near_point(near), radius_km))
+    return await facet_cache.get(query)
 
 @api_router.get("/tutors/{tutor_id}")
 async def get_tutor_by_id(tutor_id: str, current_user: dict = None):
-    profile = await db.tutor_profiles.find_one({"user_id": tutor_id}, {"_id": 0, "reviews._id": 0})
+    profile = await db.tutor_profiles.find_one(
+        {"user_id": tutor_id},
+        {"_id": 0, "reviews._id": 0, **SEARCH_KEY_PROJECTION}
+    )
     if not profile:
         raise HTTPException(status_code=404, detail="Tutor not found")
     
-    # Increment profile views (don't count self-views)
-    await db.tutor_profiles.update_one(
-        {"user_id": tutor_id},
-        {"$inc": {"profile_views": 1}}
-    )
+    # Increment profile views (buffered, flushed in bulk by view_counter)
+    view_counter.record(tutor_id)
     
     if 'reviews' in profile and profile['reviews']:
         for review in profile['reviews']:
@@ -660,7 +880,7 @@ async def upload_profile_photo_file(
     file: UploadFile = File(...),
     current_user: dict = Depends(get_current_user)
 ):
-    """Upload profile photo file directly - stores as base64 in MongoDB"""
+    """Upload profile photo file directly - stored once per content hash in GridFS"""
     if current_user["role"] != UserRole.TUTOR:
         raise HTTPException(status_code=403, detail="Access denied")
     
@@ -675,7 +895,7 @@ async def upload_profile_photo_file(
     # Read file content
     content = await file.read()
     
-    # Validate file size (max 100KB for base64 storage)
+    # Validate file size (max 100KB)
     max_size = 100 * 1024  # 100KB in bytes
     if len(content) > max_size:
         raise HTTPException(
@@ -683,28 +903,59 @@ async def upload_profile_photo_file(
             detail="File too large. Maximum size is 100KB. Please compress your image."
         )
     
-    # Convert to base64 data URL
-    import base64
-    base64_data = base64.b64encode(content).decode('utf-8')
-    photo_url = f"data:{file.content_type};base64,{base64_data}"
+    filename = await photo_store.put(content, file.content_type)
+    url = photo_url(filename)
     
-    # Update profile with base64 photo URL
+    # The profile only keeps the short URL, never the image bytes
     await db.tutor_profiles.update_one(
         {"user_id": current_user["id"]},
-        {"$set": {"profile_photo": photo_url}}
+        {"$set": {"profile_photo": url}}
     )
     
     return {
         "message": "Profile photo uploaded successfully",
-        "photo_url": photo_url
+        "photo_url": url
     }
 
 @api_router.get("/uploads/profile_photos/{filename}")
-async def get_profile_photo(filename: str):
-    """Serve uploaded profile photos - legacy endpoint"""
-    # This endpoint is kept for backward compatibility
-    # New uploads use base64 stored in MongoDB
-    raise HTTPException(status_code=404, detail="File not found. Please re-upload your photo.")
+async def get_profile_photo(filename: str, request: Request, size: Optional[str] = None):
+    """Serve uploaded profile photos; size=thumb returns the server-generated thumbnail"""
+    photo = None
+    if size == "thumb":
+        photo = await photo_store.get(thumbnail_filename(filename))
+    if not photo:
+        photo = await photo_store.get(filename)
+    if not photo:
+        raise HTTPException(status_code=404, detail="File not found. Please re-upload your photo.")
+    
+    # Filenames are content hashes, so a cached copy never goes stale
+    headers = {"ETag": photo["etag"], "Cache-Control": PHOTO_CACHE_CONTROL}
+    if request.headers.get("if-none-match") == photo["etag"]:
+        return Response(status_code=304, headers=headers)
+    
+    return Response(content=photo["content"], media_type=photo["content_type"], headers=headers)
+
+@api_router.get("/tutor/matching-requirements")
+async def get_matching_requirements(
+    limit: int = Query(DEFAULT_MATCHES, ge=1, le=MAX_MATCHES),
+    current_user: dict = Depends(get_current_user)
+):
+    """Active requirements that best fit the tutor's profile, best first"""
+    if current_user["role"] != UserRole.TUTOR:
+        raise HTTPException(status_code=403, detail="Access denied")
+    
+    profile = await db.tutor_profiles.find_one({"user_id": current_user["id"]}, MATCH_TUTOR_PROJECTION)
+    if not profile:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    
+    ranked = await matching.requirements_for(profile, limit)
+    requirements = await db.requirements.find(
+        {"id": {"$in": [requirement_id for requirement_id, _ in ranked]}, "status": "active"},
+        REQUIREMENT_PROJECTION
+    ).to_list(None)
+    by_id = {requirement["id"]: requirement for requirement in requirements}
+    
+    return [{**by_id[requirement_id], "match_score": points} for requirement_id, points in ranked if requirement_id in by_id]
 
 @api_router.get("/tutor/stats")
 async def get_tutor_stats(current_user: dict = Depends(get_current_user)):
@@ -721,14 +972,12 @@ async def get_tutor_stats(current_user: dict = Depends(get_current_user)):
         "recipient_id": current_user["id"]
     })
     
-    user = await db.users.find_one({"id": current_user["id"]}, {"_id": 0})
-    
     return {
-        "profile_views": profile.get("profile_views", 0),
+        "profile_views": profile.get("profile_views", 0) + view_counter.pending_for(current_user["id"]),
         "applications": applications_count,
         "rating": profile.get("average_rating", 0),
-        "reviews_count": len(profile.get("reviews", [])),
-        "coins": user.get("coins", 0)
+        "reviews_count": profile.get("rating_count", len(profile.get("reviews", []))),
+        "coins": current_user.get("coins", 0)
     }
 
 @api_router.post("/requirements")
@@ -741,24 +990,34 @@ async def create_requirement(data: StudentRequirement, current_user: dict = Depe
         )
     
     requirement_id = str(uuid.uuid4())
+    now = datetime.now(timezone.utc).isoformat()
     requirement_doc = {
         "id": requirement_id,
         "student_id": current_user["id"],
         "student_name": current_user["name"],
         **data.model_dump(),
+        **locality_fields(data.location),
         "status": "active",
-        "created_at": datetime.now(timezone.utc).isoformat(),
+        "created_at": now,
+        "updated_at": now,
         "phone_verified": True
     }
     
     await db.requirements.insert_one(requirement_doc)
+    matching.add_requirement(requirement_doc)
+    await realtime_broker.publish(FEED_TOPIC, feed_event(requirement_doc))
     return {"message": "Requirement posted successfully", "id": requirement_id}
 
 @api_router.get("/requirements")
 async def get_requirements(
+    response: Response,
     subject: Optional[str] = None,
     mode: Optional[str] = None,
-    status: str = "active"
+    status: str = "active",
+    near: Optional[str] = None,
+    radius_km: float = Query(DEFAULT_RADIUS_KM, gt=0, le=MAX_RADIUS_KM),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None
 ):
     query = {"status": status}
     if subject:
@@ -766,17 +1025,116 @@ async def get_requirements(
     if mode:
         query["mode"] = mode
     
-    requirements = await db.requirements.find(query, {"_id": 0}).sort("created_at", -1).to_list(100)
+    if near:
+        requirements, next_cursor = await fetch_nearest_page(
+            db.requirements, query, REQUIREMENT_PROJECTION, near_point(near), radius_km * 1000, CREATED_DESC, limit, cursor
+        )
+    else:
+        requirements, next_cursor = await fetch_page(
+            db.requirements, query, REQUIREMENT_PROJECTION, CREATED_DESC, limit, cursor
+        )
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
     return requirements
 
 @api_router.get("/requirements/my")
-async def get_my_requirements(current_user: dict = Depends(get_current_user)):
-    requirements = await db.requirements.find(
+async def get_my_requirements(
+    response: Response,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    current_user: dict = Depends(get_current_user)
+):
+    requirements, next_cursor = await fetch_page(
+        db.requirements,
         {"student_id": current_user["id"]},
-        {"_id": 0}
-    ).sort("created_at", -1).to_list(100)
+        REQUIREMENT_PROJECTION,
+        CREATED_DESC,
+        limit,
+        cursor
+    )
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
     return requirements
 
+async def feed_subjects(user: dict) -> frozenset:
+    if user["role"] != UserRole.TUTOR:
+        raise HTTPException(status_code=403, detail="Access denied")
+    
+    profile = await db.tutor_profiles.find_one({"user_id": user["id"]}, {"_id": 0, "subjects": 1})
+    if not profile:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return tutor_subjects(profile.get("subjects"))
+
+@api_router.get("/requirements/feed")
+async def stream_requirements(
+    token: Optional[str] = None,
+    last_event_id: Optional[str] = None,
+    last_event_id_header: Optional[str] = Header(None, alias="Last-Event-ID"),
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(optional_security)
+):
+    """Server-sent events: one `requirement` event per new post in the tutor's subjects.
+
+    EventSource resends the last event id on reconnect; `last_event_id`
+    resumes the same way after a page reload.
+    """
+    if credentials is None and not token:
+        raise HTTPException(status_code=401, detail="Not authenticated")
+    user = await user_from_token(credentials.credentials if credentials else token)
+    subjects = await feed_subjects(user)
+    resume = last_event_id_header or last_event_id
+    if resume:
+        decode_cursor(resume, FEED_ORDER)
+    
+    async def stream():
+        yield f"retry: {FEED_RETRY_MS}\n\n"
+        async with aclosing(requirement_feed.events(user["id"], subjects, resume)) as events:
+            async for requirement in events:
+                if requirement is None:
+                    yield ": keep-alive\n\n"
+                else:
+                    yield f"id: {event_id(requirement)}\nevent: requirement\ndata: {dumps(requirement).decode()}\n\n"
+    
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@api_router.websocket("/requirements/feed/ws")
+async def requirements_feed_socket(websocket: WebSocket, token: str, last_event_id: Optional[str] = None):
+    """WebSocket variant of the requirement feed, for clients that already hold a socket"""
+    try:
+        user = await user_from_token(token)
+        subjects = await feed_subjects(user)
+        if last_event_id:
+            decode_cursor(last_event_id, FEED_ORDER)
+    except HTTPException as e:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION, reason=e.detail)
+        return
+    await websocket.accept()
+    
+    async def push():
+        async with aclosing(requirement_feed.events(user["id"], subjects, last_event_id)) as events:
+            async for requirement in events:
+                if requirement is None:
+                    await websocket.send_text('{"type":"ping"}')
+                else:
+                    await websocket.send_text(dumps({
+                        "type": "requirement", "id": event_id(requirement), "requirement": requirement
+                    }).decode())
+        # Fell behind or shutting down; the client reconnects with its last id
+        await websocket.close(code=status.WS_1013_TRY_AGAIN_LATER)
+    
+    sender = asyncio.create_task(push())
+    try:
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                break
+    finally:
+        sender.cancel()
+        await asyncio.gather(sender, return_exceptions=True)
+
 @api_router.delete("/requirements/{requirement_id}")
 async def delete_requirement(requirement_id: str, current_user: dict = Depends(get_current_user)):
     requirement = await db.requirements.find_one({"id": requirement_id}, {"_id": 0})
@@ -788,47 +1146,67 @@ async def delete_requirement(requirement_id: str, current_user: dict = Depends(g
     
     await db.requirements.update_one(
         {"id": requirement_id},
-        {"$set": {"status": "closed"}}
+        {"$set": {"status": "closed", "updated_at": datetime.now(timezone.utc).isoformat()}}
     )
+    matching.remove_requirement(requirement_id)
     
     return {"message": "Requirement closed successfully"}
 
+@api_router.get("/requirements/{requirement_id}/matches")
+async def get_requirement_matches(
+    requirement_id: str,
+    limit: int = Query(DEFAULT_MATCHES, ge=1, le=MAX_MATCHES),
+    max_fee: Optional[int] = None,
+    current_user: dict = Depends(get_current_user)
+):
+    """Best-matching tutors for one of the student's requirements, best first"""
+    requirement = await db.requirements.find_one({"id": requirement_id}, {"_id": 0})
+    if not requirement:
+        raise HTTPException(status_code=404, detail="Requirement not found")
+    
+    if requirement["student_id"] != current_user["id"]:
+        raise HTTPException(status_code=403, detail="Access denied")
+    
+    if requirement.get("status") != "active":
+        raise HTTPException(status_code=409, detail="Requirement is closed")
+    
+    ranked = await matching.tutors_for(requirement, limit, max_fee)
+    tutors = await db.tutor_profiles.find(
+        {"user_id": {"$in": [user_id for user_id, _ in ranked]}},
+        {"_id": 0, "reviews": 0, **SEARCH_KEY_PROJECTION}
+    ).to_list(None)
+    by_id = {tutor["user_id"]: tutor for tutor in tutors}
+    
+    return [{**by_id[user_id], "match_score": points} for user_id, points in ranked if user_id in by_id]
+
 @api_router.post("/reviews")
 async def create_review(data: ReviewCreate, current_user: dict = Depends(get_current_user)):
-    # Check if student already reviewed this tutor
-    existing_review = await db.reviews.find_one({
-        "tutor_id": data.tutor_id,
-        "student_id": current_user["id"]
-    }, {"_id": 0})
+    now = datetime.now(timezone.utc).isoformat()
+    
+    # Update the student's existing review, if any, and get the old rating back
+    existing_review = await db.reviews.find_one_and_update(
+        {"tutor_id": data.tutor_id, "student_id": current_user["id"]},
+        {"$set": {"rating": data.rating, "comment": data.comment, "updated_at": now}},
+        projection={"_id": 0},
+        return_document=ReturnDocument.BEFORE
+    )
     
     if existing_review:
-        # Update existing review instead of creating new one
-        await db.reviews.update_one(
-            {"id": existing_review["id"]},
-            {"$set": {
-                "rating": data.rating,
-                "comment": data.comment,
-                "updated_at": datetime.now(timezone.utc).isoformat()
-            }}
-        )
-        
         # Update tutor profile reviews array
         await db.tutor_profiles.update_one(
             {"user_id": data.tutor_id, "reviews.id": existing_review["id"]},
             {"$set": {
                 "reviews.$.rating": data.rating,
                 "reviews.$.comment": data.comment,
-                "reviews.$.updated_at": datetime.now(timezone.utc).isoformat()
+                "reviews.$.updated_at": now
             }}
         )
         
-        # Recalculate average rating
-        all_reviews = await db.reviews.find({"tutor_id": data.tutor_id}, {"_id": 0}).to_list(1000)
-        avg_rating = sum(r["rating"] for r in all_reviews) / len(all_reviews) if all_reviews else 0
-        await db.tutor_profiles.update_one(
-            {"user_id": data.tutor_id},
-            {"$set": {"average_rating": avg_rating}}
-        )
+        if existing_review["rating"] != data.rating:
+            await db.tutor_profiles.update_one(
+                {"user_id": data.tutor_id},
+                ratings.changed_review(existing_review["rating"], data.rating)
+            )
         
         return {"message": "Review updated successfully", "id": existing_review["id"], "updated": True}
     
@@ -841,33 +1219,56 @@ async def create_review(data: ReviewCreate, current_user: dict = Depends(get_cur
         "student_name": current_user["name"],
         "rating": data.rating,
         "comment": data.comment,
-        "created_at": datetime.now(timezone.utc).isoformat()
+        "created_at": now
     }
     
-    await db.reviews.insert_one(review_doc)
-    
-    all_reviews = await db.reviews.find({"tutor_id": data.tutor_id}, {"_id": 0}).to_list(1000)
-    avg_rating = sum(r["rating"] for r in all_reviews) / len(all_reviews) if all_reviews else 0
+    try:
+        await db.reviews.insert_one(review_doc)
+    except DuplicateKeyError:
+        raise HTTPException(status_code=409, detail="Review already submitted. Please try again.")
+    review_doc.pop("_id", None)
     
     await db.tutor_profiles.update_one(
         {"user_id": data.tutor_id},
-        {"$set": {"average_rating": avg_rating}, "$push": {"reviews": review_doc}}
+        {"$push": {"reviews": review_doc}}
+    )
+    await db.tutor_profiles.update_one(
+        {"user_id": data.tutor_id},
+        ratings.added_review(data.rating)
     )
     
     return {"message": "Review submitted successfully", "id": review_id, "updated": False}
 
 @api_router.get("/reviews/{tutor_id}")
-async def get_tutor_reviews(tutor_id: str):
-    reviews = await db.reviews.find({"tutor_id": tutor_id}, {"_id": 0}).sort("created_at", -1).to_list(100)
+async def get_tutor_reviews(
+    tutor_id: str,
+    response: Response,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None
+):
+    reviews, next_cursor = await fetch_page(
+        db.reviews, {"tutor_id": tutor_id}, {"_id": 0}, CREATED_DESC, limit, cursor
+    )
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
     return reviews
 
 @api_router.get("/reviews/my/received")
-async def get_my_received_reviews(current_user: dict = Depends(get_current_user)):
+async def get_my_received_reviews(
+    response: Response,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    current_user: dict = Depends(get_current_user)
+):
     """Get all reviews received by the logged-in tutor"""
     if current_user["role"] != UserRole.TUTOR:
         raise HTTPException(status_code=403, detail="Only tutors can view their received reviews")
     
-    reviews = await db.reviews.find({"tutor_id": current_user["id"]}, {"_id": 0}).sort("created_at", -1).to_list(100)
+    reviews, next_cursor = await fetch_page(
+        db.reviews, {"tutor_id": current_user["id"]}, {"_id": 0}, CREATED_DESC, limit, cursor
+    )
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
     return reviews
 
 @api_router.get("/reviews/check/{tutor_id}")
@@ -885,44 +1286,38 @@ async def check_existing_review(tutor_id: str, current_user: dict = Depends(get_
 @api_router.post("/messages")
 async def send_message(data: MessageCreate, current_user: dict = Depends(get_current_user)):
     # Check if the sender is a student - they need to pay coins to message tutors
-    if current_user["role"] in ["student", "parent", "coaching", "company"]:
+    # Students who already paid for this tutor are let through on a cache hit
+    if current_user["role"] in ["student", "parent", "coaching", "company"] and not await entitlements.has(
+        current_user["id"], data.recipient_id, "message_tutor"
+    ):
         # Check if recipient is a tutor
-        recipient_profile = await db.tutor_profiles.find_one({"user_id": data.recipient_id}, {"_id": 0})
+        recipient_profile = await db.tutor_profiles.find_one({"user_id": data.recipient_id}, {"_id": 1})
         if recipient_profile:
-            # Check if student has already paid for this tutor
+            # Purchases made before entitlements existed are only in transactions
             existing_transaction = await db.transactions.find_one({
                 "user_id": current_user["id"],
                 "target_id": data.recipient_id,
                 "purpose": "message_tutor",
                 "status": "completed"
-            }, {"_id": 0})
+            }, {"_id": 0, "id": 1})
             
-            if not existing_transaction:
-                # Check coin balance
-                user = await db.users.find_one({"id": current_user["id"]}, {"_id": 0})
-                if user.get("coins", 0) < 100:
+            if existing_transaction:
+                transaction_id = existing_transaction["id"]
+            else:
+                # Keyed per tutor, so concurrent first messages pay only once
+                try:
+                    result = await debit(
+                        db, current_user["id"], 100, "message_tutor", data.recipient_id,
+                        idempotency_key=f"message_tutor:{data.recipient_id}"
+                    )
+                except InsufficientCoins:
                     raise HTTPException(
                         status_code=402, 
                         detail="Insufficient coins. You need 100 coins to message this tutor. Please purchase coins first."
                     )
-                
-                # Deduct coins
-                transaction_id = str(uuid.uuid4())
-                transaction_doc = {
-                    "id": transaction_id,
-                    "user_id": current_user["id"],
-                    "type": "spend",
-                    "coins": -100,
-                    "purpose": "message_tutor",
-                    "target_id": data.recipient_id,
-                    "status": "completed",
-                    "created_at": datetime.now(timezone.utc).isoformat()
-                }
-                await db.transactions.insert_one(transaction_doc)
-                await db.users.update_one(
-                    {"id": current_user["id"]},
-                    {"$inc": {"coins": -100}}
-                )
+                user_cache.invalidate(current_user["id"])
+                transaction_id = result["transaction"]["id"]
+            await entitlements.grant(current_user["id"], data.recipient_id, "message_tutor", transaction_id)
     
     message_id = str(uuid.uuid4())
     message_doc = {
@@ -936,106 +1331,248 @@ async def send_message(data: MessageCreate, current_user: dict = Depends(get_cur
     }
     
     await db.messages.insert_one(message_doc)
+    await record_message(db, message_doc)
+    await messaging_hub.send([data.recipient_id, current_user["id"]], message_event(message_doc))
     return {"message": "Message sent successfully", "id": message_id}
 
 @api_router.get("/messages")
-async def get_messages(current_user: dict = Depends(get_current_user)):
-    messages = await db.messages.find(
+async def get_messages(
+    response: Response,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    current_user: dict = Depends(get_current_user)
+):
+    messages, next_cursor = await fetch_page(
+        db.messages,
         {"$or": [{"sender_id": current_user["id"]}, {"recipient_id": current_user["id"]}]},
-        {"_id": 0}
-    ).sort("created_at", -1).to_list(100)
+        {"_id": 0},
+        CREATED_DESC,
+        limit,
+        cursor
+    )
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
     return messages
 
 @api_router.get("/messages/conversations")
-async def get_conversations(current_user: dict = Depends(get_current_user)):
-    """Get all conversations grouped by user"""
-    messages = await db.messages.find(
-        {"$or": [{"sender_id": current_user["id"]}, {"recipient_id": current_user["id"]}]},
-        {"_id": 0}
-    ).sort("created_at", -1).to_list(500)
-    
-    # Group messages by conversation partner
-    conversations = {}
-    for msg in messages:
-        partner_id = msg["recipient_id"] if msg["sender_id"] == current_user["id"] else msg["sender_id"]
-        partner_name = msg.get("sender_name") if msg["sender_id"] != current_user["id"] else None
-        
-        if partner_id not in conversations:
-            # Get partner's name if not available
-            if not partner_name:
-                user = await db.users.find_one({"id": partner_id}, {"_id": 0, "name": 1})
-                partner_name = user.get("name", "Unknown") if user else "Unknown"
-            
-            conversations[partner_id] = {
-                "partner_id": partner_id,
-                "partner_name": partner_name,
-                "last_message": msg["message"],
-                "last_message_time": msg["created_at"],
-                "unread_count": 0,
-                "messages": []
-            }
-        
-        conversations[partner_id]["messages"].append(msg)
-        
-        # Count unread messages from this partner
-        if msg["recipient_id"] == current_user["id"] and not msg.get("read", True):
-            conversations[partner_id]["unread_count"] += 1
-    
-    return list(conversations.values())
-
-@api_router.get("/messages/thread/{partner_id}")
-async def get_message_thread(partner_id: str, current_user: dict = Depends(get_current_user)):
-    """Get all messages with a specific user"""
-    messages = await db.messages.find(
-        {"$or": [
-            {"sender_id": current_user["id"], "recipient_id": partner_id},
-            {"sender_id": partner_id, "recipient_id": current_user["id"]}
-        ]},
-        {"_id": 0}
-    ).sort("created_at", 1).to_list(100)
-    
-    # Mark all received messages as read
-    await db.messages.update_many(
-        {"sender_id": partner_id, "recipient_id": current_user["id"], "read": False},
+async def get_conversations(
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    current_user: dict = Depends(get_current_user)
+):
+    """Get conversations, most recently active first"""
+    conversations, next_cursor = await fetch_page(
+        db.conversations,
+        {"user_id": current_user["id"]},
+        CONVERSATION_PROJECTION,
+        CONVERSATIONS_DESC,
+        limit,
+        cursor
+    )
+    return FastJSONResponse(conversations, headers={NEXT_CURSOR_HEADER: next_cursor} if next_cursor else None)
+
+def thread_query(user_id: str, partner_id: str) -> dict:
+    # One branch per direction, each a range on (sender_id, recipient_id, created_at, id)
+    return {"$or": [
+        {"sender_id": user_id, "recipient_id": partner_id},
+        {"sender_id": partner_id, "recipient_id": user_id}
+    ]}
+
+async def read_thread_up_to(user_id: str, partner_id: str, message: dict) -> int:
+    """Mark `partner_id`'s messages to `user_id` read, up to and including `message`"""
+    result = await db.messages.update_many(
+        {
+            "sender_id": partner_id,
+            "recipient_id": user_id,
+            "read": False,
+            "$or": [
+                {"created_at": {"$lt": message["created_at"]}},
+                {"created_at": message["created_at"], "id": {"$lte": message["id"]}}
+            ]
+        },
         {"$set": {"read": True}}
     )
+    await mark_conversation_read(db, user_id, partner_id, result.modified_count)
+    if result.modified_count:
+        await messaging_hub.send([partner_id, user_id], read_event(user_id, partner_id, up_to=message["id"]))
+    return result.modified_count
+
+@api_router.get("/messages/thread/{partner_id}")
+async def get_message_thread(
+    partner_id: str,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    before: Optional[str] = None,
+    after: Optional[str] = None,
+    current_user: dict = Depends(get_current_user)
+):
+    """One page of the thread with a specific user, oldest message first.
+
+    Without a cursor this is the newest page. Pass the returned `before` to
+    page back through history and `after` to fetch what arrived since;
+    `before` is null once the start of the thread is reached. Messages up
+    to the newest one on the page are marked read.
+    """
+    if before and after:
+        raise HTTPException(status_code=400, detail="Use either before or after, not both")
+    
+    query = thread_query(current_user["id"], partner_id)
+    if after:
+        messages, _ = await fetch_page(db.messages, query, {"_id": 0}, CREATED_ASC, limit, after)
+        older = encode_cursor(messages[0], CREATED_DESC) if messages else None
+        newer = encode_cursor(messages[-1], CREATED_ASC) if messages else after
+    else:
+        page, older = await fetch_page(db.messages, query, {"_id": 0}, CREATED_DESC, limit, before)
+        # Fetched newest first; the client renders oldest first
+        messages = page[::-1]
+        newer = encode_cursor(messages[-1], CREATED_ASC) if messages else None
+    
+    if messages:
+        await read_thread_up_to(current_user["id"], partner_id, messages[-1])
     
     # Get partner info
     partner = await db.users.find_one({"id": partner_id}, {"_id": 0, "name": 1, "role": 1})
     
     return {
         "partner": partner,
-        "messages": messages
+        "messages": messages,
+        "before": older,
+        "after": newer
     }
 
+@api_router.put("/messages/thread/{partner_id}/read")
+async def mark_thread_read(partner_id: str, up_to: str, current_user: dict = Depends(get_current_user)):
+    """Mark the partner's messages read up to and including message `up_to`"""
+    message = await db.messages.find_one(
+        {"id": up_to, **thread_query(current_user["id"], partner_id)},
+        {"_id": 0, "id": 1, "created_at": 1}
+    )
+    if not message:
+        raise HTTPException(status_code=404, detail="Message not found")
+    
+    marked = await read_thread_up_to(current_user["id"], partner_id, message)
+    return {"message": "Messages marked as read", "marked": marked}
+
 @api_router.get("/messages/unread")
 async def get_unread_count(current_user: dict = Depends(get_current_user)):
-    count = await db.messages.count_documents({
-        "recipient_id": current_user["id"],
-        "read": False
-    })
-    return {"count": count}
+    return {"count": await unread_count(db, current_user["id"])}
+
+async def read_message(user_id: str, message_id: str) -> None:
+    message = await db.messages.find_one_and_update(
+        {"id": message_id, "recipient_id": user_id, "read": False},
+        {"$set": {"read": True}},
+        projection={"_id": 0, "sender_id": 1}
+    )
+    # Only a message that was actually unread changes the unread count
+    if message:
+        await message_read(db, user_id, message["sender_id"])
+        await messaging_hub.send([message["sender_id"], user_id], read_event(user_id, message["sender_id"], message_id=message_id))
 
 @api_router.put("/messages/{message_id}/read")
 async def mark_message_read(message_id: str, current_user: dict = Depends(get_current_user)):
-    await db.messages.update_one(
-        {"id": message_id, "recipient_id": current_user["id"]},
-        {"$set": {"read": True}}
-    )
+    await read_message(current_user["id"], message_id)
     return {"message": "Message marked as read"}
 
+async def handle_socket_event(connection, event: Any) -> Optional[str]:
+    """Apply one client event from the messaging socket; returns an error, if any"""
+    if not isinstance(event, dict):
+        return "Expected a JSON object"
+    
+    if event.get("type") == "read" and "up_to" in event:
+        partner_id, up_to = event.get("partner_id"), event.get("up_to")
+        if not isinstance(partner_id, str) or not isinstance(up_to, str):
+            return "read up_to needs a partner_id and a message id"
+        message = await db.messages.find_one(
+            {"id": up_to, **thread_query(connection.user_id, partner_id)},
+            {"_id": 0, "id": 1, "created_at": 1}
+        )
+        if not message:
+            return "Message not found"
+        await read_thread_up_to(connection.user_id, partner_id, message)
+    elif event.get("type") == "read":
+        if not isinstance(event.get("message_id"), str):
+            return "read needs a message_id"
+        await read_message(connection.user_id, event["message_id"])
+    elif event.get("type") == "typing":
+        partner_id = event.get("to")
+        if not isinstance(partner_id, str):
+            return "typing needs a 'to' user id"
+        # Only to someone the user already has a conversation with
+        if partner_id not in connection.partners:
+            if not await db.conversations.find_one({"user_id": connection.user_id, "partner_id": partner_id}, {"_id": 1}):
+                return "No conversation with that user"
+            connection.partners.add(partner_id)
+        if connection.typing_due(partner_id):
+            await messaging_hub.send([partner_id], typing_event(connection.user_id))
+    elif event.get("type") != "ping":
+        return "Unknown event type"
+    return None
+
+@api_router.websocket("/messages/ws")
+async def messages_socket(websocket: WebSocket, token: str):
+    """Live messages, read receipts and typing indicators (see realtime.py).
+
+    Clients may send {"type": "read", "message_id"}, {"type": "read",
+    "partner_id", "up_to"} and {"type": "typing", "to"}. Sending messages
+    stays on POST /api/messages, which charges coins.
+    """
+    try:
+        user = await user_from_token(token)
+    except HTTPException as e:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION, reason=e.detail)
+        return
+    await websocket.accept()
+    connection = messaging_hub.connect(user["id"])
+    
+    async def push():
+        while True:
+            try:
+                event = await asyncio.wait_for(connection.queue.get(), messaging_hub.heartbeat_seconds)
+            except asyncio.TimeoutError:
+                event = {"type": "ping"}
+            if event is None:
+                break
+            await websocket.send_text(dumps(event).decode())
+        # Fell behind or shutting down; the client reconnects and reloads the thread
+        await websocket.close(code=status.WS_1013_TRY_AGAIN_LATER)
+    
+    sender = asyncio.create_task(push())
+    try:
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                break
+            try:
+                event = json.loads(message.get("text") or message.get("bytes") or "")
+            except ValueError:
+                event = None
+            error = await handle_socket_event(connection, event)
+            if error:
+                connection.offer({"type": "error", "detail": error})
+    finally:
+        messaging_hub.disconnect(connection)
+        sender.cancel()
+        await asyncio.gather(sender, return_exceptions=True)
+
 @api_router.get("/wallet")
-async def get_wallet(current_user: dict = Depends(get_current_user)):
-    user = await db.users.find_one({"id": current_user["id"]}, {"_id": 0})
-    transactions = await db.transactions.find(
+async def get_wallet(
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    current_user: dict = Depends(get_current_user)
+):
+    transactions, next_cursor = await fetch_page(
+        db.transactions,
         {"user_id": current_user["id"]},
-        {"_id": 0}
-    ).sort("created_at", -1).to_list(50)
+        {"_id": 0},
+        CREATED_DESC,
+        limit,
+        cursor
+    )
     
-    return {
-        "coins": user.get("coins", 0),
-        "transactions": transactions
-    }
+    return FastJSONResponse({
+        "coins": current_user.get("coins", 0),
+        "transactions": transactions,
+        "next_cursor": next_cursor
+    })
 
 @api_router.post("/wallet/purchase")
 async def purchase_coins(data: CoinPurchase, current_user: dict = Depends(get_current_user)):
@@ -1053,7 +1590,7 @@ async def purchase_coins(data: CoinPurchase, current_user: dict = Depends(get_cu
     
     if razorpay_client:
         try:
-            razorpay_order = razorpay_client.order.create({
+            razorpay_order = await razorpay_client.create_order({
                 "amount": amount_paise,
                 "currency": "INR",
                 "payment_capture": 1,
@@ -1103,6 +1640,7 @@ async def purchase_coins(data: CoinPurchase, current_user: dict = Depends(get_cu
             {"id": current_user["id"]},
             {"$inc": {"coins": data.package}}
         )
+        user_cache.invalidate(current_user["id"])
         
         return {"message": "Coins purchased successfully (Mock Mode)", "coins_added": data.package}
 
@@ -1111,89 +1649,85 @@ async def verify_payment(data: PaymentVerification, current_user: dict = Depends
     if not razorpay_client:
         raise HTTPException(status_code=400, detail="Razorpay not configured")
     
-    try:
-        params_dict = {
-            'razorpay_order_id': data.razorpay_order_id,
-            'razorpay_payment_id': data.razorpay_payment_id,
-            'razorpay_signature': data.razorpay_signature
-        }
-        
-        razorpay_client.utility.verify_payment_signature(params_dict)
-        
-        transaction = await db.transactions.find_one({"id": data.transaction_id}, {"_id": 0})
-        
-        if not transaction:
-            raise HTTPException(status_code=404, detail="Transaction not found")
-        
-        if transaction["user_id"] != current_user["id"]:
-            raise HTTPException(status_code=403, detail="Unauthorized")
-        
-        if transaction["status"] == "completed":
-            raise HTTPException(status_code=400, detail="Transaction already completed")
-        
-        await db.transactions.update_one(
-            {"id": data.transaction_id},
-            {"$set": {
-                "status": "completed",
-                "razorpay_payment_id": data.razorpay_payment_id,
-                "type": "purchase",
-                "completed_at": datetime.now(timezone.utc).isoformat()
-            }}
-        )
-        
-        await db.users.update_one(
-            {"id": current_user["id"]},
-            {"$inc": {"coins": transaction["coins"]}}
-        )
-        
-        return {
-            "message": "Payment verified successfully",
-            "coins_added": transaction["coins"]
-        }
-        
-    except razorpay.errors.SignatureVerificationError:
+    if not razorpay_client.verify_payment_signature(
+        data.razorpay_order_id,
+        data.razorpay_payment_id,
+        data.razorpay_signature
+    ):
         await db.transactions.update_one(
             {"id": data.transaction_id},
             {"$set": {"status": "failed"}}
         )
         raise HTTPException(status_code=400, detail="Invalid payment signature")
-
-@api_router.post("/wallet/spend")
-async def spend_coins(coins: int, purpose: str, target_id: Optional[str] = None, current_user: dict = Depends(get_current_user)):
-    user = await db.users.find_one({"id": current_user["id"]}, {"_id": 0})
     
-    if user.get("coins", 0) < coins:
-        raise HTTPException(status_code=400, detail="Insufficient coins")
+    transaction = await db.transactions.find_one({"id": data.transaction_id}, {"_id": 0})
     
-    transaction_id = str(uuid.uuid4())
-    transaction_doc = {
-        "id": transaction_id,
-        "user_id": current_user["id"],
-        "type": "spend",
-        "coins": -coins,
-        "purpose": purpose,
-        "target_id": target_id,
-        "status": "completed",
-        "created_at": datetime.now(timezone.utc).isoformat()
-    }
+    if not transaction:
+        raise HTTPException(status_code=404, detail="Transaction not found")
+    
+    if transaction["user_id"] != current_user["id"]:
+        raise HTTPException(status_code=403, detail="Unauthorized")
+    
+    if transaction["status"] == "completed":
+        raise HTTPException(status_code=400, detail="Transaction already completed")
+    
+    await db.transactions.update_one(
+        {"id": data.transaction_id},
+        {"$set": {
+            "status": "completed",
+            "razorpay_payment_id": data.razorpay_payment_id,
+            "type": "purchase",
+            "completed_at": datetime.now(timezone.utc).isoformat()
+        }}
+    )
     
-    await db.transactions.insert_one(transaction_doc)
     await db.users.update_one(
         {"id": current_user["id"]},
-        {"$inc": {"coins": -coins}}
+        {"$inc": {"coins": transaction["coins"]}}
     )
+    user_cache.invalidate(current_user["id"])
+    
+    return {
+        "message": "Payment verified successfully",
+        "coins_added": transaction["coins"]
+    }
+
+@api_router.post("/wallet/spend")
+async def spend_coins(
+    coins: int,
+    purpose: str,
+    target_id: Optional[str] = None,
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key"),
+    current_user: dict = Depends(get_current_user)
+):
+    if coins <= 0:
+        raise HTTPException(status_code=400, detail="Coins must be positive")
+    
+    tutor = None
+    if purpose == "contact_tutor" and target_id:
+        # Look the tutor up before charging, so an unknown id costs nothing
+        tutor = await db.tutor_profiles.find_one({"user_id": target_id}, {"_id": 0, "mobile": 1, "email": 1})
+        if not tutor:
+            raise HTTPException(status_code=404, detail="Tutor not found")
+    
+    try:
+        result = await debit(db, current_user["id"], coins, purpose, target_id, idempotency_key=idempotency_key)
+    except InsufficientCoins:
+        raise HTTPException(status_code=400, detail="Insufficient coins")
+    user_cache.invalidate(current_user["id"])
+    if target_id and purpose in ENTITLEMENT_KINDS:
+        await entitlements.grant(current_user["id"], target_id, purpose, result["transaction"]["id"])
     
     target_data = None
     if purpose == "view_requirement" and target_id:
-        requirement = await db.requirements.find_one({"id": target_id}, {"_id": 0})
+        requirement = await db.requirements.find_one({"id": target_id}, REQUIREMENT_PROJECTION)
         target_data = requirement
-    elif purpose == "contact_tutor" and target_id:
-        tutor = await db.tutor_profiles.find_one({"user_id": target_id}, {"_id": 0})
-        target_data = {"mobile": tutor.get("mobile"), "email": tutor.get("email") if tutor else None}
+    elif tutor:
+        target_data = {"mobile": tutor.get("mobile"), "email": tutor.get("email")}
     
     return {
         "message": "Coins spent successfully",
-        "remaining_coins": user.get("coins", 0) - coins,
+        "remaining_coins": result["balance"],
         "data": target_data
     }
 
@@ -1204,39 +1738,34 @@ async def get_current_user_info(current_user: dict = Depends(get_current_user)):
 @api_router.get("/check-tutor-access/{tutor_id}")
 async def check_tutor_access(tutor_id: str, current_user: dict = Depends(get_current_user)):
     """Check if the current user has paid to message/contact a specific tutor"""
-    # Check for message access
-    message_transaction = await db.transactions.find_one({
-        "user_id": current_user["id"],
-        "target_id": tutor_id,
-        "purpose": "message_tutor",
-        "status": "completed"
-    }, {"_id": 0})
-    
-    # Check for contact access
-    contact_transaction = await db.transactions.find_one({
-        "user_id": current_user["id"],
-        "target_id": tutor_id,
-        "purpose": "contact_tutor",
-        "status": "completed"
-    }, {"_id": 0})
-    
-    user = await db.users.find_one({"id": current_user["id"]}, {"_id": 0})
+    kinds = ("message_tutor", "contact_tutor")
+    granted = await entitlements.granted_kinds(current_user["id"], tutor_id, kinds)
+    # Purchases made before entitlements existed are only in transactions
+    for kind in kinds:
+        if kind in granted:
+            continue
+        legacy = await db.transactions.find_one({
+            "user_id": current_user["id"],
+            "target_id": tutor_id,
+            "purpose": kind,
+            "status": "completed"
+        }, {"_id": 0, "id": 1})
+        if legacy:
+            await entitlements.grant(current_user["id"], tutor_id, kind, legacy["id"])
+            granted.add(kind)
     
     return {
-        "has_message_access": message_transaction is not None,
-        "has_contact_access": contact_transaction is not None,
-        "current_coins": user.get("coins", 0)
+        "has_message_access": "message_tutor" in granted,
+        "has_contact_access": "contact_tutor" in granted,
+        "current_coins": current_user.get("coins", 0)
     }
 
 @api_router.post("/tutors/{tutor_id}/view")
 async def track_profile_view(tutor_id: str):
     """Track a profile view for a tutor"""
-    result = await db.tutor_profiles.update_one(
-        {"user_id": tutor_id},
-        {"$inc": {"profile_views": 1}}
-    )
-    if result.modified_count == 0:
+    if not await db.tutor_profiles.find_one({"user_id": tutor_id}, {"_id": 1}):
         raise HTTPException(status_code=404, detail="Tutor not found")
+    view_counter.record(tutor_id)
     return {"message": "Profile view tracked"}
 
 @api_router.delete("/profile/delete")
@@ -1247,28 +1776,81 @@ async def delete_profile(current_user: dict = Depends(get_current_user)):
     
     # Delete user account
     await db.users.delete_one({"id": user_id})
+    user_cache.invalidate(user_id)
     
     if role == UserRole.TUTOR:
         # Delete tutor profile
         await db.tutor_profiles.delete_one({"user_id": user_id})
+        matching.remove_tutor(user_id)
+        requirement_feed.disconnect(user_id)
+        facet_cache.invalidate()
         # Delete reviews received by this tutor
         await db.reviews.delete_many({"tutor_id": user_id})
     else:
+        # Take this student's reviews back out of each tutor's rating aggregates
+        written = await db.reviews.find(
+            {"student_id": user_id},
+            {"_id": 0, "id": 1, "tutor_id": 1, "rating": 1}
+        ).to_list(None)
+        for review in written:
+            await db.tutor_profiles.update_one(
+                {"user_id": review["tutor_id"]},
+                {"$pull": {"reviews": {"id": review["id"]}}}
+            )
+            await db.tutor_profiles.update_one(
+                {"user_id": review["tutor_id"]},
+                ratings.removed_review(review["rating"])
+            )
+        
         # Delete reviews written by this student
         await db.reviews.delete_many({"student_id": user_id})
         # Delete requirements posted by this student
         await db.requirements.delete_many({"student_id": user_id})
+        matching.remove_student_requirements(user_id)
     
     # Delete messages sent or received
+    await discard_unread_from(db, user_id)
     await db.messages.delete_many({
         "$or": [{"sender_id": user_id}, {"recipient_id": user_id}]
     })
+    await delete_user_conversations(db, user_id)
+    messaging_hub.disconnect_user(user_id)
     
     # Delete transactions
     await db.transactions.delete_many({"user_id": user_id})
+    await entitlements.revoke_all(user_id)
     
     return {"message": "Profile deleted successfully"}
 
+@api_router.get("/metrics")
+async def get_metrics(request: Request):
+    """Prometheus scrape endpoint; set METRICS_TOKEN to require a bearer token"""
+    if METRICS_TOKEN and not hmac.compare_digest(
+        request.headers.get("Authorization", ""), f"Bearer {METRICS_TOKEN}"
+    ):
+        raise HTTPException(status_code=401, detail="Invalid metrics token")
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+@api_router.get("/admin/slow-queries")
+async def get_slow_queries(
+    limit: int = Query(100, ge=1, le=500),
+    route: Optional[str] = None,
+    collection: Optional[str] = None,
+    current_user: dict = Depends(get_admin_user)
+):
+    """Recent slow Mongo commands and their normalized shapes, costliest first"""
+    return {
+        "threshold_ms": slow_log.threshold_ms,
+        "recorded_total": slow_log.recorded_total,
+        "shapes": slow_log.shapes(),
+        "entries": slow_log.entries(limit, route=route, collection=collection)
+    }
+
+@api_router.delete("/admin/slow-queries")
+async def clear_slow_queries(current_user: dict = Depends(get_admin_user)):
+    slow_log.clear()
+    return {"message": "Slow query log cleared"}
+
 app.include_router(api_router)
 
 app.add_middleware(
@@ -1277,14 +1859,49 @@ app.add_middleware(
     allow_origins=os.environ.get('CORS_ORIGINS', '*').split(','),
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER],
+)
+
+app.add_middleware(
+    CompressionMiddleware,
+    minimum_size=int(os.environ.get('COMPRESSION_MIN_SIZE', '1024'))
 )
 
+# Outermost, so the timings include compression and CORS handling
+app.add_middleware(MetricsMiddleware, metrics=metrics)
+
 logging.basicConfig(
     level=logging.INFO,
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
 )
 logger = logging.getLogger(__name__)
 
+@app.on_event("startup")
+async def create_indexes():
+    await ensure_indexes(db)
+
+@app.on_event("startup")
+async def start_background_workers():
+    view_counter.start()
+    otp_store.start()
+    slow_log.start()
+    realtime_broker.start()
+    matching.start()
+    if resend_enabled:
+        email_outbox.start()
+
 @app.on_event("shutdown")
 async def shutdown_db_client():
+    await view_counter.stop()
+    await otp_store.stop()
+    await email_outbox.stop()
+    await matching.stop()
+    requirement_feed.close()
+    messaging_hub.close()
+    await realtime_broker.stop()
+    slow_log.stop()
+    if twilio_client:
+        await twilio_client.aclose()
+    if razorpay_client:
+        await razorpay_client.aclose()
     client.close()
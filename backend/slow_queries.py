@@ -0,0 +1,245 @@
+"""Slow Mongo command log with sampled explain.
+
+`SlowCommandLog` is a pymongo CommandListener. Any command slower than
+`threshold_ms` is recorded in a bounded ring buffer with:
+- its collection,
+- its normalized query shape (literal values replaced by "?", so
+  /api/tutors?subject=math and ?subject=physics group together),
+- the route that issued it,
+- its duration and the number of documents returned.
+
+For a sampled share of slow reads it also runs `explain` in the
+background and attaches docs/keys examined and the winning plan's stages.
+A COLLSCAN, or examined far above returned, points at a missing index.
+
+The listener runs on Motor's executor threads, so explains are handed back
+to the event loop captured by `start()`.
+"""
+import asyncio
+import json
+import random
+import threading
+from collections import deque
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+from pymongo import monitoring
+
+from indexes import plan_stages
+from metrics import BACKGROUND_ROUTE, current_request
+
+# Reads whose shape and plan are worth recording; writes only get timings
+_EXPLAINABLE = {
+    "find": ("filter", "sort", "projection", "limit", "skip", "hint", "collation"),
+    "aggregate": ("pipeline", "hint", "collation"),
+    "count": ("query", "limit", "skip", "hint", "collation"),
+    "distinct": ("key", "query", "collation"),
+}
+_SHAPED = {
+    "find": "filter",
+    "aggregate": "pipeline",
+    "count": "query",
+    "distinct": "query",
+    "findAndModify": "query",
+    "update": "updates",
+    "delete": "deletes",
+}
+
+
+def normalize_shape(value: Any) -> Any:
+    """Replace literal values with "?" while keeping field names and operators"""
+    if isinstance(value, dict):
+        return {key: normalize_shape(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        if value and all(isinstance(item, dict) for item in value):
+            return [normalize_shape(item) for item in value]
+        return ["?"] if value else []
+    return "?"
+
+
+def shape_key(command_name: str, collection: str, shape: Any) -> str:
+    return f"{command_name} {collection} " + json.dumps(shape, sort_keys=True, default=str)
+
+
+class SlowCommandLog(monitoring.CommandListener):
+    def __init__(
+        self,
+        client_getter,
+        threshold_ms: float = 100.0,
+        capacity: int = 500,
+        max_shapes: int = 1000,
+        explain_sample_rate: float = 0.1,
+        max_concurrent_explains: int = 2,
+    ):
+        # Called lazily: the listener must exist before the client it watches
+        self.client_getter = client_getter
+        self.threshold_ms = threshold_ms
+        self.explain_sample_rate = explain_sample_rate
+        self.max_concurrent_explains = max_concurrent_explains
+        self._entries: deque = deque(maxlen=capacity)
+        self.max_shapes = max_shapes
+        self._shapes: Dict[str, Dict[str, Any]] = {}
+        self._inflight: Dict[Tuple[Any, int], Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._explains_running = 0
+        self.recorded_total = 0
+
+    def start(self) -> None:
+        self._loop = asyncio.get_running_loop()
+
+    def stop(self) -> None:
+        self._loop = None
+
+    def started(self, event) -> None:
+        if event.command_name not in _SHAPED:
+            return
+        stats = current_request()
+        # Only keep a reference here; shapes are worked out for slow commands only
+        pending = {
+            "command": event.command_name,
+            "database": event.database_name,
+            "document": event.command,
+            "route": stats.route if stats is not None else BACKGROUND_ROUTE,
+        }
+        with self._lock:
+            self._inflight[(event.connection_id, event.request_id)] = pending
+
+    def succeeded(self, event) -> None:
+        self._finish(event, failed=False)
+
+    def failed(self, event) -> None:
+        self._finish(event, failed=True)
+
+    def _finish(self, event, failed: bool) -> None:
+        with self._lock:
+            pending = self._inflight.pop((event.connection_id, event.request_id), None)
+        if pending is None:
+            return
+        duration_ms = event.duration_micros / 1000
+        if duration_ms < self.threshold_ms:
+            return
+        _describe(pending)
+
+        entry = {
+            "at": datetime.now(timezone.utc).isoformat(),
+            "route": pending["route"],
+            "command": pending["command"],
+            "collection": pending["collection"],
+            "shape": pending["shape"],
+            "duration_ms": round(duration_ms, 2),
+            "failed": failed,
+            "docs_returned": None if failed else _docs_returned(event.reply),
+            "docs_examined": None,
+            "keys_examined": None,
+            "plan": None,
+        }
+        key = shape_key(pending["command"], pending["collection"], pending["shape"])
+        with self._lock:
+            self._entries.append(entry)
+            self.recorded_total += 1
+            summary = self._shapes.get(key)
+            if summary is None and len(self._shapes) < self.max_shapes:
+                summary = self._shapes[key] = {
+                    "command": pending["command"],
+                    "collection": pending["collection"],
+                    "shape": pending["shape"],
+                    "routes": set(),
+                    "count": 0,
+                    "total_ms": 0.0,
+                    "max_ms": 0.0,
+                }
+            if summary is not None:
+                summary["routes"].add(pending["route"])
+                summary["count"] += 1
+                summary["total_ms"] += duration_ms
+                summary["max_ms"] = max(summary["max_ms"], duration_ms)
+
+        if "explain" in pending and random.random() < self.explain_sample_rate:
+            self._schedule_explain(pending, entry)
+
+    def _schedule_explain(self, pending: Dict[str, Any], entry: Dict[str, Any]) -> None:
+        loop = self._loop
+        if loop is None or loop.is_closed():
+            return
+        with self._lock:
+            if self._explains_running >= self.max_concurrent_explains:
+                return
+            self._explains_running += 1
+        loop.call_soon_threadsafe(lambda: loop.create_task(self._explain(pending, entry)))
+
+    async def _explain(self, pending: Dict[str, Any], entry: Dict[str, Any]) -> None:
+        try:
+            database = self.client_getter()[pending["database"]]
+            explanation = await database.command({"explain": pending["explain"], "verbosity": "executionStats"})
+            stats = explanation.get("executionStats", {})
+            planner = explanation.get("queryPlanner") or _first_stage_planner(explanation)
+            with self._lock:
+                entry["docs_examined"] = stats.get("totalDocsExamined")
+                entry["keys_examined"] = stats.get("totalKeysExamined")
+                entry["plan"] = plan_stages(planner.get("winningPlan", {})) if planner else None
+        except Exception as e:
+            with self._lock:
+                entry["plan"] = [f"explain failed: {str(e)}"]
+        finally:
+            with self._lock:
+                self._explains_running -= 1
+
+    def entries(self, limit: int = 100, route: Optional[str] = None, collection: Optional[str] = None) -> List[Dict[str, Any]]:
+        with self._lock:
+            entries = [dict(entry) for entry in reversed(self._entries)]
+        if route:
+            entries = [entry for entry in entries if entry["route"] == route]
+        if collection:
+            entries = [entry for entry in entries if entry["collection"] == collection]
+        return entries[:limit]
+
+    def shapes(self, limit: int = 50) -> List[Dict[str, Any]]:
+        """Slow query shapes, costliest in total first"""
+        with self._lock:
+            shapes = [
+                {**summary, "routes": sorted(summary["routes"]), "total_ms": round(summary["total_ms"], 2),
+                 "max_ms": round(summary["max_ms"], 2), "mean_ms": round(summary["total_ms"] / summary["count"], 2)}
+                for summary in self._shapes.values()
+            ]
+        shapes.sort(key=lambda shape: shape["total_ms"], reverse=True)
+        return shapes[:limit]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._shapes.clear()
+
+
+def _describe(pending: Dict[str, Any]) -> None:
+    """Fill in collection, normalized shape and (for reads) an explain command"""
+    name, command = pending["command"], pending.pop("document")
+    collection = command.get(name)
+    pending["collection"] = collection if isinstance(collection, str) else None
+    shape = normalize_shape(command.get(_SHAPED[name], {}))
+    if name == "find" and command.get("sort"):
+        shape = {"filter": shape, "sort": normalize_shape(command["sort"])}
+    pending["shape"] = shape
+    if name in _EXPLAINABLE:
+        pending["explain"] = {name: collection, **{key: command[key] for key in _EXPLAINABLE[name] if key in command}}
+        if name == "aggregate":
+            pending["explain"]["cursor"] = {}
+
+
+def _docs_returned(reply: Dict[str, Any]) -> Optional[int]:
+    if "cursor" in reply:
+        return len(reply["cursor"].get("firstBatch", []))
+    if "n" in reply:
+        return reply["n"]
+    if "values" in reply:
+        return len(reply["values"])
+    return None
+
+
+def _first_stage_planner(explanation: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    # Aggregations nest the planner under their first ($cursor) stage
+    for stage in explanation.get("stages", []):
+        cursor = stage.get("$cursor")
+        if cursor and "queryPlanner" in cursor:
+            return cursor["queryPlanner"]
+    return None
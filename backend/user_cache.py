@@ -0,0 +1,55 @@
+"""Bounded TTL/LRU cache of authenticated user documents.
+
+`get_current_user` runs on nearly every request, so caching the user
+document by id removes a `db.users.find_one` round-trip from most API
+calls. Every write path that mutates a user must call `invalidate`; the TTL
+bounds staleness for writes made by other worker processes.
+"""
+import copy
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+
+class UserCache:
+    def __init__(self, max_entries: int = 10000, ttl_seconds: float = 30.0):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, user_id: str) -> Optional[Dict[str, Any]]:
+        entry = self._entries.get(user_id)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        expires_at, user = entry
+        if expires_at < time.monotonic():
+            del self._entries[user_id]
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(user_id)
+        self.hits += 1
+        # Handlers are free to mutate what they get back
+        return copy.deepcopy(user)
+
+    def set(self, user_id: str, user: Dict[str, Any]) -> None:
+        if self.max_entries <= 0 or self.ttl_seconds <= 0:
+            return
+        self._entries[user_id] = (time.monotonic() + self.ttl_seconds, copy.deepcopy(user))
+        self._entries.move_to_end(user_id)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, user_id: Optional[str]) -> None:
+        if user_id:
+            self._entries.pop(user_id, None)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
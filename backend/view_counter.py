@@ -0,0 +1,114 @@
+"""Write-behind buffer for tutor profile view counts.
+
+Profile views used to be a synchronous `$inc` on every hit, turning the most
+popular read path into a write path that contends on hot tutor documents.
+Views are now accumulated in memory per tutor and flushed periodically (and
+on shutdown) as a single unordered `bulk_write`.
+
+Memory is bounded: at `max_pending_tutors` distinct tutors one early flush
+is scheduled, and once `max_tracked_tutors` are buffered (a flood of new
+tutor ids, or MongoDB down long enough that flushes keep failing) views of
+further tutors are dropped and counted instead of buffered.
+"""
+import asyncio
+import logging
+from collections import defaultdict
+from typing import Dict, Optional
+
+from pymongo import UpdateOne
+
+logger = logging.getLogger(__name__)
+
+
+class ViewCounter:
+    def __init__(
+        self,
+        db,
+        flush_interval: float = 5.0,
+        max_pending_tutors: int = 10000,
+        max_tracked_tutors: int = 50000,
+    ):
+        self.db = db
+        self.flush_interval = flush_interval
+        self.max_pending_tutors = max_pending_tutors
+        self.max_tracked_tutors = max(max_tracked_tutors, max_pending_tutors)
+        self._pending: Dict[str, int] = defaultdict(int)
+        # Tutors in the batch being written; they count against the limit
+        self._in_flight = 0
+        self._task: Optional[asyncio.Task] = None
+        self._flush_task: Optional[asyncio.Task] = None
+        self._flush_lock = asyncio.Lock()
+        self.flushed_total = 0
+        self.dropped_total = 0
+        self._dropped_unlogged = 0
+
+    def _add(self, tutor_id: str, count: int) -> None:
+        if tutor_id not in self._pending and len(self._pending) + self._in_flight >= self.max_tracked_tutors:
+            self.dropped_total += count
+            self._dropped_unlogged += count
+            return
+        self._pending[tutor_id] += count
+
+    def record(self, tutor_id: str) -> None:
+        self._add(tutor_id, 1)
+        # A burst across many tutors flushes early, once at a time
+        if len(self._pending) >= self.max_pending_tutors and (self._flush_task is None or self._flush_task.done()):
+            self._flush_task = asyncio.get_running_loop().create_task(self.flush())
+
+    def pending_for(self, tutor_id: str) -> int:
+        return self._pending.get(tutor_id, 0)
+
+    def pending_increments(self) -> int:
+        return sum(self._pending.values())
+
+    async def flush(self) -> int:
+        if self._dropped_unlogged:
+            logger.warning(
+                f"Dropped {self._dropped_unlogged} profile views over the {self.max_tracked_tutors}-tutor buffer limit"
+            )
+            self._dropped_unlogged = 0
+        async with self._flush_lock:
+            if not self._pending:
+                return 0
+            batch, self._pending = self._pending, defaultdict(int)
+            self._in_flight = len(batch)
+
+            try:
+                await self.db.tutor_profiles.bulk_write(
+                    [UpdateOne({"user_id": tutor_id}, {"$inc": {"profile_views": count}})
+                     for tutor_id, count in batch.items()],
+                    ordered=False
+                )
+            except Exception as e:
+                logger.error(f"Profile view flush failed, will retry: {str(e)}")
+                self._in_flight = 0
+                for tutor_id, count in batch.items():
+                    self._add(tutor_id, count)
+                return 0
+
+            self._in_flight = 0
+            flushed = sum(batch.values())
+            self.flushed_total += flushed
+            return flushed
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._flush_task is not None:
+            await asyncio.gather(self._flush_task, return_exceptions=True)
+            self._flush_task = None
+        await self.flush()
@@ -7,7 +7,7 @@ import { Badge } from '@/components/ui/badge';
 import { Avatar, AvatarFallback, AvatarImage } from '@/components/ui/avatar';
 import { Select, SelectContent, SelectItem, SelectTrigger, SelectValue } from '@/components/ui/select';
 import { GraduationCap, Search, MapPin, DollarSign, Coins, Star, User } from 'lucide-react';
-import { api } from '@/utils/api';
+import { api, assetUrl } from '@/utils/api';
 
 export default function BrowseTutors({ user }) {
   const [tutors, setTutors] = useState([]);
@@ -138,7 +138,7 @@ export default function BrowseTutors({ user }) {
                   <div className="flex items-start gap-4">
                     {/* Profile Photo */}
                     <Avatar className="w-16 h-16 border-2 border-indigo-100">
-                      <AvatarImage src={tutor.profile_photo} alt={tutor.name} />
+                      <AvatarImage src={assetUrl(tutor.profile_photo, { thumbnail: true })} alt={tutor.name} />
                       <AvatarFallback className="text-xl bg-gradient-to-br from-indigo-500 to-purple-600 text-white">
                         {tutor.name?.charAt(0) || 'T'}
                       </AvatarFallback>
@@ -15,7 +15,7 @@ import {
   Wallet, FileText, X, Upload, Link as LinkIcon, Trash2, AlertTriangle
 } from 'lucide-react';
 import { toast } from 'sonner';
-import { api, logout } from '@/utils/api';
+import { api, assetUrl, logout } from '@/utils/api';
 
 // Helper function to format date in IST
 const formatDateIST = (dateString) => {
@@ -778,7 +778,7 @@ export default function TutorDashboard({ user, setUser }) {
                 <div className="relative -mt-12 mb-4 flex justify-center">
                   <div className="relative">
                     <Avatar className="w-24 h-24 border-4 border-white shadow-lg">
-                      <AvatarImage src={profile.profile_photo} />
+                      <AvatarImage src={assetUrl(profile.profile_photo)} />
                       <AvatarFallback className="text-2xl bg-indigo-100 text-indigo-600">
                         {profile.name?.charAt(0) || 'T'}
                       </AvatarFallback>
@@ -9,7 +9,7 @@ import { Dialog, DialogContent, DialogDescription, DialogHeader, DialogTitle, Di
 import { Avatar, AvatarFallback, AvatarImage } from '@/components/ui/avatar';
 import { GraduationCap, MapPin, Phone, Mail, Star, MessageSquare, Video, DollarSign, Book, Languages, Coins } from 'lucide-react';
 import { toast } from 'sonner';
-import { api } from '@/utils/api';
+import { api, assetUrl } from '@/utils/api';
 
 export default function TutorProfile({ user }) {
   const { tutorId } = useParams();
@@ -209,7 +209,7 @@ export default function TutorProfile({ user }) {
               <CardContent className="pt-0 relative">
                 <div className="flex items-start gap-6 -mt-12">
                   <Avatar className="w-24 h-24 border-4 border-white shadow-lg">
-                    <AvatarImage src={tutor.profile_photo} alt={tutor.name} />
+                    <AvatarImage src={assetUrl(tutor.profile_photo)} alt={tutor.name} />
                     <AvatarFallback className="text-3xl font-bold bg-gradient-to-br from-indigo-500 to-purple-600 text-white">
                       {tutor.name?.charAt(0) || 'T'}
                     </AvatarFallback>
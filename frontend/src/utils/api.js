@@ -15,6 +15,14 @@ api.interceptors.request.use((config) => {
   return config;
 });
 
+// Photos stored by the API are returned as relative /api/... paths
+export const assetUrl = (url, { thumbnail = false } = {}) => {
+  if (!url || !url.startsWith('/api/')) {
+    return url;
+  }
+  return `${BACKEND_URL}${url}${thumbnail ? '?size=thumb' : ''}`;
+};
+
 export const setAuthToken = (token) => {
   if (token) {
     localStorage.setItem('token', token);
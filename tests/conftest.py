@@ -0,0 +1,63 @@
+"""Shared fixtures for the backend tests.
+
+Backend modules are flat siblings imported as `from x import ...`, so the
+backend directory goes on sys.path. Tests are async and run on anyio's
+asyncio backend (anyio ships with FastAPI).
+
+`mongo_db` is a throwaway database on the server at TEST_MONGO_URL and is
+skipped without one; tests that depend on the query planner need it. `db`
+falls back to mongomock-motor when no server is configured.
+"""
+import os
+import sys
+import uuid
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "backend"))
+
+TEST_MONGO_URL = os.environ.get("TEST_MONGO_URL")
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.fixture
+async def mongo_db():
+    if not TEST_MONGO_URL:
+        pytest.skip("TEST_MONGO_URL is not set")
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    client = AsyncIOMotorClient(TEST_MONGO_URL, serverSelectionTimeoutMS=2000)
+    try:
+        await client.admin.command("ping")
+    except Exception as e:
+        client.close()
+        pytest.skip(f"MongoDB at TEST_MONGO_URL is unreachable: {str(e)}")
+
+    name = f"tricity_test_{uuid.uuid4().hex[:12]}"
+    try:
+        yield client[name]
+    finally:
+        await client.drop_database(name)
+        client.close()
+
+
+@pytest.fixture
+async def db():
+    if TEST_MONGO_URL:
+        from motor.motor_asyncio import AsyncIOMotorClient
+
+        client = AsyncIOMotorClient(TEST_MONGO_URL, serverSelectionTimeoutMS=2000)
+        name = f"tricity_test_{uuid.uuid4().hex[:12]}"
+        try:
+            yield client[name]
+        finally:
+            await client.drop_database(name)
+            client.close()
+        return
+
+    mongomock_motor = pytest.importorskip("mongomock_motor")
+    yield mongomock_motor.AsyncMongoMockClient()[f"tricity_test_{uuid.uuid4().hex[:12]}"]
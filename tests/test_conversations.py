@@ -0,0 +1,98 @@
+import pytest
+
+from conversations import (
+    discard_unread_from,
+    mark_conversation_read,
+    message_read,
+    reconcile_unread_counters,
+    record_message,
+    unread_count,
+)
+
+pytestmark = pytest.mark.anyio
+
+
+async def _send(db, n: int, sender: str, recipient: str, read: bool = False):
+    message = {
+        "id": f"m{n}",
+        "sender_id": sender,
+        "sender_name": sender.title(),
+        "recipient_id": recipient,
+        "message": f"hello {n}",
+        "read": read,
+        "created_at": f"2026-01-01T00:00:{n:02d}+00:00",
+    }
+    await db.messages.insert_one(dict(message))
+    await record_message(db, message)
+
+
+async def _row(db, user_id: str, partner_id: str):
+    return await db.conversations.find_one({"user_id": user_id, "partner_id": partner_id})
+
+
+async def test_sending_increments_only_the_recipient(db):
+    await db.users.insert_many([{"id": "alice", "name": "Alice"}, {"id": "bob", "name": "Bob"}])
+
+    await _send(db, 1, "alice", "bob")
+    await _send(db, 2, "alice", "bob")
+
+    assert await unread_count(db, "bob") == 2
+    assert await unread_count(db, "alice") == 0
+    assert (await _row(db, "bob", "alice"))["unread_count"] == 2
+    assert (await _row(db, "alice", "bob"))["unread_count"] == 0
+    assert (await _row(db, "alice", "bob"))["partner_name"] == "Bob"
+
+
+async def test_reads_decrement_both_counters(db):
+    for n in range(3):
+        await _send(db, n, "alice", "bob")
+    await _send(db, 3, "carol", "bob")
+
+    await message_read(db, "bob", "alice")
+    assert await unread_count(db, "bob") == 3
+    assert (await _row(db, "bob", "alice"))["unread_count"] == 2
+
+    await mark_conversation_read(db, "bob", "alice", 2)
+    assert await unread_count(db, "bob") == 1
+    assert (await _row(db, "bob", "alice"))["unread_count"] == 0
+    assert (await _row(db, "bob", "carol"))["unread_count"] == 1
+
+
+async def test_counters_never_go_negative(db):
+    await _send(db, 1, "alice", "bob")
+
+    await mark_conversation_read(db, "bob", "alice", 5)
+    await mark_conversation_read(db, "bob", "alice", 0)
+
+    assert await unread_count(db, "bob") == 0
+    assert (await _row(db, "bob", "alice"))["unread_count"] == 0
+
+
+async def test_unknown_user_has_nothing_unread(db):
+    assert await unread_count(db, "nobody") == 0
+
+
+async def test_deleted_senders_unread_messages_leave_the_counters(db):
+    await _send(db, 1, "alice", "bob")
+    await _send(db, 2, "alice", "carol")
+    await _send(db, 3, "dave", "bob")
+
+    await discard_unread_from(db, "alice")
+
+    assert await unread_count(db, "bob") == 1
+    assert await unread_count(db, "carol") == 0
+
+
+async def test_reconcile_recomputes_drifted_counters(db):
+    await _send(db, 1, "alice", "bob")
+    await _send(db, 2, "alice", "bob")
+    await _send(db, 3, "carol", "bob")
+    await db.messages.update_one({"id": "m1"}, {"$set": {"read": True}})
+    await db.unread_counters.update_one({"_id": "alice"}, {"$set": {"unread": 7}}, upsert=True)
+
+    fixed = await reconcile_unread_counters(db)
+
+    assert fixed["users"] == 2
+    assert await unread_count(db, "bob") == 2
+    assert await unread_count(db, "alice") == 0
+    assert (await _row(db, "bob", "alice"))["unread_count"] == 1
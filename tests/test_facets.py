@@ -0,0 +1,17 @@
+import pytest
+
+from facets import facet_pipeline, shape_facets
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_fee_bands_keep_low_and_high_fees_apart(db):
+    fees = [-50, 0, 250, 700, 2000, 5000]
+    await db.tutor_profiles.insert_many([{"user_id": f"u{i}", "fee_min": fee} for i, fee in enumerate(fees)])
+
+    raw = await db.tutor_profiles.aggregate(facet_pipeline({})).to_list(1)
+    bands = {band["value"]: band for band in shape_facets(raw[0])["fees"]}
+
+    assert {value: band["count"] for value, band in bands.items()} == {"<0": 1, "0-300": 2, "500-800": 1, "2000+": 2}
+    assert (bands["2000+"]["min"], bands["2000+"]["max"]) == (2000, None)
+    assert (bands["<0"]["min"], bands["<0"]["max"]) == (None, 0)
@@ -0,0 +1,11 @@
+import pytest
+
+from indexes import check_indexes, ensure_indexes
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_every_query_shape_is_index_backed(mongo_db):
+    await ensure_indexes(mongo_db)
+
+    assert await check_indexes(mongo_db) == []
@@ -0,0 +1,58 @@
+import httpx
+import pytest
+
+from integrations import ProviderClient, ProviderError, ProviderUnavailable
+
+pytestmark = pytest.mark.anyio
+
+
+def provider(statuses):
+    """A ProviderClient whose calls are answered with `statuses` in turn"""
+    calls = []
+
+    def handler(request):
+        calls.append(request.method)
+        status = statuses[min(len(calls), len(statuses)) - 1]
+        if status == "connect":
+            raise httpx.ConnectError("refused", request=request)
+        return httpx.Response(status, json={"status": "ok"})
+
+    client = ProviderClient("test", "http://provider", httpx.BasicAuth("id", "secret"), timeout=1, backoff_base=0)
+    client._client = httpx.AsyncClient(base_url="http://provider", transport=httpx.MockTransport(handler))
+    return client, calls
+
+
+async def test_post_is_not_retried_after_a_server_error():
+    client, calls = provider([503, 200])
+
+    with pytest.raises(ProviderUnavailable):
+        await client.request("POST", "/orders", json={"amount": 100})
+
+    assert calls == ["POST"]
+
+
+async def test_post_is_retried_when_it_never_reached_the_provider():
+    client, calls = provider(["connect", 429, 200])
+
+    assert await client.request("POST", "/orders", json={"amount": 100}) == {"status": "ok"}
+    assert calls == ["POST", "POST", "POST"]
+
+
+async def test_idempotent_requests_are_retried_after_a_server_error():
+    client, calls = provider([503, 200])
+    assert await client.request("GET", "/orders/1") == {"status": "ok"}
+    assert calls == ["GET", "GET"]
+
+    client, calls = provider([502, 200])
+    assert await client.request("POST", "/orders", idempotent=True, json={"amount": 100}) == {"status": "ok"}
+    assert calls == ["POST", "POST"]
+
+
+async def test_client_errors_are_not_retried():
+    client, calls = provider([400, 200])
+
+    with pytest.raises(ProviderError) as raised:
+        await client.request("GET", "/orders/1")
+
+    assert raised.value.status_code == 400
+    assert calls == ["GET"]
@@ -0,0 +1,83 @@
+import asyncio
+
+import pytest
+
+from ledger import InsufficientCoins, debit, transaction_id_for
+
+pytestmark = pytest.mark.anyio
+
+
+async def _wallet(db, coins: int) -> str:
+    await db.users.insert_one({"id": "student-1", "coins": coins})
+    return "student-1"
+
+
+async def _balance(db, user_id: str) -> int:
+    return (await db.users.find_one({"id": user_id}))["coins"]
+
+
+async def test_concurrent_debits_never_overdraw(db):
+    user_id = await _wallet(db, 50)
+
+    results = await asyncio.gather(
+        *(debit(db, user_id, 10, "message_tutor") for _ in range(20)),
+        return_exceptions=True
+    )
+
+    succeeded = [result for result in results if isinstance(result, dict)]
+    refused = [result for result in results if isinstance(result, InsufficientCoins)]
+    assert len(succeeded) == 5
+    assert len(refused) == 15
+    assert await _balance(db, user_id) == 0
+    assert sorted(result["balance"] for result in succeeded) == [0, 10, 20, 30, 40]
+    assert await db.transactions.count_documents({"user_id": user_id}) == 5
+
+
+async def test_insufficient_coins_reports_the_balance(db):
+    user_id = await _wallet(db, 5)
+
+    with pytest.raises(InsufficientCoins) as raised:
+        await debit(db, user_id, 10, "message_tutor")
+
+    assert raised.value.balance == 5
+    assert await _balance(db, user_id) == 5
+
+
+async def test_replayed_idempotency_key_charges_once(db):
+    user_id = await _wallet(db, 100)
+
+    first = await debit(db, user_id, 10, "message_tutor", target_id="tutor-1", idempotency_key="key-1")
+    replay = await debit(db, user_id, 10, "message_tutor", target_id="tutor-1", idempotency_key="key-1")
+
+    assert first["replayed"] is False
+    assert replay["replayed"] is True
+    assert replay["transaction"]["id"] == first["transaction"]["id"] == transaction_id_for(user_id, "key-1")
+    assert replay["balance"] == first["balance"] == 90
+    assert await _balance(db, user_id) == 90
+    assert await db.transactions.count_documents({"user_id": user_id}) == 1
+
+
+async def test_concurrent_duplicates_charge_once(db):
+    user_id = await _wallet(db, 100)
+
+    results = await asyncio.gather(*(
+        debit(db, user_id, 10, "message_tutor", idempotency_key="key-1") for _ in range(10)
+    ))
+
+    assert [result["replayed"] for result in results].count(False) == 1
+    assert {result["transaction"]["id"] for result in results} == {transaction_id_for(user_id, "key-1")}
+    assert await _balance(db, user_id) == 90
+
+
+async def test_replay_repairs_a_missing_ledger_entry(db):
+    user_id = await _wallet(db, 100)
+    await debit(db, user_id, 10, "message_tutor", idempotency_key="key-1")
+    # The debit landed but the process died before writing the transaction
+    await db.transactions.delete_many({})
+
+    replay = await debit(db, user_id, 10, "message_tutor", idempotency_key="key-1")
+
+    assert replay["replayed"] is True
+    assert replay["transaction"]["id"] == transaction_id_for(user_id, "key-1")
+    assert await db.transactions.count_documents({"user_id": user_id}) == 1
+    assert await _balance(db, user_id) == 90
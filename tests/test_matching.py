@@ -0,0 +1,81 @@
+import asyncio
+
+import pytest
+
+from matching import MatchingEngine
+from search import subject_search_keys
+
+pytestmark = pytest.mark.anyio
+
+
+def _tutor(user_id: str, subject: str, **fields):
+    subjects = [{"subject": subject, "classes": ["Class 10"]}]
+    return {"user_id": user_id, "subjects": subjects, "teaches_online": True, **subject_search_keys(subjects), **fields}
+
+
+def _requirement(requirement_id: str, subject: str, **fields):
+    return {
+        "id": requirement_id,
+        "student_id": "student-1",
+        "subject": subject,
+        "level_class": "Class 10",
+        "mode": ["Online"],
+        "status": "active",
+        "created_at": f"2026-01-01T00:00:0{requirement_id[-1]}+00:00",
+        **fields,
+    }
+
+
+async def _seed(db):
+    await db.tutor_profiles.insert_many([
+        _tutor("maths-tutor", "Maths", average_rating=4.5),
+        _tutor("mathematics-tutor", "Mathematics"),
+        _tutor("physics-tutor", "Physics"),
+    ])
+    await db.requirements.insert_many([
+        _requirement("r1", "Mathematics"),
+        _requirement("r2", "Physics"),
+        _requirement("r3", "Mathematics", status="closed"),
+    ])
+
+
+async def test_answers_from_mongo_before_the_first_build(db):
+    await _seed(db)
+    engine = MatchingEngine(db)
+    assert not engine.ready
+
+    tutors = await engine.tutors_for(_requirement("r1", "Mathematics"), 10)
+    requirements = await engine.requirements_for(_tutor("maths-tutor", "Maths"), 10)
+
+    assert [user_id for user_id, _ in tutors] == ["maths-tutor", "mathematics-tutor"]
+    assert [requirement_id for requirement_id, _ in requirements] == ["r1"]
+
+
+async def test_fallback_ranks_like_the_built_engine(db):
+    await _seed(db)
+    engine = MatchingEngine(db)
+    requirement = _requirement("r1", "Mathematics")
+    profile = _tutor("physics-tutor", "Physics")
+    before = (await engine.tutors_for(requirement, 10), await engine.requirements_for(profile, 10))
+
+    await engine.rebuild()
+
+    assert engine.ready
+    assert (await engine.tutors_for(requirement, 10), await engine.requirements_for(profile, 10)) == before
+
+
+async def test_start_builds_in_the_background(db):
+    await _seed(db)
+    engine = MatchingEngine(db, poll_interval=60)
+
+    engine.start()
+    assert not engine.ready
+    for _ in range(100):
+        if engine.ready:
+            break
+        await asyncio.sleep(0.01)
+    await engine.stop()
+
+    assert engine.ready
+    assert engine.tutor_count == 3
+    assert engine.requirement_count == 2
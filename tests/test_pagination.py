@@ -0,0 +1,206 @@
+import random
+
+import pytest
+from fastapi import HTTPException
+
+from pagination import (
+    CREATED_ASC,
+    CREATED_DESC,
+    DISTANCE_FIELD,
+    REGISTERED_DESC,
+    after_cursor,
+    decode_cursor,
+    encode_cursor,
+    fetch_nearest_page,
+    fetch_page,
+)
+
+mongomock_filtering = pytest.importorskip("mongomock.filtering")
+
+pytestmark = pytest.mark.anyio
+
+
+def _message(n: int, created_at: str, sender: str = "a", recipient: str = "b"):
+    return {"id": f"m{n:03d}", "created_at": created_at, "sender_id": sender, "recipient_id": recipient}
+
+
+async def test_cursor_round_trips_the_sort_keys():
+    doc = {"created_at": "2026-01-01T00:00:00+00:00", "id": "abc", "other": 1}
+
+    cursor = encode_cursor(doc, CREATED_DESC)
+
+    assert "=" not in cursor
+    assert decode_cursor(cursor, CREATED_DESC) == ["2026-01-01T00:00:00+00:00", "abc"]
+
+
+@pytest.mark.parametrize("cursor", [
+    "not base64!",
+    "bm90IGpzb24",
+    encode_cursor({"created_at": "x"}, [("created_at", -1)]),
+    encode_cursor({"created_at": {"$gt": ""}, "id": "m1"}, CREATED_DESC),
+    encode_cursor({"created_at": "x", "id": ["m1"]}, CREATED_DESC),
+])
+async def test_malformed_cursors_are_rejected(cursor):
+    with pytest.raises(HTTPException) as raised:
+        decode_cursor(cursor, CREATED_DESC)
+
+    assert raised.value.status_code == 400
+
+
+async def test_after_cursor_breaks_ties_on_id():
+    cursor = encode_cursor({"created_at": "t1", "id": "m5"}, CREATED_DESC)
+
+    assert after_cursor({"sender_id": "a"}, CREATED_DESC, cursor) == {
+        "sender_id": "a",
+        "$or": [{"created_at": {"$lt": "t1"}}, {"created_at": "t1", "id": {"$lt": "m5"}}],
+    }
+
+
+async def test_after_cursor_distributes_over_or_branches():
+    cursor = encode_cursor({"created_at": "t1", "id": "m5"}, CREATED_ASC)
+    query = {"read": False, "$or": [{"sender_id": "a"}, {"recipient_id": "a"}]}
+
+    assert after_cursor(query, CREATED_ASC, cursor) == {
+        "read": False,
+        "$or": [
+            {"sender_id": "a", "created_at": {"$gt": "t1"}},
+            {"sender_id": "a", "created_at": "t1", "id": {"$gt": "m5"}},
+            {"recipient_id": "a", "created_at": {"$gt": "t1"}},
+            {"recipient_id": "a", "created_at": "t1", "id": {"$gt": "m5"}},
+        ],
+    }
+
+
+@pytest.mark.parametrize("sort", [CREATED_DESC, CREATED_ASC])
+async def test_pages_cover_every_document_once_across_timestamp_ties(db, sort):
+    # Runs of five messages share a timestamp, so pages split inside a tie
+    await db.messages.insert_many([_message(n, f"2026-01-01T00:00:{n // 5:02d}+00:00") for n in range(23)])
+
+    seen, cursor = [], None
+    while True:
+        page, cursor = await fetch_page(db.messages, {"sender_id": "a"}, {"_id": 0}, sort, 4, cursor)
+        seen.extend(doc["id"] for doc in page)
+        if cursor is None:
+            break
+
+    expected = sorted((f"m{n:03d}" for n in range(23)), reverse=sort[0][1] < 0)
+    assert seen == expected
+
+
+async def test_last_page_has_no_cursor(db):
+    await db.messages.insert_many([_message(n, "2026-01-01T00:00:00+00:00") for n in range(4)])
+
+    page, cursor = await fetch_page(db.messages, {}, {"_id": 0}, CREATED_DESC, 4)
+
+    assert len(page) == 4
+    assert cursor is None
+
+
+class GeoNearCollection:
+    """Runs the fetch_nearest_page pipelines over documents with a precomputed `d`.
+
+    Like the server, $geoNear returns equal distances in no particular order.
+    """
+
+    def __init__(self, docs, seed=0):
+        self.docs = docs
+        self.rng = random.Random(seed)
+        self.pipelines = []
+
+    def aggregate(self, pipeline):
+        self.pipelines.append(pipeline)
+        docs = []
+        for stage in pipeline:
+            (name, spec), = stage.items()
+            if name == "$geoNear":
+                docs = [
+                    {**doc, spec["distanceField"]: doc["d"]} for doc in self.docs
+                    if spec["minDistance"] <= doc["d"] <= spec["maxDistance"]
+                ]
+                self.rng.shuffle(docs)
+                docs.sort(key=lambda doc: doc["d"])
+            elif name == "$match":
+                docs = [doc for doc in docs if mongomock_filtering.filter_applies(spec, doc)]
+            elif name == "$sort":
+                for field, direction in reversed(list(spec.items())):
+                    # Missing fields sort as null, before any value
+                    docs.sort(key=lambda doc: (field in doc, doc.get(field)), reverse=direction < 0)
+            elif name == "$limit":
+                docs = docs[:spec]
+            elif name == "$project":
+                docs = [{k: v for k, v in doc.items() if spec.get(k, 1)} for doc in docs]
+        return _Result(docs)
+
+
+class _Result:
+    def __init__(self, docs):
+        self.docs = docs
+
+    async def to_list(self, length):
+        return self.docs[:length]
+
+
+async def _walk_nearest(collection, limit):
+    seen, cursor = [], None
+    while True:
+        page, cursor = await fetch_nearest_page(
+            collection, {}, {"_id": 0}, {"type": "Point", "coordinates": [0, 0]}, 5000, REGISTERED_DESC, limit, cursor
+        )
+        seen.extend(page)
+        if cursor is None:
+            return seen
+
+
+@pytest.mark.parametrize("seed", range(5))
+async def test_nearest_pages_cover_tied_distances_once(seed):
+    # Tutors cluster on a few locality centroids
+    docs = [
+        {"id": f"t{n:03d}", "registered_at": f"2026-01-{1 + n % 3:02d}", "d": float([0, 250, 250, 900][n % 4])}
+        for n in range(37)
+    ]
+
+    seen = await _walk_nearest(GeoNearCollection(docs, seed), 5)
+
+    expected = sorted(docs, key=lambda doc: doc["id"], reverse=True)
+    expected.sort(key=lambda doc: doc["registered_at"], reverse=True)
+    expected.sort(key=lambda doc: doc["d"])
+    assert [doc["id"] for doc in seen] == [doc["id"] for doc in expected]
+    assert [doc["distance_km"] for doc in seen] == [round(doc["d"] / 1000, 2) for doc in expected]
+
+
+async def test_nearest_pages_order_profiles_without_registered_at():
+    # Legacy profiles predate registered_at
+    docs = [
+        {"id": f"t{n}", "d": 100.0 if n < 3 else 250.0, **({"registered_at": "2026-01-01"} if n % 2 else {})}
+        for n in range(6)
+    ]
+
+    page, _ = await fetch_nearest_page(
+        GeoNearCollection(docs), {}, {"_id": 0}, {"type": "Point", "coordinates": [0, 0]}, 5000, REGISTERED_DESC, 4
+    )
+
+    assert [doc["id"] for doc in page] == ["t1", "t2", "t0", "t5"]
+
+
+async def test_nearest_page_limits_before_sorting():
+    collection = GeoNearCollection([{"id": f"t{n}", "registered_at": "2026", "d": float(n)} for n in range(10)])
+
+    await fetch_nearest_page(collection, {}, {"_id": 0}, {"type": "Point", "coordinates": [0, 0]}, 5000, REGISTERED_DESC, 3)
+
+    first = [next(iter(stage)) for stage in collection.pipelines[0]]
+    assert first == ["$geoNear", "$match", "$limit", "$project"]
+    # The tie re-read only covers the page's last distance
+    geo_near = collection.pipelines[1][0]["$geoNear"]
+    assert geo_near["minDistance"] == geo_near["maxDistance"] == 3.0
+
+
+@pytest.mark.parametrize("distance", [-1, "10", None, True, float("inf")])
+async def test_nearest_cursor_needs_a_non_negative_distance(distance):
+    cursor = encode_cursor({DISTANCE_FIELD: distance, "registered_at": "2026", "id": "t1"}, [(DISTANCE_FIELD, 1), *REGISTERED_DESC])
+
+    with pytest.raises(HTTPException) as raised:
+        await fetch_nearest_page(
+            GeoNearCollection([]), {}, {"_id": 0}, {"type": "Point", "coordinates": [0, 0]}, 5000, REGISTERED_DESC, 3, cursor
+        )
+
+    assert raised.value.status_code == 400
@@ -0,0 +1,83 @@
+import pytest
+
+import ratings
+
+pytestmark = pytest.mark.anyio
+
+
+async def _tutor(db, **fields):
+    await db.tutor_profiles.insert_one({"user_id": "tutor-1", **fields})
+
+
+async def _apply(db, pipeline):
+    await db.tutor_profiles.update_one({"user_id": "tutor-1"}, pipeline)
+    return await db.tutor_profiles.find_one({"user_id": "tutor-1"}, {"_id": 0, "user_id": 0})
+
+
+async def test_added_reviews_accumulate(db):
+    await _tutor(db, **ratings.empty_aggregates())
+
+    await _apply(db, ratings.added_review(5))
+    profile = await _apply(db, ratings.added_review(2))
+
+    assert profile["rating_sum"] == 7
+    assert profile["rating_count"] == 2
+    assert profile["average_rating"] == 3.5
+    assert profile["rating_histogram"] == {"1": 0, "2": 1, "3": 0, "4": 0, "5": 1}
+
+
+async def test_edited_review_moves_between_stars_without_changing_count(db):
+    await _tutor(db, **ratings.empty_aggregates())
+    await _apply(db, ratings.added_review(5))
+    await _apply(db, ratings.added_review(4))
+
+    profile = await _apply(db, ratings.changed_review(5, 1))
+
+    assert profile["rating_sum"] == 5
+    assert profile["rating_count"] == 2
+    assert profile["average_rating"] == 2.5
+    assert profile["rating_histogram"] == {"1": 1, "2": 0, "3": 0, "4": 1, "5": 0}
+
+
+async def test_unchanged_rating_is_a_no_op(db):
+    await _tutor(db, **ratings.empty_aggregates())
+    before = await _apply(db, ratings.added_review(3))
+
+    assert await _apply(db, ratings.changed_review(3, 3)) == before
+
+
+async def test_removing_the_last_review_resets_the_average(db):
+    await _tutor(db, **ratings.empty_aggregates())
+    await _apply(db, ratings.added_review(4))
+
+    profile = await _apply(db, ratings.removed_review(4))
+
+    assert profile["rating_sum"] == 0
+    assert profile["rating_count"] == 0
+    assert profile["average_rating"] == 0
+    assert profile["rating_histogram"]["4"] == 0
+
+
+async def test_deltas_apply_to_profiles_written_before_the_aggregates(db):
+    await _tutor(db)
+
+    profile = await _apply(db, ratings.added_review(4))
+
+    assert profile["rating_sum"] == 4
+    assert profile["rating_count"] == 1
+    assert profile["average_rating"] == 4
+    assert profile["rating_histogram"] == {"4": 1}
+
+
+async def test_deltas_match_a_full_rebuild(mongo_db):
+    await mongo_db.tutor_profiles.insert_one({"user_id": "tutor-1", **ratings.empty_aggregates()})
+    for student, rating in (("s1", 5), ("s2", 3), ("s3", 4)):
+        await mongo_db.reviews.insert_one({"tutor_id": "tutor-1", "student_id": student, "rating": rating})
+        await _apply(mongo_db, ratings.added_review(rating))
+    await mongo_db.reviews.update_one({"student_id": "s2"}, {"$set": {"rating": 1}})
+    incremental = await _apply(mongo_db, ratings.changed_review(3, 1))
+
+    await ratings.rebuild_rating_aggregates(mongo_db)
+    rebuilt = await mongo_db.tutor_profiles.find_one({"user_id": "tutor-1"}, {"_id": 0, "user_id": 0})
+
+    assert rebuilt == incremental
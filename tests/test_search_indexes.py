@@ -0,0 +1,51 @@
+from datetime import datetime, timezone, timedelta
+
+import pytest
+
+from indexes import ensure_indexes, explain_tutor_query
+from search import location_search_keys, subject_search_keys
+
+pytestmark = pytest.mark.anyio
+
+SUBJECTS = ["Mathematics", "Physics", "Chemistry", "English", "Biology", "Accountancy"]
+LOCATIONS = ["Sector 17, Chandigarh", "Phase 7, Mohali", "Sector 20, Panchkula", "Near Elante Mall", "Zirakpur"]
+
+FILTERS = {
+    "subject": {"subject": "Mathematics"},
+    "short subject": {"subject": "ma"},
+    "locality": {"location": "Sector 17"},
+    "location text": {"location": "Near Elante Mall"},
+    "fee range": {"min_fee": 200, "max_fee": 800},
+    "combined": {"subject": "Physics", "location": "Mohali", "min_fee": 300, "max_fee": 1000},
+}
+
+
+async def _seed_tutors(db, count: int = 300) -> None:
+    started = datetime(2026, 1, 1, tzinfo=timezone.utc)
+    profiles = []
+    for i in range(count):
+        subjects = [{"subject": SUBJECTS[i % len(SUBJECTS)]}, {"subject": SUBJECTS[(i + 2) % len(SUBJECTS)]}]
+        location = LOCATIONS[i % len(LOCATIONS)]
+        fee_min = 200 + (i % 10) * 100
+        profiles.append({
+            "id": f"tutor-{i}",
+            "user_id": f"user-{i}",
+            "subjects": subjects,
+            "location": location,
+            "fee_min": fee_min,
+            "fee_max": fee_min + 500,
+            "registered_at": (started + timedelta(minutes=i)).isoformat(),
+            **subject_search_keys(subjects),
+            **location_search_keys(location),
+        })
+    await db.tutor_profiles.insert_many(profiles)
+
+
+@pytest.mark.parametrize("name", sorted(FILTERS))
+async def test_tutor_browse_filters_use_an_index(mongo_db, name):
+    await _seed_tutors(mongo_db)
+    await ensure_indexes(mongo_db)
+
+    stages = await explain_tutor_query(mongo_db, **FILTERS[name])
+
+    assert "COLLSCAN" not in stages, f"{name}: {' <- '.join(stages)}"
@@ -0,0 +1,60 @@
+import asyncio
+
+import pytest
+
+from view_counter import ViewCounter
+
+pytestmark = pytest.mark.anyio
+
+
+class FailingProfiles:
+    def __init__(self):
+        self.calls = 0
+
+    async def bulk_write(self, requests, ordered=True):
+        self.calls += 1
+        await asyncio.sleep(0.01)
+        raise RuntimeError("MongoDB unavailable")
+
+
+class FailingDb:
+    def __init__(self):
+        self.tutor_profiles = FailingProfiles()
+
+
+async def test_views_beyond_the_buffer_limit_are_dropped_and_counted():
+    counter = ViewCounter(FailingDb(), max_pending_tutors=10, max_tracked_tutors=10)
+
+    for i in range(15):
+        counter.record(f"tutor-{i}")
+    counter.record("tutor-0")
+
+    assert len(counter._pending) == 10
+    assert counter.pending_for("tutor-0") == 2
+    assert counter.dropped_total == 5
+
+
+async def test_only_one_early_flush_runs_at_a_time():
+    db = FailingDb()
+    counter = ViewCounter(db, max_pending_tutors=2, max_tracked_tutors=4)
+
+    for i in range(4):
+        counter.record(f"tutor-{i}")
+    await counter._flush_task
+
+    assert db.tutor_profiles.calls == 1
+
+
+async def test_failed_flushes_merge_back_within_the_limit():
+    counter = ViewCounter(FailingDb(), max_pending_tutors=3, max_tracked_tutors=3)
+    for i in range(3):
+        counter.record(f"tutor-{i}")
+
+    # The early flush is writing the first three; they still count
+    await asyncio.sleep(0.001)
+    for i in range(3, 6):
+        counter.record(f"tutor-{i}")
+    await counter._flush_task
+
+    assert sorted(counter._pending) == ["tutor-0", "tutor-1", "tutor-2"]
+    assert counter.dropped_total == 3